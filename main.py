@@ -5,6 +5,7 @@
 現代化架構的統一入口點
 """
 
+import sys
 import argparse
 from pathlib import Path
 from typing import Optional
@@ -12,6 +13,12 @@ import logging
 
 from src.app_factory import setup_application, get_processor, create_financial_report
 from src.core import get_config, handle_errors, FinancialReportsException
+from src.batch import (
+    BatchExecutor, FilingPriority, LongestJobFirstPolicy, MemoryGovernor, PageRangeScheduler, PriorityPolicy
+)
+from src.batch.tasks import process_pdf_task
+from src.tracking import ProcessingStatus, ProcessingTracker
+from src.utils.helpers import NDJSONWriter
 
 
 @handle_errors
@@ -64,8 +71,16 @@ def process_financial_report(pdf_path: Path, stock_code: str,
 
 
 @handle_errors
-def batch_process_pdfs(pdf_dir: Path, output_dir: Optional[Path] = None) -> list:
-    """批次處理PDF檔案"""
+def batch_process_pdfs(pdf_dir: Path, output_dir: Optional[Path] = None, workers: int = 1,
+                       resume: bool = False, watchlist: Optional[list] = None,
+                       stream: Optional[NDJSONWriter] = None) -> list:
+    """批次處理PDF檔案 (workers 大於 1 時以多行程平行處理，大檔優先)
+    
+    每個財報的處理狀態記錄在處理追蹤器；resume 為 True 時略過已完成處理階段且輸出仍存在的檔案。
+    指定觀察名單 (或啟用 priority_scheduling) 時改為最新季度與觀察名單優先。
+    啟用 page_scheduling 時以頁碼範圍為單位分派，批次尾端不會只剩單一大檔在執行。
+    指定 stream 時每個項目完成即寫出一行 JSON，回傳的列表只保留摘要 (不含處理結果)。
+    """
     
     if not pdf_dir.is_dir():
         raise ValueError(f"輸入路徑不是目錄: {pdf_dir}")
@@ -75,31 +90,87 @@ def batch_process_pdfs(pdf_dir: Path, output_dir: Optional[Path] = None) -> list
         logging.warning(f"在 {pdf_dir} 中找不到PDF檔案")
         return []
     
+    tracker = ProcessingTracker()
+    tasks = {}
+    items = []
     results = []
-    pdf_processor = get_processor('pdf')
     
     for pdf_file in pdf_files:
-        try:
-            output_path = None
-            if output_dir:
-                output_path = output_dir / f"{pdf_file.stem}_processed.json"
-            
-            result = pdf_processor.process(pdf_file, output_path)
-            results.append({
-                'file': str(pdf_file),
-                'success': True,
-                'result': result
-            })
-            
-            logging.info(f"✅ 處理完成: {pdf_file.name}")
-            
-        except Exception as e:
-            logging.error(f"❌ 處理失敗: {pdf_file.name} - {e}")
-            results.append({
-                'file': str(pdf_file),
-                'success': False,
-                'error': str(e)
-            })
+        output_path = None
+        if output_dir:
+            output_path = output_dir / f"{pdf_file.stem}_processed.json"
+        
+        task = tracker.get_or_create_for_file(pdf_file)
+        if resume and tracker.is_stage_completed(task, ProcessingStatus.PROCESSED) \
+                and (output_path is None or output_path.exists()):
+            logging.info(f"已處理，略過: {pdf_file.name}")
+            results.append({'file': str(pdf_file), 'success': True, 'skipped': True})
+            if stream:
+                stream.write(results[-1])
+            continue
+        
+        if task:
+            tasks[pdf_file] = task.id
+            tracker.update_task_status(task.id, ProcessingStatus.PROCESSING)
+        items.append((pdf_file, output_path))
+    
+    def report(done: int, total: int, item_result) -> None:
+        pdf_file, output_path = item_result.item
+        task_id = tasks.get(pdf_file)
+        if item_result.watchdog:
+            # 逾時或超過記憶體上限的文件記錄到處理追蹤器
+            tracker.record_watchdog_kill(pdf_file, item_result.watchdog, item_result.duration, item_result.error)
+        elif task_id and item_result.success and item_result.value.get('success', True):
+            tracker.complete_stage(task_id, ProcessingStatus.PROCESSED, item_result.duration,
+                                   pdf_path=pdf_file, processed_path=output_path)
+        elif task_id:
+            error = item_result.error or item_result.value.get('message')
+            tracker.update_task_status(task_id, ProcessingStatus.FAILED, error_message=error)
+        
+        if item_result.success:
+            logging.info(f"✅ 處理完成 ({done}/{total}): {pdf_file.name}")
+        else:
+            logging.error(f"❌ 處理失敗 ({done}/{total}): {pdf_file.name} - {item_result.error}")
+    
+    processing = get_config().processing
+    priority = FilingPriority.from_config(processing, watchlist)
+    policy = PriorityPolicy(priority) if priority else None
+    
+    if processing.page_scheduling and workers > 1 \
+            and not (processing.document_timeout or processing.document_memory_limit_mb):
+        # 分頁工作的記憶體用量受 page_chunk_max 限制，不需記憶體調控器
+        scheduler = PageRangeScheduler.from_config(workers, processing, policy=policy, progress=report)
+        item_results = scheduler.imap_unordered(items) if stream else scheduler.map(items)
+    else:
+        executor = BatchExecutor.for_config(
+            workers,
+            processing,
+            policy=policy or LongestJobFirstPolicy(),
+            progress=report,
+            governor=MemoryGovernor.from_config(processing)
+        )
+        if stream:
+            item_results = executor.imap_unordered(process_pdf_task, items)
+        else:
+            item_results = executor.map(process_pdf_task, items)
+    
+    for item_result in item_results:
+        result = {
+            'file': str(item_result.item[0]),
+            'success': item_result.success
+        }
+        if item_result.success:
+            result['result'] = item_result.value
+        else:
+            result['error'] = item_result.error
+            if item_result.watchdog:
+                result['watchdog'] = item_result.watchdog
+        
+        if stream:
+            # 完整結果寫出後即釋放
+            stream.write(result)
+            result.pop('result', None)
+        results.append(result)
     
     return results
 
@@ -154,6 +225,18 @@ def main():
   
   # 批次處理
   python main.py --batch path/to/pdf/directory
+  
+  # 以 8 個行程平行批次處理
+  python main.py --batch path/to/pdf/directory --workers 8
+  
+  # 每份文件最多處理 300 秒
+  python main.py --batch path/to/pdf/directory --workers 4 --timeout 300
+  
+  # 以頁碼範圍分派，閒置工作者分擔大型財報的剩餘頁面
+  python main.py --batch path/to/pdf/directory --workers 8 --page-scheduling
+  
+  # 每份文件完成即輸出一行 JSON (- 為標準輸出)
+  python main.py --batch path/to/pdf/directory --ndjson results.ndjson
         """
     )
     
@@ -166,6 +249,13 @@ def main():
     parser.add_argument('--pdf', type=Path, help='處理單個PDF檔案')
     parser.add_argument('--batch', type=Path, help='批次處理PDF目錄')
     parser.add_argument('--financial', action='store_true', help='財務報告處理模式')
+    parser.add_argument('--lean', action='store_true', help='精簡結果模式 (不保留原始文字與表格)')
+    parser.add_argument('--workers', type=int, help='批次處理的平行工作者數量 (預設為配置值)')
+    parser.add_argument('--timeout', type=int, help='批次處理單一文件的時間上限(秒)，超過時終止該文件')
+    parser.add_argument('--resume', action='store_true', help='批次處理時略過處理追蹤器中已完成的檔案')
+    parser.add_argument('--watchlist', help='優先處理的股票代碼，以逗號分隔 (最新季度與名單內股票先處理)')
+    parser.add_argument('--page-scheduling', action='store_true', help='批次以頁碼範圍為單位平行處理 (跨文件工作竊取)')
+    parser.add_argument('--ndjson', help='批次結果逐筆寫出為 NDJSON 的檔案路徑 (- 為標準輸出)')
     
     # 財務報告參數
     parser.add_argument('--stock', help='股票代碼')
@@ -178,6 +268,12 @@ def main():
     try:
         # 初始化應用程式
         config = setup_application(args.config)
+        if args.lean:
+            config.processing.lean_results = True
+        if args.timeout:
+            config.processing.document_timeout = args.timeout
+        if args.page_scheduling:
+            config.processing.page_scheduling = True
         
         # 顯示系統資訊
         if args.info:
@@ -209,18 +305,27 @@ def main():
         
         elif args.batch:
             # 批次處理
-            results = batch_process_pdfs(args.batch, args.output)
+            workers = args.workers or config.processing.batch_workers
+            watchlist = args.watchlist.split(',') if args.watchlist else None
+            if args.ndjson:
+                with NDJSONWriter(args.ndjson) as stream:
+                    results = batch_process_pdfs(args.batch, args.output, workers, resume=args.resume,
+                                                 watchlist=watchlist, stream=stream)
+            else:
+                results = batch_process_pdfs(args.batch, args.output, workers, resume=args.resume, watchlist=watchlist)
             
             success_count = sum(1 for r in results if r['success'])
             total_count = len(results)
             
-            print(f"\n📊 批次處理完成: {success_count}/{total_count} 成功")
+            # NDJSON 寫到標準輸出時，摘要改寫到標準錯誤
+            out = sys.stderr if args.ndjson == '-' else sys.stdout
+            print(f"\n📊 批次處理完成: {success_count}/{total_count} 成功", file=out)
             
             if success_count < total_count:
-                print("\n❌ 處理失敗的檔案:")
+                print("\n❌ 處理失敗的檔案:", file=out)
                 for result in results:
                     if not result['success']:
-                        print(f"   - {Path(result['file']).name}: {result['error']}")
+                        print(f"   - {Path(result['file']).name}: {result['error']}", file=out)
         
         else:
             # 沒有指定處理模式，顯示幫助
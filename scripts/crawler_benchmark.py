@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+爬蟲吞吐量壓力測試
+以本機 TWSE 替身伺服器 (可設定延遲、錯誤、429 限流與檔案大小) 離線測量各下載模式的
+每分鐘財報數、p50/p99 延遲與重試情形
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 使用標準 Python 包導入
+from src.core import get_config
+from src.core.crawler import FinancialCrawler
+from src.core.async_crawler import AIOHTTP_AVAILABLE, AsyncFinancialCrawler
+from src.utils.helpers import setup_logging, save_json
+from src.utils.index_manager import MasterIndexManager
+from src.utils.twse_stub import StubSettings, TWSEStubServer
+
+
+def build_queries(companies: int, periods: int, years: List[int]) -> List[Dict[str, Any]]:
+    """建立替身公司的查詢 (每家公司由最新一季往前 periods 季)"""
+    seasons = [(year, f"Q{season}") for year in sorted(years, reverse=True) for season in range(4, 0, -1)]
+    return [
+        {'stock_code': str(9000 + i), 'company_name': f"替身公司{i + 1}", 'year': year, 'season': season}
+        for i in range(companies)
+        for year, season in seasons[:periods]
+    ]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近排名法百分位數"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class CrawlerBenchmark:
+    """對替身伺服器執行各下載模式並彙整指標"""
+    
+    def __init__(self, stub: TWSEStubServer, queries: List[Dict[str, Any]], request_rate: float = 0.0):
+        self.stub = stub
+        self.queries = queries
+        self.request_rate = request_rate
+        self.logger = setup_logging("CrawlerBenchmark")
+    
+    def _config(self, output_dir: str, workers: int) -> Dict[str, Any]:
+        return {
+            'output_dir': output_dir,
+            'crawler_base_url': self.stub.base_url,
+            'request_rate': self.request_rate,
+            'download_workers': workers
+        }
+    
+    def run(self, mode: str, workers: int = 1) -> Dict[str, Any]:
+        """執行一種模式 (threads 或 async)，每次使用新的輸出目錄與主索引，不會略過已下載的檔案"""
+        latencies: List[float] = []
+        lock = threading.Lock()
+        crawler_metrics: Dict[str, Any] = {}
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = self._config(temp_dir, workers)
+            index_manager = MasterIndexManager(Path(temp_dir) / "master_index.json")
+            self.stub.reset_stats()
+            
+            start = time.perf_counter()
+            if mode == 'async':
+                result = asyncio.run(self._run_async(config, workers, index_manager, latencies, crawler_metrics))
+            else:
+                crawler = FinancialCrawler(config)
+                crawler.index_manager = index_manager
+                process_single = crawler._process_single
+                
+                def timed(*args, **kwargs):
+                    began = time.perf_counter()
+                    try:
+                        return process_single(*args, **kwargs)
+                    finally:
+                        with lock:
+                            latencies.append(time.perf_counter() - began)
+                
+                crawler._process_single = timed
+                result = crawler.process(self.queries)
+                crawler_metrics.update(crawler.metrics())
+            elapsed = time.perf_counter() - start
+        
+        return self._summarize(mode, workers, result.data or [], elapsed, latencies, crawler_metrics)
+    
+    async def _run_async(self, config: Dict[str, Any], workers: int, index_manager: MasterIndexManager,
+                         latencies: List[float], crawler_metrics: Dict[str, Any]):
+        crawler = AsyncFinancialCrawler(config, concurrency=workers)
+        crawler.crawler.index_manager = index_manager
+        process_single = crawler._process_single
+        
+        async def timed(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return await process_single(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - began)
+        
+        crawler._process_single = timed
+        async with crawler:
+            result = await crawler.process(self.queries)
+        crawler_metrics.update(crawler.crawler.metrics())
+        return result
+    
+    def _summarize(self, mode: str, workers: int, results: List[Dict[str, Any]], elapsed: float,
+                   latencies: List[float], crawler_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        stats = dict(self.stub.stats)
+        succeeded = sum(1 for result in results if result and result.get('success'))
+        requests_made = stats['queries'] + stats['downloads'] + stats['errors'] + stats['throttled']
+        return {
+            'mode': f"{mode} x{workers}",
+            'reports': len(self.queries),
+            'succeeded': succeeded,
+            'failed': len(self.queries) - succeeded,
+            'elapsed_seconds': round(elapsed, 3),
+            'reports_per_minute': round(succeeded / elapsed * 60, 1) if elapsed else 0.0,
+            'latency_p50': round(percentile(latencies, 50), 3),
+            'latency_p99': round(percentile(latencies, 99), 3),
+            'requests': requests_made,
+            'requests_per_report': round(requests_made / len(self.queries), 2) if self.queries else 0.0,
+            # 每次注入的 500 / 429 都讓爬蟲重試一次 (或在最後一次嘗試時失敗)
+            'retried_errors': stats['errors'],
+            'retried_throttles': stats['throttled'],
+            'range_requests': stats['range_requests'],
+            'fast_failures': crawler_metrics.get('fast_failures', 0),
+            'budget_denied': crawler_metrics.get('budget_denied', 0),
+            'breakers': crawler_metrics.get('breakers', {}),
+            'megabytes': round(stats['bytes_sent'] / 1024 / 1024, 2)
+        }
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    columns = [('mode', '模式'), ('succeeded', '成功'), ('failed', '失敗'), ('reports_per_minute', '份/分'),
+               ('latency_p50', 'p50秒'), ('latency_p99', 'p99秒'), ('requests_per_report', '請求/份'),
+               ('retried_errors', '500重試'), ('retried_throttles', '429重試'), ('fast_failures', '快速失敗'),
+               ('elapsed_seconds', '耗時秒')]
+    print(" | ".join(f"{title:>10}" for _, title in columns))
+    print("-" * 13 * len(columns))
+    for row in rows:
+        print(" | ".join(f"{str(row[key]):>10}" for key, _ in columns))
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(
+        description='爬蟲吞吐量壓力測試 (本機替身伺服器，完全離線)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用範例:
+  # 循序與 4 / 8 執行緒模式，每個回應 50ms，2% 錯誤與 2% 限流
+  python scripts/crawler_benchmark.py --workers 1 4 8 --latency 0.05 --error-rate 0.02 --throttle-rate 0.02
+  
+  # 加入非同步模式 (需安裝 aiohttp) 並輸出結果
+  python scripts/crawler_benchmark.py --workers 1 8 --async --json output/benchmark.json
+  
+  # 只啟動替身伺服器 (爬蟲以 crawler_base_url 指向它)
+  python scripts/crawler_benchmark.py --serve --port 8765 --latency 0.1
+        """
+    )
+    parser.add_argument('--companies', type=int, default=5, help='替身公司數量')
+    parser.add_argument('--periods', type=int, default=8, help='每家公司的期數')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='下載執行緒數 (1 為循序模式)')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='同時測量非同步爬蟲 (需要 aiohttp)')
+    parser.add_argument('--latency', type=float, default=0.05, help='每個回應的延遲秒數')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延遲的隨機增減秒數')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回應 500 的機率')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='回應 429 的機率')
+    parser.add_argument('--payload-size', type=int, default=200_000, help='每份PDF的位元組數')
+    parser.add_argument('--no-range', action='store_true', help='替身伺服器不支援 Range 續傳')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+    parser.add_argument('--rate', type=float, default=0.0, help='爬蟲的每秒請求數上限 (0 為不限速)')
+    parser.add_argument('--max-retry', type=int, help='每份財報的最多嘗試次數 (預設為配置值)')
+    parser.add_argument('--json', type=Path, help='結果輸出的JSON檔案')
+    parser.add_argument('--serve', action='store_true', help='只啟動替身伺服器直到中斷')
+    parser.add_argument('--port', type=int, default=0, help='替身伺服器連接埠 (0 為自動選擇)')
+    
+    args = parser.parse_args()
+    
+    settings = StubSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        payload_size=args.payload_size,
+        range_support=not args.no_range,
+        seed=args.seed
+    )
+    
+    if args.serve:
+        with TWSEStubServer(settings, port=args.port) as stub:
+            print(f"🖥️  替身伺服器: {stub.base_url} (Ctrl+C 結束)")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+        return
+    
+    if args.max_retry:
+        get_config().processing.max_retry = args.max_retry
+    
+    modes = [('threads', workers) for workers in args.workers]
+    if args.use_async:
+        if AIOHTTP_AVAILABLE:
+            modes += [('async', workers) for workers in args.workers]
+        else:
+            print("⚠️  未安裝 aiohttp，略過非同步模式", file=sys.stderr)
+    
+    queries = build_queries(args.companies, args.periods, list(settings.years))
+    rows = []
+    with TWSEStubServer(settings) as stub:
+        benchmark = CrawlerBenchmark(stub, queries, args.rate)
+        for mode, workers in modes:
+            rows.append(benchmark.run(mode, workers))
+    
+    print_table(rows)
+    if args.json:
+        save_json({'settings': {**vars(args), 'json': str(args.json)}, 'results': rows}, args.json)
+        print(f"✅ 結果已儲存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+財報串流管線腳本
+下載、智慧處理、回填與索引更新以有界佇列串接，每份財報下載後立即處理
+"""
+
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# 使用標準 Python 包導入
+from src.batch import FilingPipeline
+from src.core import ConfigManager
+from src.utils.helpers import (
+    setup_logging, load_json, save_json, validate_stock_code, validate_season, normalize_season
+)
+
+
+class FilingPipelineApp:
+    """財報串流管線應用程式"""
+    
+    def __init__(self, crawl_workers: int = 1, process_workers: int = 1, backfill_workers: int = 1,
+                 queue_size: int = 0, backfill_prior: bool = False, output_dir: str = None, watchlist=None,
+                 refresh: bool = False):
+        self.logger = setup_logging("FilingPipelineApp")
+        config = ConfigManager.load_config()
+        if output_dir:
+            config['output_dir'] = output_dir
+        
+        self.pipeline = FilingPipeline(
+            config,
+            crawl_workers=crawl_workers,
+            process_workers=process_workers,
+            backfill_workers=backfill_workers,
+            queue_size=queue_size,
+            backfill_prior=backfill_prior,
+            progress=self._report,
+            watchlist=watchlist,
+            refresh=refresh
+        )
+    
+    def run(self, queries):
+        """驗證查詢並執行管線"""
+        valid_queries = []
+        for i, query in enumerate(queries, 1):
+            if self._validate_query(query):
+                valid_queries.append({**query, 'year': int(query['year']), 'season': normalize_season(str(query['season']))})
+            else:
+                self.logger.warning(f"跳過無效查詢 #{i}: {query}")
+        
+        if not valid_queries:
+            return {"success": False, "error": "No valid queries found"}
+        
+        results = self.pipeline.run(valid_queries)
+        success_count = sum(1 for r in results if r.success)
+        self.logger.info(f"管線處理完成: {success_count}/{len(results)} 成功")
+        
+        return {
+            "success": success_count > 0,
+            "message": f"管線處理完成: {success_count}/{len(results)} 成功",
+            "results": [
+                {
+                    "query": r.item,
+                    "success": r.success,
+                    "failed_stage": r.failed_stage,
+                    "error": r.error,
+                    "latency": round(r.latency, 2),
+                    "stage_durations": {name: round(value, 2) for name, value in r.stage_durations.items()}
+                }
+                for r in results
+            ]
+        }
+    
+    def _report(self, done: int, result) -> None:
+        name = f"{result.item.get('company_name', '')}({result.item.get('stock_code')}) {result.item.get('year')}{result.item.get('season')}"
+        if result.success:
+            after_download = result.started_at + result.latency - result.stage_finished_at['crawl']
+            self.logger.info(f"✅ [{done}] {name} 完成，下載後 {after_download:.1f} 秒完成回填")
+        else:
+            self.logger.error(f"❌ [{done}] {name} 於 {result.failed_stage} 階段失敗: {result.error}")
+    
+    def _validate_query(self, query) -> bool:
+        """驗證查詢資料"""
+        for field in ('stock_code', 'company_name', 'year', 'season'):
+            if field not in query:
+                self.logger.error(f"缺少必要欄位: {field}")
+                return False
+        
+        if not validate_stock_code(query['stock_code']):
+            self.logger.error(f"無效的股票代碼: {query['stock_code']}")
+            return False
+        
+        if not validate_season(str(query['season'])):
+            self.logger.error(f"無效的季度: {query['season']}")
+            return False
+        
+        return True
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description='財報串流管線 (下載 → 處理 → 回填)')
+    parser.add_argument('--batch', help='批次查詢檔案')
+    parser.add_argument('--stock-code', help='股票代碼')
+    parser.add_argument('--company', help='公司名稱')
+    parser.add_argument('--year', type=int, help='年份')
+    parser.add_argument('--season', help='季度 (Q1, Q2, Q3, Q4)')
+    parser.add_argument('--output-dir', help='輸出目錄')
+    parser.add_argument('--crawl-workers', type=int, default=1, help='下載階段工作者數量')
+    parser.add_argument('--process-workers', type=int, default=1, help='處理階段工作者數量')
+    parser.add_argument('--backfill-workers', type=int, default=1, help='回填階段工作者數量')
+    parser.add_argument('--queue-size', type=int, default=0, help='各階段佇列上限 (0 為工作者數量的兩倍)')
+    parser.add_argument('--backfill-prior', action='store_true', help='以比較期欄位回填缺少或空白的前期JSON')
+    parser.add_argument('--watchlist', help='優先處理的股票代碼，以逗號分隔 (查詢可帶 deadline 欄位)')
+    parser.add_argument('--refresh', action='store_true', help='重新下載本機已存在且與主索引相符的PDF')
+    
+    args = parser.parse_args()
+    
+    if args.batch:
+        batch_file = Path(args.batch)
+        if not batch_file.exists():
+            print(f"❌ 批次檔案不存在: {batch_file}")
+            return
+        queries = load_json(batch_file)
+    elif all([args.stock_code, args.company, args.year, args.season]):
+        queries = [{
+            'stock_code': args.stock_code,
+            'company_name': args.company,
+            'year': args.year,
+            'season': args.season
+        }]
+    else:
+        parser.print_help()
+        return
+    
+    app = FilingPipelineApp(
+        crawl_workers=args.crawl_workers,
+        process_workers=args.process_workers,
+        backfill_workers=args.backfill_workers,
+        queue_size=args.queue_size,
+        backfill_prior=args.backfill_prior,
+        output_dir=args.output_dir,
+        watchlist=args.watchlist.split(',') if args.watchlist else None,
+        refresh=args.refresh
+    )
+    result = app.run(queries)
+    
+    if args.batch:
+        output_dir = Path("output")
+        output_dir.mkdir(exist_ok=True)
+        result_file = output_dir / f"pipeline_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        save_json(result, result_file)
+        print(f"✅ 管線結果已儲存: {result_file}")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,21 +13,31 @@ from typing import Dict, Any, List, Union
 from datetime import datetime
 
 # 使用標準 Python 包導入
+from src.batch import BackfillPlan, BackfillPlanner, parse_period
 from src.core import ConfigManager
 from src.core.crawler import FinancialCrawler
+from src.tracking import ProcessingTracker
 from src.utils.helpers import (
     setup_logging, load_json, save_json, validate_stock_code, 
-    validate_season, normalize_season, create_progress_reporter, format_file_size
+    validate_season, normalize_season, create_progress_reporter, format_file_size, NDJSONWriter
 )
 
 
 class FinancialCrawlerApp:
     """財報爬蟲應用程式"""
     
-    def __init__(self):
+    def __init__(self, resume: bool = False, download_workers: int = None, request_rate: float = None,
+                 refresh: bool = False, blob_store: str = None):
         self.logger = setup_logging("FinancialCrawlerApp")
         self.config = ConfigManager.load_config()
-        self.crawler = FinancialCrawler(self.config)
+        if download_workers:
+            self.config['download_workers'] = download_workers
+        if request_rate is not None:
+            self.config['request_rate'] = request_rate
+        if blob_store:
+            self.config['blob_store_dir'] = blob_store
+        self.tracker = ProcessingTracker()
+        self.crawler = FinancialCrawler(self.config, tracker=self.tracker, resume=resume, refresh=refresh)
     
     def run_single_query(self, query_data: Dict[str, Any]) -> Dict[str, Any]:
         """執行單筆查詢"""
@@ -42,8 +52,8 @@ class FinancialCrawlerApp:
         result = self.crawler.process(query_data)
         return result.to_dict()
     
-    def run_batch_query(self, queries_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """執行批次查詢"""
+    def run_batch_query(self, queries_data: List[Dict[str, Any]], stream=None) -> Dict[str, Any]:
+        """執行批次查詢 (指定 stream 時逐筆寫出結果)"""
         # 驗證所有查詢
         valid_queries = []
         for i, query in enumerate(queries_data):
@@ -55,9 +65,27 @@ class FinancialCrawlerApp:
         if not valid_queries:
             return {"success": False, "error": "No valid queries found"}
         
-        # 執行批次爬取
-        result = self.crawler.process(valid_queries)
-        return result.to_dict()
+        # 執行批次爬取 (附上斷路器狀態與重試計數)
+        result = self.crawler.process(valid_queries, stream=stream)
+        return {**result.to_dict(), 'metrics': self.crawler.metrics()}
+    
+    def plan_backfill(self, queries: List[Dict[str, Any]] = None, stock_codes: List[str] = None,
+                      start: str = None, end: str = None, verify: bool = False) -> BackfillPlan:
+        """規劃回補：由主索引與輸出目錄判斷涵蓋情形，只保留缺少或過期的期別
+        
+        指定 queries (例如手寫的批次檔) 時過濾該清單，否則展開 stock_codes 在 start ~ end 之間的所有期別。
+        """
+        planner = BackfillPlanner(Path(self.config['output_dir']), self.crawler.index_manager, verify=verify,
+                                  min_pdf_size=self.crawler.MIN_PDF_SIZE)
+        if queries is not None:
+            valid_queries = []
+            for i, query in enumerate(queries):
+                if self._validate_query(query):
+                    valid_queries.append(self._normalize_query(query))
+                else:
+                    self.logger.warning(f"跳過無效查詢 #{i+1}: {query}")
+            return planner.plan_queries(valid_queries)
+        return planner.plan(stock_codes, parse_period(start), parse_period(end, end=True) if end else None)
     
     def show_statistics(self) -> None:
         """顯示統計資訊"""
@@ -154,10 +182,25 @@ def main():
     parser.add_argument('--stats', action='store_true', help='顯示統計資訊')
     parser.add_argument('--search', help='搜尋財報')
     parser.add_argument('--output-dir', help='輸出目錄')
+    parser.add_argument('--resume', action='store_true', help='略過處理追蹤器中已下載的財報')
+    parser.add_argument('--ndjson', help='批次結果逐筆寫出為 NDJSON 的檔案路徑 (- 為標準輸出)')
+    parser.add_argument('--download-workers', type=int, help='批次同時下載的執行緒數量')
+    parser.add_argument('--rate', type=float, help='對 doc.twse.com.tw 的每秒請求數 (預設為配置值)')
+    parser.add_argument('--refresh', action='store_true', help='重新下載本機已存在且與主索引相符的PDF')
+    parser.add_argument('--blob-store', help='內容定址PDF儲存目錄 (下載的PDF以硬連結指向儲存檔)')
+    parser.add_argument('--plan', action='store_true',
+                        help='回補規劃: 只下載缺少或過期的期別 (過濾 --batch 檔案，或展開 --stocks 與 --from/--to)')
+    parser.add_argument('--stocks', nargs='+', help='回補規劃的股票代碼')
+    parser.add_argument('--from', dest='period_from', help='回補規劃的起始期別 (例如 2022Q1 或 2022)')
+    parser.add_argument('--to', dest='period_to', help='回補規劃的結束期別 (預設為已結束的最近一季)')
+    parser.add_argument('--verify', action='store_true', help='回補規劃時以 SHA-256 驗證本機PDF')
+    parser.add_argument('--dry-run', action='store_true', help='只顯示回補規劃，不下載')
+    parser.add_argument('--plan-output', help='回補工作輸出為批次JSON檔案')
     
     args = parser.parse_args()
     
-    app = FinancialCrawlerApp()
+    app = FinancialCrawlerApp(resume=args.resume, download_workers=args.download_workers, request_rate=args.rate,
+                              refresh=args.refresh, blob_store=args.blob_store)
     
     # 覆蓋配置
     if args.output_dir:
@@ -185,14 +228,40 @@ def main():
         print(json.dumps(result, ensure_ascii=False, indent=2))
         return
     
-    # 批次查詢
+    # 批次查詢 (回補規劃時只執行缺少或過期的期別)
+    queries = None
     if args.batch:
         batch_file = Path(args.batch)
         if not batch_file.exists():
             print(f"❌ 批次檔案不存在: {batch_file}")
             return
-        
         queries = load_json(batch_file)
+        if isinstance(queries, dict):
+            # 附有說明與設定的批次檔 ({"queries": [...]})
+            queries = queries.get('queries', [])
+    
+    if args.plan:
+        if queries is None and not (args.stocks and args.period_from):
+            print("❌ 回補規劃需要 --batch 檔案，或 --stocks 與 --from")
+            return
+        plan = app.plan_backfill(queries, args.stocks, args.period_from, args.period_to, args.verify)
+        out = sys.stderr if args.ndjson == '-' else sys.stdout
+        print(plan.matrix(), file=out)
+        print(f"📋 回補規劃: {plan.summary()}", file=out)
+        if args.plan_output:
+            save_json(plan.jobs, Path(args.plan_output))
+            print(f"✅ 回補工作已儲存: {args.plan_output}", file=out)
+        if args.dry_run or not plan.jobs:
+            return
+        queries = plan.jobs
+    
+    if queries is not None:
+        if args.ndjson:
+            with NDJSONWriter(args.ndjson) as stream:
+                result = app.run_batch_query(queries, stream=stream)
+            print(f"✅ 批次結果已逐筆寫出: {stream.name}", file=sys.stderr if args.ndjson == '-' else sys.stdout)
+            return
+        
         result = app.run_batch_query(queries)
         
         # 儲存結果
@@ -225,7 +294,7 @@ def main():
             return
     
     # 如果沒有任何操作，顯示幫助
-    if not any([args.input, args.batch, args.stats, args.search, 
+    if not any([args.input, args.batch, args.plan, args.stats, args.search, 
                all([args.stock_code, args.company, args.year, args.season])]):
         parser.print_help()
 
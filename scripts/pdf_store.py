@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF內容定址儲存維護腳本
+將既有資料夾中的重複PDF改為指向儲存檔的連結、清除不再使用的儲存檔
+"""
+
+import argparse
+from pathlib import Path
+
+# 使用標準 Python 包導入
+from src.core import get_config
+from src.utils.blob_store import BlobStore
+from src.utils.helpers import format_file_size
+from src.utils.index_manager import MasterIndexManager
+
+
+def main():
+    """主函數"""
+    config = get_config()
+    parser = argparse.ArgumentParser(
+        description='PDF內容定址儲存 (依 SHA-256 只存一份，各資料夾以連結指向)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用範例:
+  # 將各資料夾中的PDF放入儲存並改為硬連結
+  python scripts/pdf_store.py --store data/blobs --dedupe data/financial_reports test_output
+  
+  # 清除沒有任何連結且不在主索引中的儲存檔
+  python scripts/pdf_store.py --store data/blobs --gc
+  
+  # 爬蟲下載時直接放入儲存: 配置 blob_store_dir 或
+  python scripts/financial_crawler.py --blob-store data/blobs --batch queries.json
+        """
+    )
+    parser.add_argument('--store', type=Path, default=Path(config.blob_store_dir or 'data/blobs'), help='儲存目錄')
+    parser.add_argument('--dedupe', nargs='+', type=Path, metavar='DIR', help='要改為連結的PDF資料夾')
+    parser.add_argument('--symlink', action='store_true', help='以符號連結取代硬連結')
+    parser.add_argument('--gc', action='store_true', help='刪除沒有連結且不在主索引中的儲存檔')
+    parser.add_argument('--stats', action='store_true', help='顯示儲存統計')
+    
+    args = parser.parse_args()
+    store = BlobStore(args.store, 'symlink' if args.symlink else config.blob_link_mode)
+    
+    if args.dedupe:
+        stats = store.dedupe(args.dedupe)
+        print(f"✅ 檢查 {stats['files']} 個PDF，新連結 {stats['linked']} 個，"
+              f"節省 {format_file_size(stats['bytes_saved'])}")
+    
+    if args.gc:
+        referenced = {report['sha256'] for report in MasterIndexManager().load_index()['reports'] if report.get('sha256')}
+        print(f"🧹 刪除 {store.gc(referenced)} 個未使用的儲存檔")
+    
+    if args.stats or not (args.dedupe or args.gc):
+        stats = store.stats()
+        print(f"📦 儲存目錄: {store.root}")
+        print(f"📄 儲存檔: {stats['blobs']} ({format_file_size(stats['bytes'])})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分散式批次腳本
+多個節點共用一個 SQLite 分片資料庫，各自以租約領取分片並執行串流管線 (下載 → 處理 → 回填)
+"""
+
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 使用標準 Python 包導入
+from src.batch import FilingPipeline, LeaseCoordinator, ShardedBatchRunner, shard_queries
+from src.core import ConfigManager, get_config
+from src.utils.helpers import setup_logging, load_json, validate_stock_code, validate_season, normalize_season
+
+
+class ShardedBatchApp:
+    """分散式批次應用程式 (每個節點執行一個實例)"""
+    
+    def __init__(self, db_path: Path, node_id: str = None, crawl_workers: int = 1, process_workers: int = 1,
+                 backfill_workers: int = 1, backfill_prior: bool = False, output_dir: str = None):
+        self.logger = setup_logging("ShardedBatchApp")
+        self.coordinator = LeaseCoordinator.from_config(db_path, get_config().processing, node_id)
+        self.crawl_workers = crawl_workers
+        self.process_workers = process_workers
+        self.backfill_workers = backfill_workers
+        self.backfill_prior = backfill_prior
+        self.output_dir = output_dir
+        self._pipeline = None
+    
+    def init_shards(self, queries: List[Dict[str, Any]], shard_size: int) -> int:
+        """驗證查詢並建立分片 (重複執行時已存在的分片不變)"""
+        valid_queries = []
+        for i, query in enumerate(queries, 1):
+            if all(field in query for field in ('stock_code', 'company_name', 'year', 'season')) \
+                    and validate_stock_code(query['stock_code']) and validate_season(str(query['season'])):
+                valid_queries.append({**query, 'year': int(query['year']), 'season': normalize_season(str(query['season']))})
+            else:
+                self.logger.warning(f"跳過無效查詢 #{i}: {query}")
+        
+        added = self.coordinator.add_shards(shard_queries(valid_queries, shard_size))
+        self.logger.info(f"新增 {added} 個分片 ({len(valid_queries)} 筆查詢)")
+        return added
+    
+    def run(self, max_shards: int = None) -> Dict[str, int]:
+        """領取並處理分片直到全部完成"""
+        runner = ShardedBatchRunner(self.coordinator, self.process_shard)
+        stats = runner.run(max_shards)
+        self.logger.info(f"節點 {self.coordinator.node_id} 結束: {stats}")
+        return stats
+    
+    def process_shard(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """以串流管線處理一個分片，結果寫入共用的主索引與處理追蹤器
+        
+        管線逐項捕捉錯誤而不拋出；回傳的 failed 非空時執行器把分片放回重試。
+        """
+        results = self._get_pipeline().run(queries)
+        failed = [
+            {
+                'stock_code': r.item['stock_code'],
+                'period': f"{r.item['year']}{r.item['season']}",
+                'stage': r.failed_stage,
+                'error': r.error
+            }
+            for r in results if not r.success
+        ]
+        return {'total': len(results), 'success': len(results) - len(failed), 'failed': failed}
+    
+    def _get_pipeline(self) -> FilingPipeline:
+        if self._pipeline is None:
+            config = ConfigManager.load_config()
+            if self.output_dir:
+                config['output_dir'] = self.output_dir
+            self._pipeline = FilingPipeline(
+                config,
+                crawl_workers=self.crawl_workers,
+                process_workers=self.process_workers,
+                backfill_workers=self.backfill_workers,
+                backfill_prior=self.backfill_prior
+            )
+        return self._pipeline
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(
+        description='分散式批次 (多節點以租約領取分片)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用範例:
+  # 建立分片 (每個分片 40 筆查詢，約為一家公司的 10 年)
+  python scripts/sharded_batch.py --db /shared/shards.db --init queries.json --shard-size 40
+  
+  # 在每個節點上執行 (同一台機器可啟動多個)
+  python scripts/sharded_batch.py --db /shared/shards.db --process-workers 4
+  
+  # 查看進度
+  python scripts/sharded_batch.py --db /shared/shards.db --status
+        """
+    )
+    parser.add_argument('--db', type=Path, default=Path('data/shards.db'), help='共用的分片資料庫')
+    parser.add_argument('--init', help='以批次查詢檔案建立分片')
+    parser.add_argument('--shard-size', type=int, default=40, help='每個分片的查詢數量')
+    parser.add_argument('--status', action='store_true', help='顯示分片進度')
+    parser.add_argument('--node-id', help='節點識別碼 (預設為 主機名稱-行程ID)')
+    parser.add_argument('--max-shards', type=int, help='本節點最多處理的分片數')
+    parser.add_argument('--output-dir', help='輸出目錄')
+    parser.add_argument('--crawl-workers', type=int, default=1, help='下載階段工作者數量')
+    parser.add_argument('--process-workers', type=int, default=1, help='處理階段工作者數量')
+    parser.add_argument('--backfill-workers', type=int, default=1, help='回填階段工作者數量')
+    parser.add_argument('--backfill-prior', action='store_true', help='以比較期欄位回填缺少或空白的前期JSON')
+    
+    args = parser.parse_args()
+    
+    app = ShardedBatchApp(
+        args.db,
+        node_id=args.node_id,
+        crawl_workers=args.crawl_workers,
+        process_workers=args.process_workers,
+        backfill_workers=args.backfill_workers,
+        backfill_prior=args.backfill_prior,
+        output_dir=args.output_dir
+    )
+    
+    if args.status:
+        print(json.dumps(app.coordinator.get_statistics(), ensure_ascii=False, indent=2))
+        return
+    
+    if args.init:
+        batch_file = Path(args.init)
+        if not batch_file.exists():
+            print(f"❌ 批次檔案不存在: {batch_file}")
+            return
+        added = app.init_shards(load_json(batch_file), args.shard_size)
+        print(f"✅ 新增 {added} 個分片: {args.db}")
+        return
+    
+    stats = app.run(args.max_shards)
+    print(f"✅ 節點完成: 領取 {stats['claimed']}，完成 {stats['completed']}，失敗 {stats['failed']}，租約遺失 {stats['lost']}")
+
+
+if __name__ == "__main__":
+    main()
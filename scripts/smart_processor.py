@@ -10,25 +10,40 @@ from pathlib import Path
 from datetime import datetime
 
 # 使用標準 Python 包導入
+from src.batch import (
+    BatchExecutor, FilingPriority, LongestJobFirstPolicy, MemoryGovernor, PriorityPolicy, ProcessingManifest
+)
+from src.batch.tasks import smart_process_task
 from src.processors.smart_processor import SmartFinancialProcessor
+from src.core.config import get_config
+from src.tracking import ProcessingStatus, ProcessingTracker
 from src.utils.helpers import setup_logging, create_progress_reporter
 
 
 class SmartProcessorApp:
     """智慧處理應用程式"""
     
-    def __init__(self, config=None):
+    def __init__(self, config=None, backfill_prior: bool = False, workers: int = None, force: bool = False,
+                 resume: bool = False, watchlist=None):
         self.logger = setup_logging("SmartProcessorApp")
+        self.config = config
         self.processor = SmartFinancialProcessor(config)
+        self.backfill_prior = backfill_prior
+        self.workers = workers or get_config().processing.batch_workers
+        self.force = force
+        self.resume = resume
+        self.watchlist = watchlist
     
     def process_single(self, pdf_path: Path, json_path: Path, output_path: Path = None):
         """處理單一檔案"""
         self.logger.info(f"智慧處理: {pdf_path.name}")
         
-        result = self.processor.process(pdf_path, json_path, output_path)
+        result = self.processor.process(pdf_path, json_path, output_path, backfill_prior=self.backfill_prior)
         
         if result.success:
             self.logger.info(f"✅ 處理成功: {result.message}")
+            for prior_file in result.data.get('prior_period_files', []):
+                self.logger.info(f"📎 已回填前期JSON: {Path(prior_file).name}")
             return result.data
         else:
             self.logger.error(f"❌ 處理失敗: {result.message}")
@@ -57,21 +72,104 @@ class SmartProcessorApp:
         
         self.logger.info(f"找到 {len(file_pairs)} 個檔案對進行處理")
         
-        # 批次處理
-        progress = create_progress_reporter(len(file_pairs), "智慧處理")
-        success_count = 0
+        # 以處理清單略過指紋未變更的輸入；resume 時先略過處理追蹤器中已完成增強的檔案
+        manifest = ProcessingManifest.for_directory(data_dir)
+        extractor_version = self.processor.get_extractor_version()
+        tracker = ProcessingTracker()
+        tasks = {}
+        fingerprints = {}
+        pending_pairs = []
         
         for pdf_path, json_path in file_pairs:
-            try:
-                result = self.process_single(pdf_path, json_path)
-                if result:
-                    success_count += 1
-            except Exception as e:
-                self.logger.error(f"處理 {pdf_path.name} 時發生錯誤: {e}")
+            task = tracker.get_or_create_for_file(pdf_path)
+            if self.resume and not self.force and tracker.is_stage_completed(task, ProcessingStatus.ENHANCED) \
+                    and task.enhanced_path and Path(task.enhanced_path).exists():
+                continue
+            
+            fingerprint = manifest.fingerprint(pdf_path, json_path, extractor_version)
+            if not self.force and manifest.is_current(pdf_path.name, fingerprint):
+                continue
+            fingerprints[pdf_path.name] = fingerprint
+            pending_pairs.append((pdf_path, json_path))
+            if task:
+                tasks[pdf_path.name] = task.id
+                tracker.update_task_status(task.id, ProcessingStatus.PROCESSING)
+        
+        skipped = len(file_pairs) - len(pending_pairs)
+        if skipped:
+            self.logger.info(f"略過 {skipped} 個已完成且未變更的檔案 (使用 --force 強制重新處理)")
+        
+        if not pending_pairs:
+            self.logger.info("所有檔案皆為最新，無需處理")
+            return
+        
+        file_pairs = pending_pairs
+        
+        # 批次處理 (多個工作者時以多行程平行處理，大檔優先，依記憶體預算控制並行數)
+        progress = create_progress_reporter(len(file_pairs), "智慧處理")
+        
+        def on_item_done(done: int, total: int, item_result) -> None:
+            pdf_path = item_result.item['pdf_path']
+            task_id = tasks.get(pdf_path.name)
             
+            # 完成即記錄，中斷後重跑不會重做已完成的項目
+            if item_result.watchdog:
+                # 逾時或超過記憶體上限的文件記錄到處理追蹤器
+                tracker.record_watchdog_kill(pdf_path, item_result.watchdog, item_result.duration, item_result.error)
+            elif item_result.success and item_result.value.success:
+                output_path = item_result.value.data.get('output_path')
+                manifest.record(pdf_path.name, fingerprints[pdf_path.name], output_path)
+                if done % 20 == 0:
+                    manifest.save()
+                if task_id:
+                    tracker.complete_stage(task_id, ProcessingStatus.ENHANCED, item_result.duration,
+                                           pdf_path=pdf_path, json_path=item_result.item['json_path'],
+                                           enhanced_path=output_path)
+            elif task_id:
+                error = item_result.error if not item_result.success else item_result.value.message
+                tracker.update_task_status(task_id, ProcessingStatus.FAILED, error_message=error)
             progress.update()
         
+        processing = get_config().processing
+        priority = FilingPriority.from_config(processing, self.watchlist)
+        executor = BatchExecutor.for_config(
+            self.workers,
+            processing,
+            policy=PriorityPolicy(priority) if priority else LongestJobFirstPolicy(),
+            progress=on_item_done,
+            governor=MemoryGovernor.from_config(processing)
+        )
+        
+        items = [
+            {'pdf_path': pdf_path, 'json_path': json_path, 'backfill_prior': self.backfill_prior}
+            for pdf_path, json_path in file_pairs
+        ]
+        if self.config:
+            for item in items:
+                item['config'] = self.config
+        
+        # 行程後端由各工作行程以相同配置建立自己的處理器
+        if executor.backend == 'serial':
+            item_results = executor.map(
+                lambda item: self.processor.process(item['pdf_path'], item['json_path'], backfill_prior=self.backfill_prior),
+                items
+            )
+        else:
+            item_results = executor.map(smart_process_task, items)
+        
+        success_count = 0
+        for item_result in item_results:
+            pdf_name = item_result.item['pdf_path'].name
+            if not item_result.success:
+                self.logger.error(f"處理 {pdf_name} 時發生錯誤: {item_result.error}")
+            elif item_result.value.success:
+                success_count += 1
+                self.logger.info(f"✅ 處理成功 {pdf_name}: {item_result.value.message}")
+            else:
+                self.logger.error(f"❌ 處理失敗 {pdf_name}: {item_result.value.message}")
+        
         progress.finish()
+        manifest.save()
         self.logger.info(f"批次處理完成: {success_count}/{len(file_pairs)} 成功")
     
     def check_processed_status(self, data_dir: Path):
@@ -89,13 +187,21 @@ class SmartProcessorApp:
         print(f"📄 PDF檔案數量: {len(pdf_files)}")
         
         if processed_dir.exists():
-            processed_files = list(processed_dir.glob("*_enhanced.json"))
-            print(f"✅ 已處理檔案: {len(processed_files)}")
-            print(f"🔄 待處理檔案: {len(pdf_files) - len(processed_files)}")
+            # 以處理清單的指紋判斷是否需要重新處理
+            manifest = ProcessingManifest.for_directory(data_dir)
+            extractor_version = self.processor.get_extractor_version()
+            unprocessed = []
+            
+            for pdf_file in pdf_files:
+                json_file = pdf_file.with_suffix('.json')
+                if not json_file.exists():
+                    continue
+                fingerprint = manifest.fingerprint(pdf_file, json_file, extractor_version)
+                if not manifest.is_current(pdf_file.name, fingerprint):
+                    unprocessed.append(pdf_file)
             
-            # 顯示未處理的檔案
-            processed_names = {f.name.replace('_enhanced.json', '.pdf') for f in processed_files}
-            unprocessed = [f for f in pdf_files if f.name not in processed_names]
+            print(f"✅ 已處理且為最新: {len(pdf_files) - len(unprocessed)}")
+            print(f"🔄 待處理檔案 (新增或已變更): {len(unprocessed)}")
             
             if unprocessed:
                 print("\n📋 待處理檔案:")
@@ -127,7 +233,7 @@ class SmartProcessorApp:
         """批次回填目錄中的所有檔案"""
         self.logger.info(f"開始批次回填: {data_dir}")
         
-        result = self.processor.batch_backfill(data_dir)
+        result = self.processor.batch_backfill(data_dir, workers=self.workers)
         
         if result.success:
             data = result.data
@@ -159,6 +265,11 @@ def main():
     parser.add_argument('--backfill-batch', help='批次回填目錄中的所有檔案')
     parser.add_argument('--enhanced-file', help='增強JSON檔案路徑（用於單一回填）')
     parser.add_argument('--original-file', help='原始JSON檔案路徑（用於單一回填）')
+    parser.add_argument('--backfill-prior', action='store_true', help='以比較期欄位回填缺少或空白的前期JSON')
+    parser.add_argument('--workers', type=int, help='批次處理的平行工作者數量 (預設為配置的 batch_workers)')
+    parser.add_argument('--force', action='store_true', help='忽略處理清單，重新處理所有檔案')
+    parser.add_argument('--resume', action='store_true', help='略過處理追蹤器中已完成增強的檔案 (不重新計算指紋)')
+    parser.add_argument('--watchlist', help='優先處理的股票代碼，以逗號分隔 (最新季度與名單內股票先處理)')
     
     args = parser.parse_args()
     
@@ -171,7 +282,8 @@ def main():
             with open(config_path, 'r', encoding='utf-8') as f:
                 config = json.load(f)
     
-    app = SmartProcessorApp(config)
+    app = SmartProcessorApp(config, backfill_prior=args.backfill_prior, workers=args.workers, force=args.force,
+                            resume=args.resume, watchlist=args.watchlist.split(',') if args.watchlist else None)
     
     # 檢查狀態
     if args.status:
@@ -227,7 +339,7 @@ def main():
         if result:
             print(f"✅ 回填完成")
         return
-
+    
     # 如果沒有提供參數，顯示幫助
     parser.print_help()
 
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次執行模組 - 共用的平行批次執行器、佇列策略與串流管線
+"""
+
+from .executor import (
+    BatchExecutor,
+    ItemResult,
+    QueuePolicy,
+    FIFOPolicy,
+    LongestJobFirstPolicy,
+    file_size_cost,
+    page_count_cost,
+    get_worker_instance
+)
+from .governor import MemoryGovernor
+from .manifest import ProcessingManifest
+from .coordinator import LeaseCoordinator, ShardedBatchRunner, ShardStatus, shard_queries
+from .page_scheduler import PageRangeScheduler
+from .pipeline import Pipeline, PipelineResult, Stage
+from .scheduler import FilingPriority, PriorityPolicy
+from .filing_pipeline import FilingPipeline
+from .planner import BackfillPlan, BackfillPlanner, Coverage, parse_period
+
+__all__ = [
+    'BatchExecutor',
+    'ItemResult',
+    'QueuePolicy',
+    'FIFOPolicy',
+    'LongestJobFirstPolicy',
+    'file_size_cost',
+    'page_count_cost',
+    'get_worker_instance',
+    'MemoryGovernor',
+    'ProcessingManifest',
+    'LeaseCoordinator',
+    'ShardedBatchRunner',
+    'ShardStatus',
+    'shard_queries',
+    'PageRangeScheduler',
+    'Pipeline',
+    'PipelineResult',
+    'Stage',
+    'FilingPipeline',
+    'FilingPriority',
+    'PriorityPolicy',
+    'BackfillPlan',
+    'BackfillPlanner',
+    'Coverage',
+    'parse_period'
+]
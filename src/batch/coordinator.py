@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分散式批次協調 - 多個節點以具時效的租約從共用的 SQLite (WAL) 分片表領取工作
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class ShardStatus(Enum):
+    """分片狀態"""
+    PENDING = "pending"    # 待領取
+    LEASED = "leased"      # 已被節點租用 (租約到期後可被其他節點收回)
+    DONE = "done"          # 已完成
+    FAILED = "failed"      # 超過嘗試次數
+
+
+@dataclass
+class Lease:
+    """節點持有的分片租約"""
+    shard_id: str
+    payload: Any
+    attempts: int
+    expires_at: float
+
+
+def default_node_id() -> str:
+    """預設節點識別碼 (主機名稱-行程ID)"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_queries(queries: Iterable[Dict[str, Any]], shard_size: int) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """將查詢依股票代碼分組後切成分片，同一公司的各季盡量落在同一分片
+    
+    回傳 [(分片ID, 查詢列表)]，分片ID 由第一筆與最後一筆查詢組成，重複建立時保持相同。
+    """
+    ordered = sorted(queries, key=lambda q: (str(q['stock_code']), int(q['year']), str(q['season'])))
+    shards = []
+    for start in range(0, len(ordered), max(1, shard_size)):
+        chunk = ordered[start:start + max(1, shard_size)]
+        first, last = chunk[0], chunk[-1]
+        shard_id = f"{first['stock_code']}_{first['year']}{first['season']}-{last['stock_code']}_{last['year']}{last['season']}"
+        shards.append((shard_id, chunk))
+    return shards
+
+
+class LeaseCoordinator:
+    """以 SQLite (WAL 模式) 檔案協調多個節點的分片租約
+    
+    所有節點共用同一個資料庫檔案 (同一台機器或共用檔案系統)。領取時在 BEGIN IMMEDIATE 交易中
+    選出待領取或租約已過期的分片並寫入自己的節點ID與到期時間，因此同一分片同時只會被一個節點持有。
+    節點處理期間以心跳延長租約；節點中斷後租約到期，其他節點即可收回重新處理。
+    完成與失敗都只接受目前租約持有者的回報，被收回的分片不會被舊節點覆寫。
+    
+    Args:
+        db_path: 共用資料庫檔案
+        node_id: 節點識別碼，預設為 主機名稱-行程ID
+        lease_seconds: 租約時效(秒)
+        max_attempts: 分片最多嘗試次數 (含租約過期收回)，超過時標記為失敗
+    """
+    
+    def __init__(self, db_path: Path, node_id: Optional[str] = None,
+                 lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.db_path = Path(db_path)
+        self.node_id = node_id or default_node_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger(self.__class__.__name__)
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_database()
+    
+    @classmethod
+    def from_config(cls, db_path: Path, processing: Any, node_id: Optional[str] = None) -> 'LeaseCoordinator':
+        """由處理配置建立"""
+        return cls(db_path, node_id, processing.shard_lease_seconds, processing.shard_max_attempts)
+    
+    def _connect(self) -> sqlite3.Connection:
+        # 自行控制交易 (isolation_level=None)，等待其他節點的寫入鎖
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """寫入交易：BEGIN IMMEDIATE 一開始即取得寫入鎖，避免兩個節點讀到同一個可領取分片"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+    
+    def _init_database(self) -> None:
+        conn = self._connect()
+        try:
+            # WAL 讓讀取 (進度查詢) 不阻擋領取與心跳
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shards (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER DEFAULT 0,
+                    result TEXT,
+                    error_message TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_shard_status ON shards(status, lease_expires)")
+        finally:
+            conn.close()
+    
+    def add_shards(self, shards: Iterable[Tuple[str, Any]]) -> int:
+        """加入分片 [(分片ID, 內容)]，已存在的分片不變，回傳新加入的數量"""
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO shards (id, payload, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(shard_id, json.dumps(payload, ensure_ascii=False), ShardStatus.PENDING.value, now)
+                 for shard_id, payload in shards]
+            )
+            return conn.total_changes - before
+    
+    def claim(self) -> Optional[Lease]:
+        """領取一個待處理或租約已過期的分片，沒有可領取的分片時回傳 None"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("""
+                SELECT id, payload, attempts, owner FROM shards
+                WHERE status = ? OR (status = ? AND lease_expires < ? AND attempts < ?)
+                ORDER BY attempts, id
+                LIMIT 1
+            """, (ShardStatus.PENDING.value, ShardStatus.LEASED.value, now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            
+            if row['owner']:
+                self.logger.warning(f"收回租約已過期的分片 {row['id']} (原節點 {row['owner']})")
+            
+            expires_at = now + self.lease_seconds
+            attempts = row['attempts'] + 1
+            conn.execute("""
+                UPDATE shards SET status = ?, owner = ?, lease_expires = ?, attempts = ?, updated_at = ?
+                WHERE id = ?
+            """, (ShardStatus.LEASED.value, self.node_id, expires_at, attempts, now, row['id']))
+        
+        return Lease(row['id'], json.loads(row['payload']), attempts, expires_at)
+    
+    def heartbeat(self, shard_id: str) -> bool:
+        """延長自己持有的租約，租約已被收回時回傳 False"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE shards SET lease_expires = ?, updated_at = ?
+                WHERE id = ? AND owner = ? AND status = ?
+            """, (now + self.lease_seconds, now, shard_id, self.node_id, ShardStatus.LEASED.value))
+            return cursor.rowcount == 1
+    
+    def complete(self, shard_id: str, result: Any = None) -> bool:
+        """回報分片完成，只有目前的租約持有者能回報"""
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE shards SET status = ?, lease_expires = NULL, result = ?, error_message = NULL, updated_at = ?
+                WHERE id = ? AND owner = ? AND status = ?
+            """, (ShardStatus.DONE.value, json.dumps(result, ensure_ascii=False, default=str), time.time(),
+                  shard_id, self.node_id, ShardStatus.LEASED.value))
+            return cursor.rowcount == 1
+    
+    def fail(self, shard_id: str, error: str, result: Any = None) -> bool:
+        """回報分片失敗：未超過嘗試次數時放回待領取，否則標記為失敗 (result 為部分結果，None 時保留原值)"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM shards WHERE id = ? AND owner = ? AND status = ?",
+                (shard_id, self.node_id, ShardStatus.LEASED.value)
+            ).fetchone()
+            if row is None:
+                return False
+            
+            status = ShardStatus.FAILED if row['attempts'] >= self.max_attempts else ShardStatus.PENDING
+            conn.execute("""
+                UPDATE shards SET status = ?, owner = NULL, lease_expires = NULL, error_message = ?,
+                    result = COALESCE(?, result), updated_at = ?
+                WHERE id = ?
+            """, (status.value, error, None if result is None else json.dumps(result, ensure_ascii=False, default=str),
+                  time.time(), shard_id))
+            return True
+    
+    def release_expired(self) -> int:
+        """把租約已過期且超過嘗試次數的分片標記為失敗，回傳數量"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE shards SET status = ?, owner = NULL, lease_expires = NULL,
+                    error_message = '租約過期次數超過上限', updated_at = ?
+                WHERE status = ? AND lease_expires < ? AND attempts >= ?
+            """, (ShardStatus.FAILED.value, now, ShardStatus.LEASED.value, now, self.max_attempts))
+            return cursor.rowcount
+    
+    def has_unfinished(self) -> bool:
+        """是否還有待領取或租用中的分片"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM shards WHERE status IN (?, ?)",
+                (ShardStatus.PENDING.value, ShardStatus.LEASED.value)
+            ).fetchone()
+            return row[0] > 0
+        finally:
+            conn.close()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """各狀態的分片數量與各節點持有的租約"""
+        conn = self._connect()
+        try:
+            counts = {status.value: 0 for status in ShardStatus}
+            for row in conn.execute("SELECT status, COUNT(*) AS count FROM shards GROUP BY status"):
+                counts[row['status']] = row['count']
+            
+            leases = {}
+            for row in conn.execute("SELECT owner, COUNT(*) AS count FROM shards WHERE status = ? GROUP BY owner",
+                                    (ShardStatus.LEASED.value,)):
+                leases[row['owner']] = row['count']
+            
+            failed = [
+                {'id': row['id'], 'attempts': row['attempts'], 'error': row['error_message'],
+                 'result': json.loads(row['result']) if row['result'] else None}
+                for row in conn.execute("SELECT id, attempts, error_message, result FROM shards WHERE status = ?",
+                                        (ShardStatus.FAILED.value,))
+            ]
+        finally:
+            conn.close()
+        
+        return {
+            'total': sum(counts.values()),
+            'by_status': counts,
+            'leases_by_node': leases,
+            'failed_shards': failed
+        }
+
+
+class ShardedBatchRunner:
+    """單一節點的分片執行迴圈
+    
+    反覆領取分片並以 process_shard(內容) 處理，處理期間由背景執行緒定期發送心跳。
+    沒有可領取的分片但其他節點仍持有租約時持續等待，直到分片全部完成或租約過期被收回。
+    處理函數逐項捕捉錯誤時 (例如串流管線)，回傳含非空 failed 列表的字典表示有項目失敗：
+    記錄為部分結果並放回重試，不會標記為完成。
+    
+    Args:
+        coordinator: 租約協調器
+        process_shard: 分片處理函數，回傳值記錄為分片結果；拋出例外或回傳的 failed 非空時分片視為失敗
+        heartbeat_interval: 心跳間隔(秒)，預設為租約時效的三分之一
+        poll_interval: 等待其他節點時的檢查間隔(秒)
+    """
+    
+    def __init__(self, coordinator: LeaseCoordinator, process_shard: Callable[[Any], Any],
+                 heartbeat_interval: Optional[float] = None, poll_interval: float = 5.0):
+        self.coordinator = coordinator
+        self.process_shard = process_shard
+        self.heartbeat_interval = heartbeat_interval or coordinator.lease_seconds / 3
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    def run(self, max_shards: Optional[int] = None) -> Dict[str, int]:
+        """執行到沒有未完成的分片 (或處理了 max_shards 個分片)，回傳本節點的統計"""
+        stats = {'claimed': 0, 'completed': 0, 'failed': 0, 'lost': 0}
+        
+        while max_shards is None or stats['claimed'] < max_shards:
+            lease = self.coordinator.claim()
+            if lease is None:
+                self.coordinator.release_expired()
+                if not self.coordinator.has_unfinished():
+                    break
+                # 其他節點仍持有租約：等待完成或過期後收回
+                time.sleep(self.poll_interval)
+                continue
+            
+            stats['claimed'] += 1
+            self.logger.info(f"節點 {self.coordinator.node_id} 領取分片 {lease.shard_id} (第 {lease.attempts} 次)")
+            stats[self._run_lease(lease)] += 1
+        
+        return stats
+    
+    def _run_lease(self, lease: Lease) -> str:
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(lease.shard_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.process_shard(lease.payload)
+        except Exception as e:
+            self.logger.error(f"分片 {lease.shard_id} 處理失敗: {e}")
+            return 'failed' if self.coordinator.fail(lease.shard_id, str(e)) else 'lost'
+        finally:
+            stop.set()
+            heartbeat.join()
+        
+        failed = result.get('failed') if isinstance(result, dict) else None
+        if failed:
+            # 例如主機故障時下載快速失敗：分片放回重試直到超過嘗試次數，已完成的項目重試時會略過
+            self.logger.error(f"分片 {lease.shard_id} 有 {len(failed)} 個項目失敗")
+            error = f"{len(failed)} 個項目失敗"
+            return 'failed' if self.coordinator.fail(lease.shard_id, error, result) else 'lost'
+        
+        if not self.coordinator.complete(lease.shard_id, result):
+            # 租約已被其他節點收回，由新的持有者回報結果
+            self.logger.warning(f"分片 {lease.shard_id} 的租約已失效，結果未記錄")
+            return 'lost'
+        return 'completed'
+    
+    def _heartbeat(self, shard_id: str, stop: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                if not self.coordinator.heartbeat(shard_id):
+                    self.logger.warning(f"分片 {shard_id} 的租約已被收回")
+                    return
+            except sqlite3.Error as e:
+                self.logger.warning(f"分片 {shard_id} 心跳失敗: {e}")
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次執行器 - 提供循序、執行緒與行程三種後端的共用批次執行介面
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TYPE_CHECKING
+
+from .memory import MB, read_process_memory, reset_peak_memory
+
+if TYPE_CHECKING:
+    from .governor import MemoryGovernor
+
+
+BACKENDS = ('serial', 'thread', 'process', 'isolated')
+
+# 每個工作行程各自快取的物件 (例如處理器)，避免每個項目重新初始化
+_worker_instances: Dict[str, Any] = {}
+
+
+@dataclass
+class ItemResult:
+    """單一項目的執行結果"""
+    index: int                    # 項目在輸入序列中的位置
+    item: Any
+    success: bool
+    value: Any = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    duration: float = 0.0         # 執行時間(秒)
+    peak_rss: Optional[int] = None  # 工作行程執行此項目時的峰值記憶體(位元組)，僅行程後端量測
+    worker_pid: Optional[int] = None  # 執行此項目的工作行程ID，與 peak_rss 同時記錄
+    watchdog: Optional[str] = None  # 被監控程式終止的原因: timeout / memory
+
+
+def get_worker_instance(key: str, factory: Callable[[], Any]) -> Any:
+    """取得目前行程中快取的物件，不存在時以 factory 建立"""
+    if key not in _worker_instances:
+        _worker_instances[key] = factory()
+    return _worker_instances[key]
+
+
+def item_path(item: Any) -> Optional[Path]:
+    """取得項目對應的檔案路徑 (支援路徑、tuple/list 的第一個元素與含 pdf_path 的字典)"""
+    if isinstance(item, (str, Path)):
+        return Path(item)
+    if isinstance(item, (tuple, list)) and item:
+        return item_path(item[0])
+    if isinstance(item, dict):
+        for key in ('pdf_path', 'path', 'file'):
+            if key in item:
+                return item_path(item[key])
+    return None
+
+
+def file_size_cost(item: Any) -> float:
+    """以檔案大小估計項目成本"""
+    path = item_path(item)
+    try:
+        return float(path.stat().st_size) if path else 0.0
+    except OSError:
+        return 0.0
+
+
+def page_count_cost(item: Any) -> float:
+    """以PDF頁數估計項目成本，無法讀取時退回檔案大小"""
+    path = item_path(item)
+    if path is None or path.suffix.lower() != '.pdf':
+        return file_size_cost(item)
+    
+    try:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return float(len(pdf.pages))
+    except Exception:
+        return file_size_cost(item)
+
+
+class QueuePolicy:
+    """佇列策略：決定項目的開始順序"""
+    
+    def order(self, items: Sequence[Any]) -> List[int]:
+        return list(range(len(items)))
+
+
+class FIFOPolicy(QueuePolicy):
+    """依輸入順序執行"""
+
+
+class LongestJobFirstPolicy(QueuePolicy):
+    """最長工作優先：大型PDF先開始，避免批次尾端只剩一個大檔在執行"""
+    
+    def __init__(self, cost_func: Callable[[Any], float] = file_size_cost):
+        self.cost_func = cost_func
+    
+    def order(self, items: Sequence[Any]) -> List[int]:
+        costs = [self.cost_func(item) for item in items]
+        return sorted(range(len(items)), key=lambda index: costs[index], reverse=True)
+
+
+def _run_item(func: Callable[[Any], Any], index: int, item: Any, measure_memory: bool = False) -> ItemResult:
+    """執行單一項目並捕捉錯誤 (模組層級函數，可供行程後端序列化)"""
+    measure_memory = measure_memory and reset_peak_memory()
+    start = time.perf_counter()
+    try:
+        value = func(item)
+        result = ItemResult(index, item, True, value=value, duration=time.perf_counter() - start)
+    except Exception as e:
+        result = ItemResult(
+            index, item, False,
+            error=str(e),
+            error_type=type(e).__name__,
+            duration=time.perf_counter() - start
+        )
+    
+    if measure_memory:
+        result.peak_rss = read_process_memory(field_name='VmHWM')
+        result.worker_pid = os.getpid()
+    return result
+
+
+class BatchExecutor:
+    """批次執行器
+    
+    Args:
+        backend: serial / thread / process / isolated；行程與隔離後端的 func 與項目必須可序列化，
+            isolated 每個工作行程一次只執行一個項目，超過 timeout 或 memory_limit 時終止並重建
+        workers: 工作者數量，預設為 CPU 核心數
+        policy: 佇列策略，預設依輸入順序
+        progress: 進度回呼 progress(完成數, 總數, ItemResult)，在呼叫端執行緒中執行
+        max_pending: 同時送出的項目上限，預設為 workers 的兩倍
+        governor: 記憶體調控器 (MemoryGovernor)，依預估記憶體決定是否送出下一個項目
+        timeout: isolated 後端的單一項目執行時間上限(秒)
+        memory_limit: isolated 後端的工作行程 RSS 上限(位元組)
+    """
+    
+    # 使用記憶體調控器時取樣工作行程 RSS 的間隔(秒)
+    SAMPLE_INTERVAL = 1.0
+    
+    def __init__(self, backend: str = 'serial', workers: Optional[int] = None,
+                 policy: Optional[QueuePolicy] = None,
+                 progress: Optional[Callable[[int, int, ItemResult], None]] = None,
+                 max_pending: Optional[int] = None,
+                 governor: Optional['MemoryGovernor'] = None,
+                 timeout: Optional[float] = None, memory_limit: Optional[int] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的執行後端: {backend}")
+        
+        self.backend = backend
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.policy = policy or FIFOPolicy()
+        self.progress = progress
+        self.max_pending = max(1, max_pending or self.workers * 2)
+        self.governor = governor
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    @classmethod
+    def for_workers(cls, workers: int, backend: str = 'process', **kwargs) -> 'BatchExecutor':
+        """依工作者數量建立執行器：1 以下使用循序後端"""
+        if workers <= 1:
+            return cls('serial', 1, **kwargs)
+        return cls(backend, workers, **kwargs)
+    
+    @classmethod
+    def for_config(cls, workers: int, processing: Any, backend: Optional[str] = None, **kwargs) -> 'BatchExecutor':
+        """依處理配置建立執行器：設定了文件時間或記憶體上限時一律使用隔離後端"""
+        timeout = processing.document_timeout or None
+        memory_limit = processing.document_memory_limit_mb * MB if processing.document_memory_limit_mb else None
+        
+        if timeout or memory_limit:
+            return cls('isolated', workers, timeout=timeout, memory_limit=memory_limit, **kwargs)
+        return cls.for_workers(workers, backend or processing.batch_backend, **kwargs)
+    
+    def map(self, func: Callable[[Any], Any], items: Sequence[Any]) -> List[ItemResult]:
+        """對所有項目執行 func，結果依輸入順序回傳"""
+        items = list(items)
+        results: List[Optional[ItemResult]] = [None] * len(items)
+        for result in self.imap_unordered(func, items):
+            results[result.index] = result
+        return results
+    
+    def imap_unordered(self, func: Callable[[Any], Any], items: Sequence[Any]) -> Iterator[ItemResult]:
+        """對所有項目執行 func，依完成順序產生結果
+        
+        已產生的結果不再保留，呼叫端逐筆寫出時記憶體用量不隨批次大小增加。
+        """
+        items = list(items)
+        order = self.policy.order(items)
+        
+        if self.backend == 'isolated':
+            yield from self._run_isolated(func, items, order)
+        elif self.backend == 'serial' or len(items) <= 1:
+            for done, index in enumerate(order, 1):
+                result = _run_item(func, index, items[index])
+                self._report(done, len(items), result)
+                yield result
+        else:
+            with self._create_pool() as pool:
+                yield from self._run_pool(pool, func, items, order)
+    
+    def _create_pool(self) -> Executor:
+        if self.backend == 'process':
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+    
+    def _run_pool(self, pool: Executor, func: Callable[[Any], Any], items: List[Any],
+                  order: List[int]) -> Iterator[ItemResult]:
+        """依佇列順序送出項目，同時保持最多 max_pending 個未完成項目
+        
+        有記憶體調控器時，佇列最前面的項目未獲准前不送出後續項目，避免大檔被小檔持續插隊。
+        """
+        queue = deque(order)
+        pending: Dict[Future, int] = {}
+        done_count = 0
+        governor = self.governor
+        measure_memory = self.backend == 'process' and governor is not None
+        
+        if governor:
+            governor.start(self.workers)
+        
+        while queue or pending:
+            while queue and len(pending) < self.max_pending:
+                index = self._next_admitted(queue, items)
+                if index is None:
+                    break
+                pending[pool.submit(_run_item, func, index, items[index], measure_memory)] = index
+            
+            finished, _ = wait(
+                pending,
+                timeout=self.SAMPLE_INTERVAL if governor else None,
+                return_when=FIRST_COMPLETED
+            )
+            if measure_memory:
+                # 取樣已回報過結果的工作行程 (行程ID 由項目結果得知)
+                governor.sample_workers()
+            
+            for future in finished:
+                index = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 工作行程異常終止或結果無法序列化
+                    result = ItemResult(index, items[index], False, error=str(e), error_type=type(e).__name__)
+                
+                if governor:
+                    governor.release(index, result.peak_rss, result.worker_pid)
+                
+                done_count += 1
+                self._report(done_count, len(items), result)
+                yield result
+    
+    def _run_isolated(self, func: Callable[[Any], Any], items: List[Any],
+                      order: List[int]) -> Iterator[ItemResult]:
+        """每個項目在隔離的工作行程中執行，由監控程式強制執行時間與記憶體上限"""
+        # watchdog 模組依賴本模組的 ItemResult 與 _run_item
+        from .watchdog import IsolatedWorkerPool
+        
+        queue = deque(order)
+        done_count = 0
+        if self.governor:
+            self.governor.start(self.workers)
+        
+        pool = IsolatedWorkerPool(self.workers, self.timeout, self.memory_limit)
+        try:
+            while queue or pool.busy_count:
+                while queue and pool.idle_count:
+                    index = self._next_admitted(queue, items)
+                    if index is None:
+                        break
+                    pool.submit(func, index, items[index], measure_memory=True)
+                
+                for result in pool.wait(self.SAMPLE_INTERVAL):
+                    if self.governor:
+                        self.governor.release(result.index, result.peak_rss, result.worker_pid)
+                    
+                    done_count += 1
+                    self._report(done_count, len(items), result)
+                    yield result
+        finally:
+            pool.shutdown()
+    
+    def _next_admitted(self, queue: deque, items: List[Any]) -> Optional[int]:
+        """取出佇列最前面的項目；有記憶體調控器且尚未獲准時回傳 None"""
+        index = queue[0]
+        if self.governor:
+            if not self.governor.can_admit(index, items[index]):
+                return None
+            self.governor.admit(index, items[index])
+        return queue.popleft()
+    
+    def _report(self, done: int, total: int, result: ItemResult) -> None:
+        if not result.success:
+            self.logger.error(f"批次項目失敗 [{result.index}]: {result.error}")
+        
+        if self.progress:
+            try:
+                self.progress(done, total, result)
+            except Exception as e:
+                self.logger.warning(f"進度回呼失敗: {e}")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+財報串流管線 - 下載 → 智慧處理 → 回填與索引更新，每份財報下載完成後立即進入處理
+"""
+
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..core import get_config
+from ..utils.circuit_breaker import RetryBudget
+from ..utils.index_manager import MasterIndexManager
+from .pipeline import Pipeline, PipelineResult, Stage
+from .scheduler import FilingPriority
+from .tasks import extract_filing_task
+
+
+class FilingPipeline:
+    """財報串流管線
+    
+    Args:
+        crawler_config: 傳給 FinancialCrawler 的配置字典 (例如 output_dir)
+        crawl_workers / process_workers / backfill_workers: 各階段工作者數量
+        queue_size: 各階段輸入佇列上限，0 為該階段工作者數量的兩倍
+        backfill_prior: 處理時是否以比較期欄位回填前期JSON
+        progress: 進度回呼 progress(完成數, PipelineResult)
+        watchlist: 觀察名單；指定 (或啟用 priority_scheduling) 時各階段依優先分數與等待時間排程，
+            查詢可帶 deadline (ISO 時間) 提高急迫的項目
+        refresh: 重新下載本機已存在且與主索引記錄相符的PDF (預設略過)
+    """
+    
+    def __init__(self, crawler_config: Optional[Dict[str, Any]] = None,
+                 crawl_workers: int = 1, process_workers: int = 1, backfill_workers: int = 1,
+                 queue_size: int = 0, backfill_prior: Optional[bool] = None,
+                 progress: Optional[Callable[[int, PipelineResult], None]] = None,
+                 watchlist: Optional[Iterable[str]] = None, refresh: bool = False):
+        self.crawler_config = crawler_config
+        self.crawl_workers = crawl_workers
+        self.process_workers = process_workers
+        self.backfill_workers = backfill_workers
+        self.queue_size = queue_size
+        self.backfill_prior = backfill_prior
+        self.progress = progress
+        self.watchlist = watchlist
+        self.refresh = refresh
+        self.logger = logging.getLogger(self.__class__.__name__)
+        
+        # 下載執行緒共用同一個爬蟲 (各執行緒有自己的 Session)，同一公司的文件清單只查詢一次
+        self._crawler = None
+        self._crawler_lock = threading.Lock()
+        self._smart_processor = None
+        self._processor_lock = threading.Lock()
+        self.index_manager = MasterIndexManager()
+    
+    def build_stages(self) -> List[Stage]:
+        """建立管線階段"""
+        processing = get_config().processing
+        return [
+            Stage('crawl', self.crawl, self.crawl_workers, self.queue_size),
+            Stage('extract', extract_filing_task, self.process_workers, self.queue_size,
+                  backend=processing.batch_backend),
+            Stage('backfill', self.backfill, self.backfill_workers, self.queue_size),
+        ]
+    
+    def run(self, queries: Iterable[Dict[str, Any]]) -> List[PipelineResult]:
+        """執行管線，queries 為已驗證與標準化的查詢
+        
+        每次執行有自己的重試預算 (依查詢數量)，下載執行緒共用，執行結束後移除。
+        """
+        processing = get_config().processing
+        queries = list(queries)
+        pipeline = Pipeline(
+            self.build_stages(),
+            progress=self.progress,
+            priority=FilingPriority.from_config(processing, self.watchlist),
+            aging_rate=processing.priority_aging_rate
+        )
+        
+        crawler = self._get_crawler()
+        crawler.retry_budget = RetryBudget.for_batch(len(queries), float(crawler._setting('retry_budget_ratio')))
+        try:
+            return pipeline.run(queries)
+        finally:
+            crawler.retry_budget = None
+    
+    def crawl(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """下載階段：下載PDF並建立JSON與索引記錄 (各下載執行緒共用爬蟲的主機限速器與文件清單快取)"""
+        result = self._get_crawler().process(query)
+        if not result.success:
+            raise RuntimeError(result.message)
+        
+        return {
+            'query': query,
+            'pdf_path': Path(result.data['pdf_path']),
+            'json_path': Path(result.data['json_path']),
+            'backfill_prior': self.backfill_prior
+        }
+    
+    def backfill(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """回填階段：將擷取結果寫回原始JSON並更新主索引"""
+        result = self._get_smart_processor().backfill_to_original_json(Path(item['output_path']), item['json_path'])
+        if not result.success:
+            raise RuntimeError(result.message)
+        
+        query = item['query']
+        self.index_manager.update_report(
+            MasterIndexManager.report_id(query['stock_code'], query['year'], query['season']),
+            enhanced_file=str(item['output_path']).replace('\\', '/'),
+            extraction_confidence=item.get('confidence_level'),
+            processed_at=datetime.now().isoformat()
+        )
+        
+        return {**item, 'updated_fields': result.data.get('updated_fields')}
+    
+    def _get_crawler(self):
+        with self._crawler_lock:
+            if self._crawler is None:
+                from ..core.crawler import FinancialCrawler
+                self._crawler = FinancialCrawler(self.crawler_config, refresh=self.refresh)
+            return self._crawler
+    
+    def _get_smart_processor(self):
+        # 回填只讀寫JSON，各執行緒可共用同一個處理器
+        with self._processor_lock:
+            if self._smart_processor is None:
+                from ..processors.smart_processor import SmartFinancialProcessor
+                self._smart_processor = SmartFinancialProcessor(get_config())
+            return self._smart_processor
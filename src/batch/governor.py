@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+記憶體調控器 - 依預估記憶體與系統可用記憶體決定是否送出新項目，並動態調整並行數
+"""
+
+import re
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from .executor import item_path
+from .memory import MB, read_meminfo, read_process_memory
+
+
+def pdf_page_count(path: Path) -> int:
+    """讀取PDF頁數 (只解析頁面樹，不做版面分析)，失敗時回傳 0"""
+    try:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return 0
+
+
+# 頁面樹根節點 (/Type /Pages) 字典中的 /Count，鍵的順序不固定
+PAGES_DICT_PATTERN = re.compile(rb'<<[^<>]*?/Type\s*/Pages\b[^<>]*?>>', re.DOTALL)
+COUNT_PATTERN = re.compile(rb'/Count\s+(\d+)')
+
+
+def pdf_page_count_hint(path: Path, chunk_size: int = 1024 * 1024) -> int:
+    """以原始位元組搜尋頁面樹的 /Count 估計頁數 (不解析PDF)，找不到時回傳 0
+    
+    頁面樹位於壓縮的物件串流 (PDF 1.5 以上) 時無法取得，呼叫端應退回以檔案大小估計。
+    """
+    pages = 0
+    tail = b''
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                data = tail + chunk
+                for match in PAGES_DICT_PATTERN.finditer(data):
+                    count = COUNT_PATTERN.search(match.group(0))
+                    if count:
+                        pages = max(pages, int(count.group(1)))
+                # 保留區塊尾端，避免字典跨越區塊邊界
+                tail = data[-4096:]
+    except OSError:
+        return 0
+    return pages
+
+
+class MemoryGovernor:
+    """記憶體調控器
+    
+    以頁數 (由原始位元組取得，不解析PDF) 與檔案大小作為先驗估計每個項目的記憶體用量，
+    並以工作者回報的實際峰值修正估計值；工作行程ID 由項目結果回報，供取樣各行程的 RSS。
+    只有在「執行中項目的預估總量 + 新項目」不超過預算，且系統可用記憶體
+    扣除保留量後仍足夠時才送出新項目；系統可用記憶體低於保留量時降低並行數，
+    回到兩倍保留量以上時再逐步提高。
+    
+    Args:
+        budget_bytes: 記憶體預算，預設為建立時系統可用記憶體的 budget_fraction
+        reserve_bytes: 系統需保留的可用記憶體
+        base_bytes: 每個項目的固定開銷
+        bytes_per_page: 每頁的預估記憶體
+        bytes_per_file_byte: 每位元組檔案大小的預估記憶體
+        meminfo: 讀取系統可用記憶體的函數 (測試時可替換)
+    """
+    
+    # 實際峰值 / 先驗估計 的指數移動平均權重
+    CORRECTION_ALPHA = 0.3
+    
+    def __init__(self, budget_bytes: Optional[int] = None, budget_fraction: float = 0.75,
+                 reserve_bytes: int = 512 * MB, base_bytes: int = 64 * MB,
+                 bytes_per_page: int = 4 * MB, bytes_per_file_byte: float = 4.0,
+                 meminfo: Callable[[], Optional[int]] = read_meminfo):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.meminfo = meminfo
+        self.reserve_bytes = reserve_bytes
+        self.base_bytes = base_bytes
+        self.bytes_per_page = bytes_per_page
+        self.bytes_per_file_byte = bytes_per_file_byte
+        
+        if budget_bytes is None:
+            available = meminfo()
+            budget_bytes = int(available * budget_fraction) if available else None
+        self.budget_bytes = budget_bytes
+        
+        self.correction = 1.0
+        self.limit: Optional[int] = None
+        self.max_workers = 1
+        self.in_flight: Dict[int, int] = {}
+        self.worker_rss: Dict[int, int] = {}
+        self.worker_pids: Set[int] = set()
+        self._priors: Dict[int, int] = {}
+    
+    @classmethod
+    def from_config(cls, processing: Any) -> 'MemoryGovernor':
+        """由處理配置建立 (memory_budget_mb 為 0 時自動依系統可用記憶體決定)"""
+        return cls(
+            budget_bytes=processing.memory_budget_mb * MB if processing.memory_budget_mb else None,
+            reserve_bytes=processing.memory_reserve_mb * MB
+        )
+    
+    def start(self, workers: int) -> None:
+        """批次開始時設定並行上限"""
+        self.max_workers = max(1, workers)
+        self.limit = self.max_workers
+        self.in_flight.clear()
+        self._priors.clear()
+        self.worker_pids.clear()
+        self.worker_rss = {}
+    
+    def prior(self, item: Any) -> int:
+        """以頁數與檔案大小估計項目的記憶體用量"""
+        path = item_path(item)
+        if path is None:
+            return self.base_bytes
+        
+        try:
+            size = path.stat().st_size
+        except OSError:
+            size = 0
+        
+        pages = pdf_page_count_hint(path) if path.suffix.lower() == '.pdf' else 0
+        return int(self.base_bytes + pages * self.bytes_per_page + size * self.bytes_per_file_byte)
+    
+    def estimate(self, index: int, item: Any) -> int:
+        """修正後的預估記憶體用量"""
+        if index not in self._priors:
+            self._priors[index] = self.prior(item)
+        return int(self._priors[index] * self.correction)
+    
+    def can_admit(self, index: int, item: Any) -> bool:
+        """判斷是否可以送出新項目 (沒有執行中項目時一律允許，確保批次能前進)"""
+        if not self.in_flight:
+            return True
+        if self.limit is not None and len(self.in_flight) >= self.limit:
+            return False
+        
+        estimate = self.estimate(index, item)
+        projected = max(sum(self.in_flight.values()), sum(self.worker_rss.values())) + estimate
+        if self.budget_bytes is not None and projected > self.budget_bytes:
+            return False
+        
+        available = self.meminfo()
+        return available is None or available - self.reserve_bytes >= estimate
+    
+    def admit(self, index: int, item: Any) -> None:
+        """記錄已送出的項目"""
+        estimate = self.estimate(index, item)
+        if self.budget_bytes is not None and estimate > self.budget_bytes:
+            self.logger.warning(f"項目 [{index}] 預估記憶體 {estimate // MB}MB 超過預算，單獨執行")
+        self.in_flight[index] = estimate
+    
+    def release(self, index: int, peak_rss: Optional[int] = None, worker_pid: Optional[int] = None) -> None:
+        """項目完成：以實際峰值修正估計，記錄工作行程ID，並依系統可用記憶體調整並行數"""
+        self.in_flight.pop(index, None)
+        if worker_pid:
+            self.worker_pids.add(worker_pid)
+        prior = self._priors.pop(index, None)
+        
+        if peak_rss and prior:
+            ratio = peak_rss / prior
+            self.correction = (1 - self.CORRECTION_ALPHA) * self.correction + self.CORRECTION_ALPHA * ratio
+        
+        self._adapt()
+    
+    def sample_workers(self, pids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """取樣各工作行程的 RSS (預設為項目結果回報過的行程，已結束的行程不再追蹤)"""
+        self.worker_rss = {}
+        for pid in list(self.worker_pids if pids is None else pids):
+            rss = read_process_memory(pid)
+            if rss is not None:
+                self.worker_rss[pid] = rss
+            else:
+                self.worker_pids.discard(pid)
+        return self.worker_rss
+    
+    def _adapt(self) -> None:
+        available = self.meminfo()
+        if available is None or self.limit is None:
+            return
+        
+        if available < self.reserve_bytes and self.limit > 1:
+            self.limit -= 1
+            self.logger.info(f"系統可用記憶體不足 ({available // MB}MB)，並行數降為 {self.limit}")
+        elif available > self.reserve_bytes * 2 and self.limit < self.max_workers:
+            self.limit += 1
+            self.logger.debug(f"並行數提高為 {self.limit}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+處理清單 (manifest) - 以內容雜湊記錄每個輸入的處理指紋，批次處理時略過未變更的輸入
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..utils.helpers import file_sha256
+
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = "processing_manifest.json"
+
+# 來源JSON只取識別欄位計算指紋：回填會把財務數值與 metadata 寫回來源JSON，
+# 若納入這些欄位，每次回填都會讓清單失效
+JSON_IDENTITY_FIELDS = ('stock_code', 'company_name', 'report_year', 'report_season', 'currency', 'unit')
+
+
+def json_identity_sha256(json_path: Path) -> str:
+    """計算來源JSON識別欄位的雜湊值"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    identity = {key: data.get(key) for key in JSON_IDENTITY_FIELDS} if isinstance(data, dict) else data
+    payload = json.dumps(identity, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ProcessingManifest:
+    """處理清單
+    
+    每個輸入 (以PDF檔名為鍵) 記錄 PDF 雜湊、來源JSON雜湊、擷取器版本與輸出路徑。
+    PDF 的大小與修改時間未變時沿用已記錄的雜湊，不重新讀取檔案。
+    """
+    
+    def __init__(self, manifest_path: Path):
+        self.manifest_path = Path(manifest_path)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+    
+    @classmethod
+    def for_directory(cls, data_dir: Path) -> 'ProcessingManifest':
+        """取得資料目錄的預設清單 (位於 processed 目錄)"""
+        return cls(Path(data_dir) / "processed" / MANIFEST_FILENAME)
+    
+    def _load(self) -> None:
+        if not self.manifest_path.exists():
+            return
+        
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"無法讀取處理清單，將重新建立: {e}")
+            return
+        
+        if data.get('version') == MANIFEST_VERSION:
+            self.entries = data.get('entries', {})
+    
+    def fingerprint(self, pdf_path: Path, json_path: Path, extractor_version: str) -> Dict[str, Any]:
+        """計算輸入指紋"""
+        stat = pdf_path.stat()
+        entry = self.entries.get(pdf_path.name, {})
+        
+        if entry.get('pdf_size') == stat.st_size and entry.get('pdf_mtime_ns') == stat.st_mtime_ns:
+            pdf_hash = entry['pdf_sha256']
+        else:
+            pdf_hash = file_sha256(pdf_path)
+        
+        return {
+            'pdf_sha256': pdf_hash,
+            'pdf_size': stat.st_size,
+            'pdf_mtime_ns': stat.st_mtime_ns,
+            'json_sha256': json_identity_sha256(json_path),
+            'extractor_version': extractor_version
+        }
+    
+    def is_current(self, key: str, fingerprint: Dict[str, Any]) -> bool:
+        """指紋未變且輸出檔案仍存在"""
+        entry = self.entries.get(key)
+        if not entry:
+            return False
+        
+        for field_name in ('pdf_sha256', 'json_sha256', 'extractor_version'):
+            if entry.get(field_name) != fingerprint[field_name]:
+                return False
+        
+        output_path = entry.get('output_path')
+        return bool(output_path) and Path(output_path).exists()
+    
+    def record(self, key: str, fingerprint: Dict[str, Any], output_path: Optional[str]) -> None:
+        """記錄處理完成的輸入"""
+        self.entries[key] = {
+            **fingerprint,
+            'output_path': str(output_path) if output_path else None,
+            'processed_at': datetime.now().isoformat()
+        }
+    
+    def save(self) -> None:
+        """寫入清單 (先寫入暫存檔再取代，避免中斷時留下不完整的清單)"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix('.json.tmp')
+        
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f, ensure_ascii=False, indent=2)
+        
+        os.replace(temp_path, self.manifest_path)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+記憶體量測工具 - 讀取 /proc 的系統可用記憶體與行程 RSS
+"""
+
+from typing import Optional
+
+
+MB = 1024 * 1024
+
+
+def read_meminfo(field_name: str = 'MemAvailable') -> Optional[int]:
+    """讀取 /proc/meminfo 欄位 (位元組)，非 Linux 系統回傳 None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith(field_name + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_process_memory(pid: Optional[int] = None, field_name: str = 'VmRSS') -> Optional[int]:
+    """讀取行程的 VmRSS (目前) 或 VmHWM (峰值) 記憶體 (位元組)"""
+    status_path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(status_path, 'r') as f:
+            for line in f:
+                if line.startswith(field_name + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def reset_peak_memory() -> bool:
+    """重設目前行程的峰值記憶體 (VmHWM)，讓下一個項目量測自己的峰值"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
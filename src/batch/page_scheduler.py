@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跨文件分頁排程 - 將文件切成頁碼範圍工作，閒置工作者可分擔仍在處理中文件的剩餘頁面
+"""
+
+import math
+import logging
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .executor import ItemResult, QueuePolicy, _run_item, item_path
+from .governor import pdf_page_count
+from .tasks import assemble_pages_task, extract_pages_task
+
+
+def item_page_count(item: Any) -> int:
+    """讀取項目對應PDF的頁數"""
+    path = item_path(item)
+    return pdf_page_count(path) if path else 0
+
+
+class _Document:
+    """排程中的文件：尚未分派的頁碼、未完成的分頁工作與已完成的頁面"""
+    
+    def __init__(self, index: int, item: Any, page_count: int):
+        self.index = index
+        self.item = item
+        self.page_count = page_count
+        self.next_page = 1
+        self.outstanding = 0
+        self.pages: List[Any] = []
+        self.duration = 0.0
+        self.failed = False
+    
+    @property
+    def remaining(self) -> int:
+        return self.page_count - self.next_page + 1
+    
+    def take(self, size: int) -> Tuple[int, int]:
+        """分派接下來 size 頁，回傳 (起始頁, 結束頁)"""
+        first = self.next_page
+        last = min(first + size - 1, self.page_count)
+        self.next_page = last + 1
+        self.outstanding += 1
+        return first, last
+
+
+class PageRangeScheduler:
+    """跨文件分頁工作竊取排程器
+    
+    以文件為單位平行處理時，批次尾端常只剩一份數百頁的財報在單一工作者上執行。
+    此排程器把所有文件的頁面放在同一個共用工作池：工作者每次領取目前文件的下一段頁碼範圍，
+    文件的頁面分派完後接著分派下一份文件，因此閒置的工作者總會分擔仍有剩餘頁面的文件。
+    範圍大小採引導式分派 (剩餘總頁數 / 工作者數的一半，限制在 min_pages 與 max_pages 之間)，
+    批次前段以大範圍減少重複開啟PDF的開銷，尾段縮小範圍讓各工作者同時完成。
+    文件的所有頁面完成後送出組合工作，依頁碼組合為與單一文件處理相同的結果。
+    
+    Args:
+        backend: thread / process；行程後端的函數與項目必須可序列化
+        workers: 工作者數量
+        extract_func: extract_func((項目, 起始頁, 結束頁)) -> 各頁結果列表
+        assemble_func: assemble_func((項目, 各頁結果)) -> 文件結果
+        page_count: page_count(項目) -> 頁數 (在呼叫端執行)
+        min_pages / max_pages: 每個分頁工作的頁數範圍
+        policy: 文件的分派順序，預設頁數多者優先
+        progress: 進度回呼 progress(完成數, 總數, ItemResult)，文件完成或失敗時在呼叫端執行緒中呼叫
+    """
+    
+    def __init__(self, backend: str = 'process', workers: int = 1,
+                 extract_func: Callable[[Any], List[Any]] = extract_pages_task,
+                 assemble_func: Callable[[Any], Any] = assemble_pages_task,
+                 page_count: Callable[[Any], int] = item_page_count,
+                 min_pages: int = 4, max_pages: int = 32,
+                 policy: Optional[QueuePolicy] = None,
+                 progress: Optional[Callable[[int, int, ItemResult], None]] = None):
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"分頁排程不支援的執行後端: {backend}")
+        
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.extract_func = extract_func
+        self.assemble_func = assemble_func
+        self.page_count = page_count
+        self.min_pages = max(1, min_pages)
+        self.max_pages = max(self.min_pages, max_pages)
+        self.policy = policy
+        self.progress = progress
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    @classmethod
+    def from_config(cls, workers: int, processing: Any, **kwargs) -> 'PageRangeScheduler':
+        """由處理配置建立"""
+        backend = processing.batch_backend if processing.batch_backend in ('thread', 'process') else 'process'
+        return cls(
+            backend,
+            workers,
+            min_pages=processing.page_chunk_min,
+            max_pages=processing.page_chunk_max,
+            **kwargs
+        )
+    
+    def chunk_size(self, remaining_pages: int) -> int:
+        """依尚未分派的總頁數決定下一個分頁工作的頁數"""
+        size = math.ceil(remaining_pages / (self.workers * 2))
+        return max(self.min_pages, min(self.max_pages, size))
+    
+    def map(self, items: Sequence[Any]) -> List[ItemResult]:
+        """處理所有文件，結果依輸入順序回傳 (每份文件一個 ItemResult)"""
+        items = list(items)
+        results: List[Optional[ItemResult]] = [None] * len(items)
+        for result in self.imap_unordered(items):
+            results[result.index] = result
+        return results
+    
+    def imap_unordered(self, items: Sequence[Any]) -> Iterator[ItemResult]:
+        """處理所有文件，依完成順序產生結果 (已產生的結果不再保留)"""
+        items = list(items)
+        documents = [_Document(index, item, self.page_count(item)) for index, item in enumerate(items)]
+        if self.policy:
+            order = self.policy.order(items)
+        else:
+            order = sorted(range(len(items)), key=lambda index: documents[index].page_count, reverse=True)
+        
+        self._total = len(items)
+        self._done = 0
+        
+        queue = deque()
+        for index in order:
+            if documents[index].page_count > 0:
+                queue.append(documents[index])
+            else:
+                yield self._finish(documents[index], ItemResult(
+                    index, items[index], False, error="無法讀取PDF頁數", error_type='PDFProcessingError'
+                ))
+        
+        with self._create_pool() as pool:
+            yield from self._run(pool, queue)
+    
+    def _create_pool(self) -> Executor:
+        if self.backend == 'process':
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+    
+    def _run(self, pool: Executor, queue: deque) -> Iterator[ItemResult]:
+        # 未完成工作不超過工作者數，尚未開始的頁面保留在共用工作池中供閒置工作者領取
+        pending: Dict[Future, Tuple[str, _Document]] = {}
+        
+        while queue or pending:
+            while queue and len(pending) < self.workers:
+                document = queue[0]
+                first, last = document.take(self.chunk_size(sum(doc.remaining for doc in queue)))
+                if document.remaining == 0:
+                    queue.popleft()
+                future = pool.submit(_run_item, self.extract_func, document.index, (document.item, first, last))
+                pending[future] = ('extract', document)
+            
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, document = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 工作行程異常終止或結果無法序列化
+                    result = ItemResult(document.index, document.item, False, error=str(e), error_type=type(e).__name__)
+                
+                document.duration += result.duration
+                if kind == 'assemble':
+                    yield self._finish(document, ItemResult(
+                        document.index, document.item, result.success,
+                        value=result.value, error=result.error, error_type=result.error_type
+                    ))
+                    continue
+                
+                document.outstanding -= 1
+                if document.failed:
+                    continue
+                
+                if not result.success:
+                    # 文件任一頁碼範圍失敗即視為失敗，不再分派剩餘頁面
+                    document.failed = True
+                    if document in queue:
+                        queue.remove(document)
+                    yield self._finish(document, ItemResult(
+                        document.index, document.item, False, error=result.error, error_type=result.error_type
+                    ))
+                    continue
+                
+                document.pages.extend(result.value)
+                if document.remaining == 0 and document.outstanding == 0:
+                    # 組合工作優先於新的分頁工作送出，完成的文件盡早釋放已提取的頁面
+                    pages, document.pages = document.pages, []
+                    future = pool.submit(_run_item, self.assemble_func, document.index, (document.item, pages))
+                    pending[future] = ('assemble', document)
+    
+    def _finish(self, document: _Document, result: ItemResult) -> ItemResult:
+        result.duration = document.duration
+        self._done += 1
+        
+        if not result.success:
+            self.logger.error(f"批次項目失敗 [{result.index}]: {result.error}")
+        
+        if self.progress:
+            try:
+                self.progress(self._done, self._total, result)
+            except Exception as e:
+                self.logger.warning(f"進度回呼失敗: {e}")
+        
+        return result
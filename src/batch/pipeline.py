@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+串流管線 - 以有界佇列串接多個處理階段，每個項目完成一個階段後立即進入下一階段
+"""
+
+import time
+import queue
+import logging
+import threading
+import itertools
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+# 通知階段工作者結束的標記
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """管線階段
+    
+    Args:
+        name: 階段名稱
+        func: 處理函數，回傳值傳給下一階段；拋出例外時該項目停止於此階段
+        workers: 工作者數量
+        queue_size: 輸入佇列上限，佇列滿時上一階段會等待 (背壓)，0 為 workers 的兩倍
+        backend: thread 或 process；process 時 func 與項目必須可序列化
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 0
+    backend: str = 'thread'
+
+
+@dataclass
+class PipelineResult:
+    """單一項目的管線結果"""
+    index: int                    # 項目在輸入序列中的位置
+    item: Any
+    success: bool = False
+    value: Any = None             # 最後一個完成階段的回傳值
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    failed_stage: Optional[str] = None
+    stage_durations: Dict[str, float] = field(default_factory=dict)  # 各階段執行時間(秒)
+    stage_finished_at: Dict[str, float] = field(default_factory=dict)  # 各階段完成時間 (time.time())
+    started_at: float = 0.0       # 進入管線的時間 (time.time())
+    priority: float = 0.0         # 優先分數 (越小越先處理)
+    latency: float = 0.0          # 進入管線至完成或失敗的時間(秒)
+
+
+class Pipeline:
+    """串流管線
+    
+    每個階段有自己的工作者與有界輸入佇列：下游較慢時佇列填滿，上游工作者會等待，
+    不會無限制地堆積已下載或已擷取的項目。結果依輸入順序回傳。
+    
+    指定 priority 時各階段佇列改為優先佇列，等待中的項目依「優先分數 - aging_rate × 已等待秒數」
+    取出：高優先項目可超越尚未開始的積壓，積壓項目等待越久越優先，不會被持續延後。
+    此時第一個階段的輸入佇列不設上限 (輸入通常只是查詢)，後到的高優先項目不必排在整批積壓之後。
+    
+    Args:
+        stages: 依序執行的階段
+        progress: 進度回呼 progress(完成數, PipelineResult)，項目完成或失敗時呼叫
+        priority: 優先分數函數 priority(項目)，數值越小越先處理
+        aging_rate: 每等待一秒減少的優先分數
+    """
+    
+    def __init__(self, stages: List[Stage], progress: Optional[Callable[[int, PipelineResult], None]] = None,
+                 priority: Optional[Callable[[Any], float]] = None, aging_rate: float = 1.0):
+        if not stages:
+            raise ValueError("管線至少需要一個階段")
+        
+        self.stages = stages
+        self.progress = progress
+        self.priority = priority
+        self.aging_rate = aging_rate
+        self._sequence = itertools.count()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._results: Dict[int, PipelineResult] = {}
+    
+    def run(self, items: Iterable[Any]) -> List[PipelineResult]:
+        """執行管線 (items 可為產生器，輸入也受第一個階段的佇列上限限制)"""
+        queues = [self._create_queue(index, stage) for index, stage in enumerate(self.stages)]
+        pools: Dict[int, Executor] = {
+            index: ProcessPoolExecutor(max_workers=stage.workers)
+            for index, stage in enumerate(self.stages) if stage.backend == 'process'
+        }
+        self._results = {}
+        
+        threads = []
+        for index, stage in enumerate(self.stages):
+            stage_threads = [
+                threading.Thread(
+                    target=self._stage_worker,
+                    args=(index, queues, pools.get(index)),
+                    name=f"{stage.name}-{worker}",
+                    daemon=True
+                )
+                for worker in range(max(1, stage.workers))
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+        
+        try:
+            for index, item in enumerate(items):
+                result = PipelineResult(index, item, value=item, started_at=time.time())
+                if self.priority:
+                    result.priority = self.priority(item)
+                self._put(queues[0], result)
+        finally:
+            # 逐一關閉階段：上一階段的工作者全部結束後，下一階段不會再有新項目
+            for index, stage_threads in enumerate(threads):
+                for _ in stage_threads:
+                    self._put(queues[index], _STOP)
+                for thread in stage_threads:
+                    thread.join()
+            
+            for pool in pools.values():
+                pool.shutdown()
+        
+        return [self._results[index] for index in sorted(self._results)]
+    
+    def _create_queue(self, index: int, stage: Stage) -> queue.Queue:
+        maxsize = stage.queue_size or stage.workers * 2
+        if self.priority is None:
+            return queue.Queue(maxsize=maxsize)
+        return queue.PriorityQueue(maxsize=0 if index == 0 else maxsize)
+    
+    def _put(self, target: queue.Queue, result: Any) -> None:
+        if self.priority is None:
+            target.put(result)
+        elif result is _STOP:
+            # 結束標記排在所有項目之後
+            target.put((float('inf'), next(self._sequence), result))
+        else:
+            # 所有項目以相同速率老化，依 (優先分數 + 老化速率 × 進入時間) 排序即等同依目前的有效優先分數排序
+            target.put((result.priority + self.aging_rate * result.started_at, next(self._sequence), result))
+    
+    def _get(self, source: queue.Queue) -> Any:
+        entry = source.get()
+        return entry if self.priority is None else entry[2]
+    
+    def _stage_worker(self, stage_index: int, queues: List[queue.Queue], pool: Optional[Executor]) -> None:
+        stage = self.stages[stage_index]
+        input_queue = queues[stage_index]
+        output_queue = queues[stage_index + 1] if stage_index + 1 < len(queues) else None
+        
+        while True:
+            result = self._get(input_queue)
+            if result is _STOP:
+                break
+            
+            start = time.perf_counter()
+            try:
+                if pool is not None:
+                    result.value = pool.submit(stage.func, result.value).result()
+                else:
+                    result.value = stage.func(result.value)
+            except Exception as e:
+                result.stage_durations[stage.name] = time.perf_counter() - start
+                result.error = str(e)
+                result.error_type = type(e).__name__
+                result.failed_stage = stage.name
+                self.logger.error(f"管線項目 [{result.index}] 於 {stage.name} 階段失敗: {e}")
+                self._finish(result)
+                continue
+            
+            result.stage_durations[stage.name] = time.perf_counter() - start
+            result.stage_finished_at[stage.name] = time.time()
+            if output_queue is None:
+                result.success = True
+                self._finish(result)
+            else:
+                # 下一階段佇列已滿時在此等待
+                self._put(output_queue, result)
+    
+    def _finish(self, result: PipelineResult) -> None:
+        result.latency = time.time() - result.started_at
+        
+        # 進度回呼也在鎖內執行，呼叫端不需處理多執行緒
+        with self._lock:
+            self._results[result.index] = result
+            if self.progress:
+                try:
+                    self.progress(len(self._results), result)
+                except Exception as e:
+                    self.logger.warning(f"進度回呼失敗: {e}")
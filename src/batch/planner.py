@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回補規劃 - 由主索引與本機檔案建立 公司 × 期別 的涵蓋矩陣，只為缺少或過期的期別產生下載工作
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.helpers import file_sha256, get_company_name, normalize_season, report_filename
+from ..utils.index_manager import MasterIndexManager
+
+
+class Coverage(Enum):
+    """期別的涵蓋狀態"""
+    PRESENT = "present"  # PDF、JSON 與主索引記錄 (大小、雜湊) 一致，不需處理
+    STALE = "stale"      # 有PDF但主索引或JSON缺漏 / 不符，交給爬蟲重新驗證 (內容相符時不需下載)
+    MISSING = "missing"  # 沒有可用的PDF，需要下載
+
+
+def parse_period(text: str, end: bool = False) -> Tuple[int, str]:
+    """解析期別 (2024Q1、2024-Q1、2024-1；只有年度時起點為 Q1、終點為 Q4)"""
+    match = re.fullmatch(r'(\d{4})(?:[-_ ]?[Qq]?([1-4]))?', str(text).strip())
+    if not match:
+        raise ValueError(f"無效的期別: {text}")
+    year, season = match.groups()
+    return int(year), normalize_season(season or ('4' if end else '1'))
+
+
+def period_range(start: Tuple[int, str], end: Tuple[int, str]) -> List[Tuple[int, str]]:
+    """起訖期別之間 (含) 的所有期別，由舊到新"""
+    periods = []
+    year, season = start[0], int(start[1][1])
+    while (year, season) <= (end[0], int(end[1][1])):
+        periods.append((year, f"Q{season}"))
+        year, season = (year + 1, 1) if season == 4 else (year, season + 1)
+    return periods
+
+
+def latest_closed_period(today: Optional[date] = None) -> Tuple[int, str]:
+    """已結束的最近一季 (尚未結束的季度不會有財報)"""
+    today = today or date.today()
+    season = (today.month - 1) // 3
+    return (today.year - 1, 'Q4') if season == 0 else (today.year, f"Q{season}")
+
+
+@dataclass
+class BackfillPlan:
+    """回補規劃結果
+    
+    Args:
+        jobs: 需要交給爬蟲的查詢 (依股票代碼、期別排序，同一公司的期別相鄰以重用文件清單)
+        coverage: 股票代碼 → 期別 (2024Q1) → 涵蓋狀態
+        companies: 股票代碼 → 公司名稱
+    """
+    jobs: List[Dict[str, Any]] = field(default_factory=list)
+    coverage: Dict[str, Dict[str, Coverage]] = field(default_factory=dict)
+    companies: Dict[str, str] = field(default_factory=dict)
+    
+    def summary(self) -> Dict[str, int]:
+        """各涵蓋狀態的期別數量"""
+        counts = {state.value: 0 for state in Coverage}
+        for periods in self.coverage.values():
+            for state in periods.values():
+                counts[state.value] += 1
+        counts['jobs'] = len(self.jobs)
+        counts['companies_to_query'] = len({job['stock_code'] for job in self.jobs})
+        return counts
+    
+    def matrix(self) -> str:
+        """涵蓋矩陣的文字表格 (● 已有 / ◐ 過期 / ○ 缺少)"""
+        marks = {Coverage.PRESENT: '●', Coverage.STALE: '◐', Coverage.MISSING: '○'}
+        periods = sorted({period for row in self.coverage.values() for period in row})
+        lines = ["代碼   " + " ".join(f"{period:>6}" for period in periods)]
+        for stock_code in sorted(self.coverage):
+            row = self.coverage[stock_code]
+            lines.append(f"{stock_code:<6} " + " ".join(
+                f"{marks[row[period]] if period in row else '':>6}" for period in periods
+            ))
+        return "\n".join(lines)
+
+
+class BackfillPlanner:
+    """回補規劃器
+    
+    依主索引 (一次載入) 與輸出目錄中的檔案判斷每個 (公司, 期別) 的狀態：
+    PDF 存在、主索引有成功記錄且大小與雜湊記錄齊全、JSON 存在時為 PRESENT；
+    PDF 存在但其他條件不符為 STALE；PDF 不存在或過小為 MISSING。
+    預設只比對檔案大小，verify 為 True 時另外計算 SHA-256 與主索引比對。
+    
+    Args:
+        output_dir: 爬蟲的輸出目錄 (與 FinancialCrawler 的 output_dir 相同)
+        index_manager: 主索引管理器
+        verify: 是否以雜湊值驗證本機PDF
+        min_pdf_size: 小於等於此大小的PDF視為不完整
+    """
+    
+    def __init__(self, output_dir: Path, index_manager: Optional[MasterIndexManager] = None,
+                 verify: bool = False, min_pdf_size: int = 1000):
+        self.output_dir = Path(output_dir)
+        self.index_manager = index_manager or MasterIndexManager()
+        self.verify = verify
+        self.min_pdf_size = min_pdf_size
+    
+    def _load_records(self) -> Dict[str, Dict[str, Any]]:
+        """主索引記錄 (以正規化的識別碼為鍵，舊版 QQ 識別碼視為相同)"""
+        return {report['id'].replace('QQ', 'Q'): report for report in self.index_manager.load_index()['reports']}
+    
+    def coverage(self, stock_code: str, year: int, season: str, record: Optional[Dict[str, Any]]) -> Coverage:
+        """單一期別的涵蓋狀態"""
+        pdf_path = self.output_dir / report_filename(year, season, stock_code, 'pdf')
+        if not pdf_path.exists() or pdf_path.stat().st_size <= self.min_pdf_size:
+            return Coverage.MISSING
+        
+        if not (record and record.get('download_success', True) and record.get('sha256')) \
+                or record.get('file_size') != pdf_path.stat().st_size \
+                or not pdf_path.with_suffix('.json').exists():
+            return Coverage.STALE
+        if self.verify and file_sha256(pdf_path) != record['sha256']:
+            return Coverage.STALE
+        return Coverage.PRESENT
+    
+    def plan(self, stock_codes: Iterable[str], start: Tuple[int, str], end: Optional[Tuple[int, str]] = None,
+             company_names: Optional[Dict[str, str]] = None, today: Optional[date] = None) -> BackfillPlan:
+        """規劃股票代碼在起訖期別 (含) 之間的回補工作，晚於已結束最近一季的期別不列入"""
+        latest = latest_closed_period(today)
+        end = min(end, latest) if end else latest
+        periods = period_range(start, end)
+        return self.plan_queries(
+            [{'stock_code': stock_code, 'company_name': (company_names or {}).get(stock_code),
+              'year': year, 'season': season}
+             for stock_code in stock_codes for year, season in periods]
+        )
+    
+    def plan_queries(self, queries: Iterable[Dict[str, Any]]) -> BackfillPlan:
+        """過濾既有的查詢清單 (例如手寫的批次檔)：去除重複與已涵蓋的期別"""
+        records = self._load_records()
+        result = BackfillPlan()
+        jobs = {}
+        for query in queries:
+            stock_code = str(query['stock_code'])
+            year, season = int(query['year']), normalize_season(str(query['season']))
+            record = records.get(self.index_manager.report_id(stock_code, year, season))
+            
+            name = query.get('company_name') or (record or {}).get('company_name') \
+                or result.companies.get(stock_code) or get_company_name(stock_code)
+            result.companies.setdefault(stock_code, name)
+            
+            period = f"{year}{season}"
+            row = result.coverage.setdefault(stock_code, {})
+            if period in row:
+                continue
+            row[period] = self.coverage(stock_code, year, season, record)
+            if row[period] != Coverage.PRESENT:
+                jobs[(stock_code, year, season)] = {
+                    'stock_code': stock_code, 'company_name': result.companies[stock_code],
+                    'year': year, 'season': season
+                }
+        
+        # 同一公司的期別相鄰：爬蟲的文件清單快取只需查詢一次
+        result.jobs = [jobs[key] for key in sorted(jobs)]
+        return result
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+財報優先排程 - 依季度新舊、觀察名單與截止時間決定處理順序
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from ..utils.helpers import normalize_season, parse_report_filename
+from .executor import QueuePolicy, file_size_cost, item_path
+
+
+def filing_identity(item: Any) -> Optional[Dict[str, Any]]:
+    """取得項目對應的財報 (股票代碼、年度、季度)：支援查詢字典與財報檔名"""
+    if isinstance(item, dict) and all(key in item for key in ('stock_code', 'year', 'season')):
+        return {
+            'stock_code': str(item['stock_code']),
+            'year': int(item['year']),
+            'season': normalize_season(str(item['season']))
+        }
+    
+    path = item_path(item)
+    return parse_report_filename(path.name) if path else None
+
+
+def parse_deadline(deadline: Any) -> datetime:
+    """解析截止時間 (datetime 或 ISO 8601 字串，接受 Z 結尾)，回傳含時區的時間；未帶時區者視為本地時間"""
+    if isinstance(deadline, str):
+        text = deadline.strip()
+        if text.endswith(('Z', 'z')):
+            # Python 3.11 之前 fromisoformat 不接受 Z
+            text = text[:-1] + '+00:00'
+        deadline = datetime.fromisoformat(text)
+    if not isinstance(deadline, datetime):
+        raise TypeError(f"無效的截止時間型別: {type(deadline).__name__}")
+    return deadline.astimezone()
+
+
+def quarter_index(year: int, season: str) -> int:
+    """季度序號 (年度 * 4 + 季別)"""
+    return year * 4 + int(normalize_season(season).replace('Q', '')) - 1
+
+
+class FilingPriority:
+    """財報優先分數 (數值越小越先處理，單位相當於等待秒數)
+    
+    - 季度新舊：比最新可公告季度每舊一季加 quarter_penalty
+    - 觀察名單：名單內的股票減 watch_bonus
+    - 截止時間：項目帶有 deadline 時，距離截止少於 deadline_horizon 的部分全數扣減
+      (有無時區皆可，未帶時區者視為本地時間；無法解析時記錄警告並視為沒有截止時間)
+    
+    與排程器的老化速率 (每等待一秒減 aging_rate) 搭配，舊季度回補工作等待夠久後
+    仍會排到新進的高優先工作之前，不會無限期延後。
+    """
+    
+    def __init__(self, watchlist: Iterable[str] = (), quarter_penalty: float = 3600.0,
+                 watch_bonus: float = 4 * 3600.0, deadline_horizon: float = 24 * 3600.0,
+                 now: Callable[[], datetime] = datetime.now):
+        self.watchlist = {str(code) for code in watchlist}
+        self.quarter_penalty = quarter_penalty
+        self.watch_bonus = watch_bonus
+        self.deadline_horizon = deadline_horizon
+        self.now = now
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    @classmethod
+    def from_config(cls, processing: Any, watchlist: Optional[Iterable[str]] = None) -> Optional['FilingPriority']:
+        """由處理配置建立；未啟用優先排程且沒有觀察名單時回傳 None"""
+        watchlist = list(watchlist or processing.priority_watchlist)
+        if not watchlist and not processing.priority_scheduling:
+            return None
+        return cls(watchlist)
+    
+    def latest_quarter(self) -> int:
+        """最新可公告的季度 (目前季度的前一季)"""
+        today = self.now()
+        return today.year * 4 + (today.month - 1) // 3 - 1
+    
+    def __call__(self, item: Any) -> float:
+        identity = filing_identity(item)
+        priority = 0.0
+        
+        if identity:
+            quarters_old = self.latest_quarter() - quarter_index(identity['year'], identity['season'])
+            priority += max(quarters_old, 0) * self.quarter_penalty
+            if identity['stock_code'] in self.watchlist:
+                priority -= self.watch_bonus
+        
+        deadline = item.get('deadline') if isinstance(item, dict) else None
+        if deadline:
+            try:
+                remaining = (parse_deadline(deadline) - self.now().astimezone()).total_seconds()
+            except (TypeError, ValueError) as e:
+                self.logger.warning(f"無法解析截止時間 {deadline!r}，視為沒有截止時間: {e}")
+            else:
+                priority -= max(self.deadline_horizon - remaining, 0.0)
+        
+        return priority
+
+
+class PriorityPolicy(QueuePolicy):
+    """依優先分數排序，同分時大檔優先
+    
+    批次中的項目同時進入佇列、等待時間相同，老化不影響相對順序，因此直接排序即可；
+    項目陸續加入的情境請使用 Pipeline 的 priority 參數。
+    """
+    
+    def __init__(self, priority: Callable[[Any], float],
+                 cost_func: Callable[[Any], float] = file_size_cost):
+        self.priority = priority
+        self.cost_func = cost_func
+    
+    def order(self, items: Sequence[Any]) -> List[int]:
+        keys = [(self.priority(item), -self.cost_func(item)) for item in items]
+        return sorted(range(len(items)), key=lambda index: keys[index])
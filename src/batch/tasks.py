@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次工作函數 - 可供行程後端序列化的模組層級函數，每個工作行程只建立一次處理器
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core import ProcessingResult, get_config
+from .executor import get_worker_instance, item_path
+
+
+def _pdf_processor():
+    from ..processors.pdf_processor import ModernPDFProcessor
+    return get_worker_instance('pdf_processor', lambda: ModernPDFProcessor(get_config()))
+
+
+def _smart_processor(config: Optional[Dict[str, Any]] = None):
+    from ..processors.smart_processor import SmartFinancialProcessor
+    if config:
+        # 指定配置 (例如 --config 載入的字典) 時以其內容區分快取
+        key = 'smart_processor:' + json.dumps(config, sort_keys=True, default=str)
+        return get_worker_instance(key, lambda: SmartFinancialProcessor(config))
+    return get_worker_instance('smart_processor', lambda: SmartFinancialProcessor(get_config()))
+
+
+def process_pdf_task(item: Tuple[Path, Optional[Path]]) -> Dict[str, Any]:
+    """處理單一PDF，item 為 (PDF路徑, 輸出路徑)"""
+    pdf_path, output_path = item
+    return _pdf_processor().process(pdf_path, output_path)
+
+
+def extract_pages_task(task: Tuple[Tuple[Path, Optional[Path]], int, int]) -> List[Dict[str, Any]]:
+    """分頁排程的提取工作，task 為 ((PDF路徑, 輸出路徑), 起始頁, 結束頁)"""
+    item, first_page, last_page = task
+    return _pdf_processor().extract_pages(item_path(item), first_page, last_page)
+
+
+def assemble_pages_task(task: Tuple[Tuple[Path, Optional[Path]], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """分頁排程的組合工作，task 為 ((PDF路徑, 輸出路徑), 各頁結果)"""
+    (pdf_path, output_path), pages = task
+    return _pdf_processor().assemble_pages(pdf_path, pages, output_path)
+
+
+def smart_process_task(item: Dict[str, Any]) -> ProcessingResult:
+    """智慧處理單一PDF/JSON，item 含 pdf_path、json_path 及可選的 output_path、backfill_prior、config"""
+    return _smart_processor(item.get('config')).process(
+        Path(item['pdf_path']),
+        Path(item['json_path']),
+        item.get('output_path'),
+        backfill_prior=item.get('backfill_prior')
+    )
+
+
+def extract_filing_task(item: Dict[str, Any]) -> Dict[str, Any]:
+    """管線擷取階段：智慧處理已下載的財報，失敗時拋出例外讓管線停止此項目"""
+    result = smart_process_task(item)
+    if not result.success:
+        raise RuntimeError(result.message)
+    
+    return {
+        **item,
+        'output_path': result.data['output_path'],
+        'confidence_level': result.data.get('confidence_level')
+    }
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+隔離工作行程池 - 每個文件在獨立的工作行程中執行，超過時間或記憶體上限時終止並重建工作行程
+"""
+
+import time
+import logging
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Callable, List, Optional
+
+from .executor import ItemResult, _run_item
+from .memory import MB, read_process_memory
+
+
+# 監控程式終止工作行程的原因
+WATCHDOG_TIMEOUT = 'timeout'
+WATCHDOG_MEMORY = 'memory'
+
+
+def _worker_main(conn) -> None:
+    """工作行程主迴圈：逐一接收項目並回傳 ItemResult，收到 None 時結束"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        
+        func, index, item, measure_memory = task
+        result = _run_item(func, index, item, measure_memory)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # 回傳值無法序列化
+            conn.send(ItemResult(index, item, False, error=str(e), error_type=type(e).__name__,
+                                 duration=result.duration))
+
+
+class _Worker:
+    """單一隔離工作行程及其目前執行的項目"""
+    
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        
+        self.index: Optional[int] = None
+        self.item: Any = None
+        self.started: float = 0.0
+    
+    @property
+    def busy(self) -> bool:
+        return self.index is not None
+    
+    def assign(self, func: Callable[[Any], Any], index: int, item: Any, measure_memory: bool) -> None:
+        self.conn.send((func, index, item, measure_memory))
+        self.index, self.item, self.started = index, item, time.perf_counter()
+    
+    def release(self) -> None:
+        self.index, self.item = None, None
+    
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+    
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class IsolatedWorkerPool:
+    """隔離工作行程池
+    
+    每個工作行程一次只執行一個項目。監控程式檢查每個項目的執行時間與工作行程 RSS，
+    超過上限時直接終止該工作行程並以新的行程取代，批次的尾端延遲因此不超過時間上限。
+    
+    Args:
+        workers: 工作行程數量
+        timeout: 單一項目的執行時間上限(秒)，None 為不限制
+        memory_limit: 工作行程 RSS 上限(位元組)，None 為不限制
+    """
+    
+    # 監控檢查間隔(秒)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, workers: int, timeout: Optional[float] = None, memory_limit: Optional[int] = None):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._context = multiprocessing.get_context()
+        self._workers = [_Worker(self._context) for _ in range(max(1, workers))]
+    
+    @property
+    def idle_count(self) -> int:
+        return sum(1 for worker in self._workers if not worker.busy)
+    
+    @property
+    def busy_count(self) -> int:
+        return len(self._workers) - self.idle_count
+    
+    def submit(self, func: Callable[[Any], Any], index: int, item: Any, measure_memory: bool = False) -> None:
+        """將項目交給閒置的工作行程 (呼叫前需確認 idle_count > 0)"""
+        worker = next(worker for worker in self._workers if not worker.busy)
+        worker.assign(func, index, item, measure_memory)
+    
+    def wait(self, timeout: Optional[float] = None) -> List[ItemResult]:
+        """等待項目完成或被終止，回傳這段期間結束的項目"""
+        busy = [worker for worker in self._workers if worker.busy]
+        if not busy:
+            return []
+        
+        interval = self.POLL_INTERVAL if timeout is None else min(timeout, self.POLL_INTERVAL)
+        ready = wait_connections([worker.conn for worker in busy], timeout=interval)
+        
+        finished = []
+        for worker in busy:
+            if worker.conn in ready:
+                finished.append(self._collect(worker))
+            else:
+                killed = self._check_limits(worker)
+                if killed:
+                    finished.append(killed)
+        return finished
+    
+    def shutdown(self) -> None:
+        """結束所有工作行程 (執行中的項目直接終止)"""
+        for worker in self._workers:
+            if worker.busy:
+                worker.kill()
+            else:
+                worker.stop()
+        self._workers = []
+    
+    def _collect(self, worker: _Worker) -> ItemResult:
+        index, item = worker.index, worker.item
+        try:
+            result = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # 工作行程異常結束 (例如原生程式庫崩潰)
+            elapsed = time.perf_counter() - worker.started
+            self.logger.error(f"工作行程異常結束 [{index}]，重新建立")
+            self._replace(worker)
+            return ItemResult(index, item, False, error=f"工作行程異常結束: {e}",
+                              error_type='WorkerCrashed', duration=elapsed)
+        
+        worker.release()
+        return result
+    
+    def _check_limits(self, worker: _Worker) -> Optional[ItemResult]:
+        elapsed = time.perf_counter() - worker.started
+        
+        reason = None
+        if self.timeout and elapsed > self.timeout:
+            reason = WATCHDOG_TIMEOUT
+            message = f"處理逾時 ({elapsed:.0f} 秒，上限 {self.timeout:.0f} 秒)"
+        elif self.memory_limit:
+            rss = read_process_memory(worker.process.pid)
+            if rss and rss > self.memory_limit:
+                reason = WATCHDOG_MEMORY
+                message = f"記憶體超過上限 ({rss // MB}MB，上限 {self.memory_limit // MB}MB)"
+        
+        if reason is None:
+            return None
+        
+        index, item = worker.index, worker.item
+        self.logger.error(f"終止工作行程 [{index}]: {message}")
+        self._replace(worker)
+        
+        return ItemResult(
+            index, item, False,
+            error=message,
+            error_type='DocumentTimeout' if reason == WATCHDOG_TIMEOUT else 'MemoryLimitExceeded',
+            duration=elapsed,
+            watchdog=reason
+        )
+    
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        self._workers[self._workers.index(worker)] = _Worker(self._context)
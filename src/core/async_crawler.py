@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+非同步財報爬蟲 - 以 aiohttp 在 asyncio 事件迴圈中下載，依完成順序產生結果
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from . import ProcessingResult
+from .crawler import FinancialCrawler
+from ..utils.circuit_breaker import RetryBudget, backoff_delay
+from ..utils.helpers import file_sha256
+
+
+class AsyncFinancialCrawler:
+    """非同步財報爬蟲
+    
+    與 FinancialCrawler.process 對應的 asyncio 介面：HTTP 請求改用 aiohttp (連線池上限 connection_limit)，
+    同時處理的查詢數以 semaphore 限制為 concurrency。文件清單解析、重複下載檢查、.part 續傳與驗證、
+    JSON 與主索引記錄都沿用內部的 FinancialCrawler，磁碟與索引的阻塞操作在執行緒中執行。
+    請求速率同樣受同一行程內共用的主機限速器限制 (以 asyncio.sleep 等待權杖)，
+    斷路器、重試預算與隨機退避也與同步爬蟲共用 (狀態見 self.crawler.metrics())。
+    
+    須在 async with 中使用：
+        
+        async with AsyncFinancialCrawler(config) as crawler:
+            async for index, result in crawler.imap_unordered(queries):
+                ...
+    
+    Args:
+        config: 傳給 FinancialCrawler 的配置字典
+        concurrency: 同時處理的查詢數，預設為 download_workers 配置
+        connection_limit: 連線池上限，預設與 concurrency 相同
+        refresh: 重新下載本機已存在且與主索引記錄相符的PDF
+        session: 外部建立的 aiohttp.ClientSession (不會在離開時關閉)
+    """
+    
+    def __init__(self, config: Optional[Dict] = None, concurrency: Optional[int] = None,
+                 connection_limit: Optional[int] = None, refresh: bool = False, session=None):
+        if session is None and not AIOHTTP_AVAILABLE:
+            raise ImportError("需要安裝 aiohttp: pip install aiohttp")
+        
+        self.crawler = FinancialCrawler(config, refresh=refresh)
+        self.concurrency = max(1, concurrency or self.crawler.download_workers)
+        self.connection_limit = connection_limit or self.concurrency
+        self.session = session
+        self._owns_session = session is None
+        self._listing_locks: Dict[str, asyncio.Lock] = {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    async def __aenter__(self) -> 'AsyncFinancialCrawler':
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                timeout=aiohttp.ClientTimeout(total=self.crawler.config.processing.timeout),
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                    'Referer': self.crawler.query_url
+                }
+            )
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    async def process(self, input_data: Any, output_path: Optional[Path] = None, stream=None) -> ProcessingResult:
+        """處理財報下載請求 (與 FinancialCrawler.process 相同的輸入與結果格式)"""
+        try:
+            if isinstance(input_data, list):
+                return await self._process_batch(input_data, output_path, stream)
+            return await self._process_single(input_data, output_path)
+        except Exception as e:
+            self.logger.error(f"處理失敗: {e}")
+            return ProcessingResult(False, f"處理失敗: {e}")
+    
+    async def imap_unordered(self, queries_data: List[Dict[str, Any]],
+                             output_path: Optional[Path] = None) -> AsyncIterator[Tuple[int, ProcessingResult]]:
+        """同時處理多筆查詢，依完成順序產生 (查詢位置, 結果)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        total = len(queries_data)
+        
+        async def process_query(i: int, query: Dict[str, Any]) -> Tuple[int, ProcessingResult]:
+            async with semaphore:
+                self.logger.info(f"[{i + 1}/{total}] 處理: {query.get('company_name', query.get('stock_code'))}")
+                try:
+                    return i, await self._process_single(query, output_path)
+                except Exception as e:
+                    self.logger.error(f"處理失敗: {e}")
+                    return i, ProcessingResult(False, f"處理失敗: {e}")
+        
+        tasks = [asyncio.ensure_future(process_query(i, query)) for i, query in enumerate(queries_data)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 呼叫端提前結束迭代時取消尚未完成的查詢
+            for task in tasks:
+                task.cancel()
+    
+    async def _process_batch(self, queries_data: List[Dict[str, Any]], output_path: Optional[Path] = None,
+                             stream=None) -> ProcessingResult:
+        results: List[Any] = [None] * len(queries_data)
+        success_count = 0
+        total = len(queries_data)
+        self.crawler.retry_budget = RetryBudget.for_batch(total, float(self.crawler._setting('retry_budget_ratio')))
+        self.logger.info(f"批次處理 {total} 個查詢 (同時 {min(self.concurrency, total)} 個)")
+        
+        try:
+            async for i, result in self.imap_unordered(queries_data, output_path):
+                success_count += result.success
+                if stream:
+                    stream.write({'query': queries_data[i], **result.to_dict()})
+                else:
+                    results[i] = result.to_dict()
+            metrics = self.crawler.metrics()
+        finally:
+            self.crawler.retry_budget = None
+        
+        self.logger.info(f"爬蟲指標: {metrics}")
+        return ProcessingResult(
+            success=success_count > 0,
+            message=f"批次處理完成: {success_count}/{total} 成功",
+            data={'total': total, 'success': success_count, 'output': stream.name, 'metrics': metrics}
+            if stream else results
+        )
+    
+    async def _process_single(self, query_data: Dict[str, Any], output_path: Optional[Path] = None) -> ProcessingResult:
+        crawler = self.crawler
+        stock_code = query_data['stock_code']
+        year = int(query_data['year'])
+        season = query_data.get('season', 'Q1')
+        self.logger.info(f"下載 {query_data['company_name']}({stock_code}) {year}{season} 財報")
+        filename, output_path = crawler.target_path(query_data, output_path)
+        
+        record = await asyncio.to_thread(crawler.index_manager.find_report, stock_code, year, season)
+        if not crawler.refresh:
+            pdf_hash = await asyncio.to_thread(crawler._existing_pdf_hash, output_path, record)
+            if pdf_hash:
+                self.logger.info(f"本機已有相同PDF，略過下載: {output_path}")
+                return await asyncio.to_thread(
+                    crawler._record_report, query_data, filename, output_path, record, pdf_hash, True
+                )
+        
+        result = await self._download_report(stock_code, filename, output_path)
+        if result.success:
+            pdf_hash = await asyncio.to_thread(file_sha256, output_path)
+            recorded = await asyncio.to_thread(
+                crawler._record_report, query_data, filename, output_path, record, pdf_hash
+            )
+            result.data = recorded.data
+        return result
+    
+    @asynccontextmanager
+    async def _request(self, method: str, url: str, **kwargs):
+        """經過主機斷路器與限速器送出請求 (async with 取得 aiohttp 回應)"""
+        breaker = self.crawler._check_breaker(url)
+        received = False
+        try:
+            if self.crawler.rate_limiter:
+                bucket = self.crawler.rate_limiter.bucket(url)
+                delay = bucket.try_acquire()
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = bucket.try_acquire()
+            
+            async with getattr(self.session, method)(url, **kwargs) as response:
+                received = True
+                self.crawler._record_response(breaker, response.status)
+                yield response
+        except Exception:
+            # 只有未取得回應 (連線錯誤、逾時) 才算主機失敗，處理回應內容的錯誤不計入
+            if not received:
+                self.crawler._record_response(breaker, None)
+            raise
+        except BaseException:
+            # 取消不是主機失敗，但須歸還半開時佔用的試探名額，否則斷路器會一直拒絕請求
+            if not received:
+                breaker.release()
+            raise
+    
+    async def _query(self, query_data: Dict[str, Any]) -> str:
+        async with self._request('post', self.crawler.query_url, data=query_data) as response:
+            if response.status != 200:
+                raise Exception(f"查詢失敗，HTTP狀態碼: {response.status}")
+            return await response.text()
+    
+    async def get_listing(self, stock_code: str, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """取得公司的文件清單 (與同步爬蟲共用快取)，同一公司只查詢一次"""
+        lock = self._listing_locks.setdefault(stock_code, asyncio.Lock())
+        async with lock:
+            listings = self.crawler._listings
+            if refresh or stock_code not in listings:
+                self.logger.info(f"查詢 {stock_code} 文件清單")
+                html_content = await self._query({'step': '9', 'kind': 'A', 'co_id': stock_code})
+                listings[stock_code] = self.crawler._parse_listing(html_content)
+            return listings[stock_code]
+    
+    async def _resolve_link(self, stock_code: str, filename: str, refresh: bool = False) -> Dict[str, Any]:
+        link = (await self.get_listing(stock_code, refresh)).get(filename.lower())
+        if link:
+            return link
+        
+        html_content = await self._query({'step': '9', 'kind': 'A', 'co_id': stock_code, 'filename': filename})
+        pdf_links = self.crawler._parse_pdf_links(html_content, filename)
+        if not pdf_links:
+            raise Exception("未找到PDF下載連結")
+        return pdf_links[0]
+    
+    async def _download_report(self, stock_code: str, filename: str, output_path: Path) -> ProcessingResult:
+        max_retry = self.crawler.config.processing.max_retry
+        pdf_link = None
+        
+        for attempt in range(max_retry):
+            try:
+                self.logger.info(f"解析下載連結 (嘗試 {attempt + 1}/{max_retry})")
+                pdf_link = await self._resolve_link(stock_code, filename, refresh=pdf_link is not None)
+                download_url = urljoin(self.crawler.base_url, pdf_link['url'])
+                
+                self.logger.info(f"下載PDF: {download_url}")
+                size = await self._download_file(download_url, output_path, pdf_link.get('size') or 0)
+                self.logger.info(f"下載成功: {output_path} ({size:,} bytes)")
+                return ProcessingResult(True, "下載成功")
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failure = self.crawler._give_up(attempt, max_retry, e)
+                if failure:
+                    return failure
+                await asyncio.sleep(backoff_delay(attempt))
+        
+        return ProcessingResult(False, "下載失敗")
+    
+    @asynccontextmanager
+    async def _target_lock(self, output_path: Path):
+        """與同步爬蟲共用的下載目標鎖 (在執行緒中等待，不阻塞事件迴圈)"""
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.crawler.lock_target, output_path))
+        try:
+            token = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # 取消時執行緒仍可能取得鎖，取得後立即釋放
+            acquiring.add_done_callback(
+                lambda task: task.cancelled() or task.exception() or self.crawler.unlock_target(output_path, task.result())
+            )
+            raise
+        try:
+            yield
+        finally:
+            self.crawler.unlock_target(output_path, token)
+    
+    async def _download_file(self, url: str, output_path: Path, expected_size: int = 0) -> int:
+        """下載到 .part 檔 (可續傳、同一目標以鎖序列化)，驗證後以原子性更名取代目標檔案，回傳檔案大小
+        
+        檔案狀態檢查、開檔、每個區塊的寫入與 fsync 都在執行緒中進行，大量並行下載時不阻塞事件迴圈。
+        """
+        crawler = self.crawler
+        async with self._target_lock(output_path):
+            part_path = crawler.part_path(output_path)
+            offset, headers, length = await asyncio.to_thread(crawler._resume_request, part_path, expected_size)
+            async with self._request('get', url, headers=headers) as response:
+                offset, mode = await asyncio.to_thread(
+                    crawler._resume_mode, part_path, offset, response.status, response.headers, length
+                )
+                written = 0
+                f = await asyncio.to_thread(open, part_path, mode)
+                try:
+                    async for chunk in response.content.iter_chunked(crawler.CHUNK_SIZE):
+                        await asyncio.to_thread(f.write, chunk)
+                        written += len(chunk)
+                finally:
+                    await asyncio.to_thread(self._sync_close, f)
+            
+            return await asyncio.to_thread(crawler._commit_part, part_path, output_path, offset + written)
+    
+    @staticmethod
+    def _sync_close(f) -> None:
+        """fsync 後關閉部分檔案 (中斷時已寫入的內容仍保留供續傳)"""
+        try:
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
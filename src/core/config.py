@@ -7,7 +7,7 @@
 
 import json
 from pathlib import Path
-from typing import Dict, Any, Optional, Type, TypeVar, Generic
+from typing import Dict, Any, List, Optional, Type, TypeVar, Generic
 from dataclasses import dataclass, field
 import logging
 
@@ -25,6 +25,24 @@ class ProcessingConfig:
     extract_text: bool = True
     max_retry: int = 3
     timeout: int = 30
+    image_coverage_threshold: float = 0.5  # 影像覆蓋率達此比例視為掃描頁
+    classifier_cache_size: int = 128  # 頁面分類快取的PDF數量
+    lean_results: bool = False  # 處理結果不保留原始文字與表格
+    backfill_prior_periods: bool = False  # 以比較期欄位回填缺少或空白的前期JSON
+    batch_workers: int = 1  # 批次處理的工作者數量 (1 為循序執行)
+    batch_backend: str = "process"  # 平行批次後端: thread / process
+    memory_budget_mb: int = 0  # 平行批次的記憶體預算 (0 為系統可用記憶體的 75%)
+    memory_reserve_mb: int = 512  # 系統需保留的可用記憶體
+    document_timeout: int = 0  # 單一文件的處理時間上限(秒)，0 為不限制；設定後批次改用隔離工作行程
+    document_memory_limit_mb: int = 0  # 單一文件工作行程的記憶體上限，0 為不限制
+    priority_scheduling: bool = False  # 批次依季度新舊與觀察名單排序 (設定觀察名單時自動啟用)
+    priority_watchlist: List[str] = field(default_factory=list)  # 優先處理的股票代碼
+    priority_aging_rate: float = 1.0  # 管線中每等待一秒減少的優先分數
+    page_scheduling: bool = False  # 平行批次以頁碼範圍為單位分派，閒置工作者分擔其他文件的剩餘頁面
+    page_chunk_min: int = 4  # 分頁工作的最少頁數
+    page_chunk_max: int = 32  # 分頁工作的最多頁數
+    shard_lease_seconds: int = 300  # 分散式批次的分片租約時效(秒)，節點以三分之一間隔發送心跳
+    shard_max_attempts: int = 3  # 分片最多嘗試次數 (含租約過期收回)
 
 
 @dataclass
@@ -63,7 +81,15 @@ class AppConfig:
     paths: PathConfig = field(default_factory=PathConfig)
     auto_validation: bool = True
     generate_json: bool = True
-    download_delay: int = 2
+    request_rate: float = 1.0  # 對同一主機的每秒請求數 (0 為不限速)
+    request_burst: int = 2  # 可連續送出的請求數 (查詢與下載為一組)
+    download_workers: int = 1  # 批次下載的執行緒數量
+    breaker_failure_threshold: int = 5  # 同一主機連續失敗幾次後開啟斷路器 (快速失敗)
+    breaker_recovery_timeout: float = 30.0  # 斷路器開啟後多久放行試探請求 (秒)
+    retry_budget_ratio: float = 0.2  # 批次重試總額度佔項目數的比例 (至少 10 次)
+    blob_store_dir: str = ""  # 內容定址PDF儲存目錄 (例如 data/blobs)，設定後下載的PDF以連結指向儲存檔；空字串為停用
+    blob_link_mode: str = "hardlink"  # 儲存檔的連結方式: hardlink / symlink
+    crawler_base_url: str = "https://doc.twse.com.tw"  # 財報文件伺服器 (壓力測試時指向本機替身伺服器)
     debug_mode: bool = False
     log_level: str = "INFO"
 
@@ -95,7 +121,6 @@ class ConfigManager:
             paths=PathConfig(base_dir=Path(__file__).parent.parent.parent),
             auto_validation=True,
             generate_json=True,
-            download_delay=2,
             debug_mode=False,
             log_level="INFO"
         )
@@ -106,7 +131,6 @@ class ConfigManager:
         config_dict = {
             'output_dir': 'data/financial_reports',
             'processed_dir': 'data/processed',
-            'download_delay': 2,
             'max_retry': 3,
             'timeout': 30,
             'use_ocr': True,
@@ -177,7 +201,6 @@ def get_config() -> AppConfig:
             paths=PathConfig(base_dir=Path(__file__).parent.parent.parent),
             auto_validation=True,
             generate_json=True,
-            download_delay=2,
             debug_mode=False,
             log_level="INFO"
         )
@@ -4,41 +4,185 @@
 財報爬蟲模組
 """
 
+import os
+import json
 import requests
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional, List
-from urllib.parse import urljoin
+from typing import Dict, Any, IO, Iterator, Optional, List, Tuple
+from urllib.parse import urljoin, urlsplit
 import re
 
+try:
+    import fcntl
+except ImportError:  # Windows 只有行程內的鎖
+    fcntl = None
+
 from . import BaseProcessor, FinancialReport, ProcessingResult, ConfigManager
+from ..utils.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, HostCircuitBreakers, RetryBudget, backoff_delay
+)
+from ..utils.blob_store import BlobStore, clear_readonly
+from ..utils.helpers import file_sha256
 from ..utils.index_manager import MasterIndexManager
+from ..utils.rate_limiter import HostRateLimiter, shared_rate_limiter
+from ..tracking import ProcessingStatus
 
 
 class FinancialCrawler(BaseProcessor):
-    """財報爬蟲"""
+    """財報爬蟲
+    
+    每個請求先向主機限速器 (權杖桶：request_rate 每秒請求數、request_burst 突發量) 取得權杖，
+    同一行程內相同設定的爬蟲共用限速器。download_workers 大於 1 時批次以執行緒池同時下載，
+    網路等待時間重疊，但對同一主機的請求速率不變。
+    
+    每家公司的文件清單只查詢一次並快取為 檔名 → 連結與大小 的對照表，
+    同一公司的各期財報都由清單解析下載連結；清單中沒有的檔名才以單一檔名查詢。
+    
+    每個主機有一個斷路器：連線錯誤、5xx 與 429 連續發生 breaker_failure_threshold 次後開啟，
+    開啟期間的下載立即失敗而不重試。重試間隔為完全隨機的指數退避，批次的重試總次數受重試預算限制。
+    狀態與計數可由 metrics() 取得。
     
-    def __init__(self, config: Optional[Dict] = None):
+    設定 blob_store_dir 時下載的PDF放入內容定址儲存 (依 SHA-256 只存一份)，輸出路徑為指向它的連結，
+    重複下載檢查可直接比對連結而不需重新計算雜湊。
+    """
+    
+    # 下載檔案的驗證條件與串流區塊大小
+    MIN_PDF_SIZE = 1000
+    PDF_MAGIC = b'%PDF'
+    CHUNK_SIZE = 64 * 1024
+    # 正則表達式匹配PDF連結與連結文字中的檔案大小
+    LINK_PATTERN = r'<a[^>]+href=["\']([^"\']*\.pdf[^"\']*)["\'][^>]*>([^<]*)</a>'
+    SIZE_PATTERN = r'(\d+(?:,\d+)*)\s*bytes?'
+    # 文件清單中的財報檔名 (年度季別_股票代碼_類型.pdf)
+    FILENAME_PATTERN = re.compile(r'\d{6}_[0-9A-Za-z]+_[0-9A-Za-z]+\.pdf', re.IGNORECASE)
+    
+    def __init__(self, config: Optional[Dict] = None, tracker=None, resume: bool = False,
+                 rate_limiter: Optional[HostRateLimiter] = None, refresh: bool = False):
         # 如果傳入字典，則保存字典格式供內部使用
         self.config_dict = config
+        # 處理追蹤器 (ProcessingTracker)：記錄每筆下載狀態；resume 時略過已下載的財報
+        self.tracker = tracker
+        self.resume = resume
+        # 預設略過本機已存在且與主索引記錄 (大小、SHA-256) 相符的PDF；refresh 時一律重新下載
+        self.refresh = refresh
         # 為父類提供 None，讓它使用預設配置
         super().__init__(None)
-        self.base_url = "https://doc.twse.com.tw"
+        self.base_url = str(self._setting('crawler_base_url')).rstrip('/')
         self.query_url = f"{self.base_url}/server-java/t57sb01"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Referer': f'{self.base_url}/server-java/t57sb01'
-        })
+        # requests.Session 不保證執行緒安全，每個下載執行緒使用自己的 Session
+        self._local = threading.local()
+        self.download_workers = int(self._setting('download_workers'))
+        self.rate_limiter = rate_limiter or shared_rate_limiter(
+            self._request_rate(), int(self._setting('request_burst'))
+        )
+        # 主機斷路器、批次重試預算 (批次開始時建立，單筆查詢只受 max_retry 限制) 與請求計數
+        self.breakers = HostCircuitBreakers(
+            int(self._setting('breaker_failure_threshold')), float(self._setting('breaker_recovery_timeout'))
+        )
+        self.retry_budget: Optional[RetryBudget] = None
+        self._counters = {'requests': 0, 'failed_requests': 0, 'retries': 0, 'fast_failures': 0, 'budget_denied': 0}
+        self._counters_lock = threading.Lock()
+        # 各公司文件清單快取 (股票代碼 → 檔名對照表)，每家公司的查詢以各自的鎖避免重複送出
+        self._listings: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._listing_locks: Dict[str, threading.Lock] = {}
+        self._listings_lock = threading.Lock()
+        # 各下載目標的行程內鎖 (跨行程另以鎖檔序列化)，同一份財報不會同時寫入同一個 .part 檔
+        self._target_locks: Dict[str, threading.Lock] = {}
+        self._target_locks_lock = threading.Lock()
+        # 內容定址PDF儲存 (未設定時停用)
+        blob_store_dir = self._setting('blob_store_dir')
+        self.blob_store = BlobStore(Path(blob_store_dir), self._setting('blob_link_mode')) if blob_store_dir else None
         # 初始化索引管理器
         self.index_manager = MasterIndexManager()
     
-    def process(self, input_data: Dict[str, Any], output_path: Optional[Path] = None) -> ProcessingResult:
-        """處理財報下載請求"""
+    def _setting(self, name: str) -> Any:
+        """字典配置優先，否則使用應用程式配置"""
+        if self.config_dict and name in self.config_dict:
+            return self.config_dict[name]
+        return getattr(self.config, name)
+    
+    def _request_rate(self) -> float:
+        """對同一主機的每秒請求數
+        
+        舊版配置檔只有 download_delay (每筆查詢間隔秒數，一筆查詢約為查詢與下載兩個請求) 時由它換算，
+        同時設定 request_rate 時以 request_rate 為準。
+        """
+        if self.config_dict and 'request_rate' not in self.config_dict and 'download_delay' in self.config_dict:
+            delay = float(self.config_dict['download_delay'])
+            return 2 / delay if delay > 0 else 0.0
+        return float(self._setting('request_rate'))
+    
+    @property
+    def session(self) -> requests.Session:
+        """目前執行緒的 HTTP Session"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Referer': f'{self.base_url}/server-java/t57sb01'
+            })
+            self._local.session = session
+        return session
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """經過主機斷路器與限速器送出請求"""
+        breaker = self._check_breaker(url)
+        if self.rate_limiter:
+            waited = self.rate_limiter.acquire(url)
+            if waited > 0:
+                self.logger.debug(f"限速等待 {waited:.2f} 秒: {url}")
+        try:
+            response = getattr(self.session, method)(url, **kwargs)
+        except Exception:
+            self._record_response(breaker, None)
+            raise
+        self._record_response(breaker, response.status_code)
+        return response
+    
+    def _check_breaker(self, url: str) -> CircuitBreaker:
+        """取得主機斷路器，開啟時拋出 CircuitOpenError"""
+        breaker = self.breakers.breaker(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"斷路器開啟，暫停對 {urlsplit(url).netloc} 的請求")
+        return breaker
+    
+    def _record_response(self, breaker: CircuitBreaker, status_code: Optional[int]) -> None:
+        """記錄請求結果：連線錯誤 (None)、5xx 與 429 視為主機失敗"""
+        failed = status_code is None or status_code >= 500 or status_code == 429
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        self._count('requests')
+        if failed:
+            self._count('failed_requests')
+    
+    def _count(self, name: str) -> None:
+        with self._counters_lock:
+            self._counters[name] += 1
+    
+    def metrics(self) -> Dict[str, Any]:
+        """請求與重試計數、各主機斷路器狀態與目前批次的重試預算"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            'breakers': self.breakers.snapshot(),
+            'retry_budget': self.retry_budget.snapshot() if self.retry_budget else None
+        }
+    
+    def process(self, input_data: Dict[str, Any], output_path: Optional[Path] = None,
+                stream=None) -> ProcessingResult:
+        """處理財報下載請求 (批次時可指定 stream (NDJSONWriter) 逐筆寫出結果)"""
         try:
             if isinstance(input_data, list):
-                return self._process_batch(input_data, output_path)
+                return self._process_batch(input_data, output_path, stream)
             else:
                 return self._process_single(input_data, output_path)
         except Exception as e:
@@ -52,13 +196,60 @@ class FinancialCrawler(BaseProcessor):
         year = int(query_data['year'])
         season = query_data.get('season', 'Q1')  # 使用季度格式
         
-        # 將季度轉換為編號格式：Q1→01, Q2→02, Q3→03, Q4→04
-        season_num = season.replace('Q', '').zfill(2)
-        
         self.logger.info(f"下載 {company_name}({stock_code}) {year}{season} 財報")
+        filename, output_path = self.target_path(query_data, output_path)
+        
+        task = None
+        if self.tracker:
+            task = self.tracker.get_or_create_task(stock_code, company_name, year, season)
+            if self.resume and self.tracker.is_stage_completed(task, ProcessingStatus.DOWNLOADED) \
+                    and task.pdf_path and Path(task.pdf_path).exists():
+                self.logger.info(f"已下載，略過: {task.pdf_path}")
+                return ProcessingResult(True, "已下載，略過", data={
+                    "pdf_path": task.pdf_path,
+                    "json_path": task.json_path,
+                    "file_size": Path(task.pdf_path).stat().st_size,
+                    "skipped": True
+                })
+        
+        record = self.index_manager.find_report(stock_code, year, season)
+        json_path = output_path.with_suffix('.json')
+        if not self.refresh:
+            pdf_hash = self._existing_pdf_hash(output_path, record)
+            if pdf_hash:
+                self.logger.info(f"本機已有相同PDF，略過下載: {output_path}")
+                if task:
+                    self.tracker.complete_stage(task.id, ProcessingStatus.DOWNLOADED, 0.0,
+                                                pdf_path=output_path, json_path=json_path)
+                return self._record_report(query_data, filename, output_path, record, pdf_hash, skipped=True)
+        
+        if task:
+            self.tracker.update_task_status(task.id, ProcessingStatus.DOWNLOADING)
+        
+        # 執行下載
+        start_time = time.time()
+        result = self._download_report(stock_code, filename, output_path)
+        
+        if task:
+            if result.success:
+                self.tracker.complete_stage(task.id, ProcessingStatus.DOWNLOADED, time.time() - start_time,
+                                            pdf_path=output_path, json_path=output_path.with_suffix('.json'))
+            else:
+                self.tracker.update_task_status(task.id, ProcessingStatus.FAILED, error_message=result.message)
+        
+        if result.success:
+            result.data = self._record_report(query_data, filename, output_path, record,
+                                              file_sha256(output_path)).data
+        
+        return result
+    
+    def target_path(self, query_data: Dict[str, Any], output_path: Optional[Path] = None) -> Tuple[str, Path]:
+        """查詢對應的財報檔名與輸出路徑"""
+        # 將季度轉換為編號格式：Q1→01, Q2→02, Q3→03, Q4→04
+        season_num = query_data.get('season', 'Q1').replace('Q', '').zfill(2)
         
         # 建構檔案名稱 - 使用年份+季度編號格式，與現有PDF檔案一致
-        filename = f"{year}{season_num}_{stock_code}_AI1.pdf"
+        filename = f"{int(query_data['year'])}{season_num}_{query_data['stock_code']}_AI1.pdf"
         
         # 設定輸出路徑
         if output_path is None:
@@ -69,139 +260,448 @@ class FinancialCrawler(BaseProcessor):
             output_path = output_path / filename
         # 如果給定的是檔案路徑，則直接使用
         
-        # 執行下載
-        result = self._download_report(stock_code, filename, output_path)
+        return filename, output_path
+    
+    def _existing_pdf_hash(self, output_path: Path, record: Optional[Dict[str, Any]]) -> Optional[str]:
+        """本機PDF可直接沿用時回傳其 SHA-256，否則回傳 None
         
-        if result.success:
+        主索引有雜湊記錄時大小與雜湊都必須相符；沒有記錄 (例如舊版索引) 時檔案大小與PDF標頭合理即可。
+        """
+        if not output_path.exists():
+            return None
+        
+        size = output_path.stat().st_size
+        if size <= self.MIN_PDF_SIZE:
+            return None
+        if record and record.get('sha256') and record.get('file_size') != size:
+            return None
+        
+        if record and record.get('sha256') and self.blob_store \
+                and self.blob_store.is_linked(output_path, record['sha256']):
+            # 已連結到相同雜湊值的儲存檔：內容必然相符
+            return record['sha256']
+        
+        with open(output_path, 'rb') as f:
+            if self.PDF_MAGIC not in f.read(1024):
+                return None
+        
+        pdf_hash = file_sha256(output_path)
+        if record and record.get('sha256') and record['sha256'] != pdf_hash:
+            self.logger.warning(f"PDF與主索引記錄不符，重新下載: {output_path}")
+            return None
+        return pdf_hash
+    
+    def _record_report(self, query_data: Dict[str, Any], filename: str, output_path: Path,
+                       record: Optional[Dict[str, Any]], pdf_hash: str, skipped: bool = False) -> ProcessingResult:
+        """建立JSON與主索引記錄
+        
+        PDF內容與主索引記錄相同且JSON已存在時保留原JSON (其中可能已有回填的欄位)。
+        """
+        stock_code = query_data['stock_code']
+        company_name = query_data['company_name']
+        year = int(query_data['year'])
+        season = query_data.get('season', 'Q1')
+        json_path = output_path.with_suffix('.json')
+        file_size = output_path.stat().st_size
+        if self.blob_store:
+            self.blob_store.put(output_path, pdf_hash)
+        
+        unchanged = record is not None and record.get('sha256') in (pdf_hash, None)
+        if not (unchanged and json_path.exists()):
             # 生成對應的JSON檔案
-            json_path = output_path.with_suffix('.json')
             report = FinancialReport(stock_code, company_name, year, season)
             report.metadata.update({
                 "source": "doc.twse.com.tw",
                 "file_name": filename,
                 "file_path": str(output_path),
-                "file_size": output_path.stat().st_size if output_path.exists() else 0
+                "file_size": file_size
             })
             report.save(json_path)
-            
-            # 更新主索引
-            file_size = output_path.stat().st_size if output_path.exists() else 0
+        
+        # 更新主索引 (內容相同的略過只在缺少雜湊等欄位時寫入)
+        if not (skipped and record and record.get('sha256') == pdf_hash):
             self.index_manager.add_report(
                 stock_code=stock_code,
-                company_name=company_name, 
+                company_name=company_name,
                 year=year,
                 season=season,
                 pdf_path=output_path,
                 json_path=json_path,
                 file_size=file_size,
-                success=True
+                success=True,
+                sha256=pdf_hash
             )
-            
-            result.data = {
-                "pdf_path": str(output_path),
-                "json_path": str(json_path),
-                "file_size": file_size
-            }
         
-        return result
+        data = {
+            "pdf_path": str(output_path),
+            "json_path": str(json_path),
+            "file_size": file_size
+        }
+        if skipped:
+            data["skipped"] = True
+        return ProcessingResult(True, "已下載，略過" if skipped else "下載成功", data=data)
     
-    def _process_batch(self, queries_data: List[Dict[str, Any]], output_path: Optional[Path] = None) -> ProcessingResult:
-        """處理批次下載"""
-        results = []
+    def _process_batch(self, queries_data: List[Dict[str, Any]], output_path: Optional[Path] = None,
+                       stream=None) -> ProcessingResult:
+        """處理批次下載
+        
+        請求速率由主機限速器控制；download_workers 大於 1 時同時處理多筆查詢。
+        指定 stream 時每筆結果完成即寫出而不保留，回傳的 data 只有筆數統計。
+        結果依輸入順序排列。
+        """
+        results = [None] * len(queries_data)
+        success_count = 0
         total = len(queries_data)
+        workers = min(self.download_workers, total)
+        self.retry_budget = RetryBudget.for_batch(total, float(self._setting('retry_budget_ratio')))
         
-        self.logger.info(f"批次處理 {total} 個查詢")
+        self.logger.info(f"批次處理 {total} 個查詢" + (f" ({workers} 個下載執行緒)" if workers > 1 else ""))
         
-        for i, query in enumerate(queries_data, 1):
-            self.logger.info(f"[{i}/{total}] 處理: {query.get('company_name', query.get('stock_code'))}")
-            
-            result = self._process_single(query, output_path)
-            results.append(result.to_dict())
-            
-            # 添加延遲避免請求過快
-            if i < total:
-                time.sleep(self.config.download_delay)
+        def process_query(i: int, query: Dict[str, Any]) -> ProcessingResult:
+            self.logger.info(f"[{i + 1}/{total}] 處理: {query.get('company_name', query.get('stock_code'))}")
+            try:
+                return self._process_single(query, output_path)
+            except Exception as e:
+                self.logger.error(f"處理失敗: {e}")
+                return ProcessingResult(False, f"處理失敗: {e}")
         
-        success_count = sum(1 for r in results if r['success'])
+        try:
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(process_query, i, query): i for i, query in enumerate(queries_data)}
+                    completed = ((futures[future], future.result()) for future in as_completed(futures))
+                    success_count = self._collect_batch(completed, queries_data, results, stream)
+            else:
+                completed = ((i, process_query(i, query)) for i, query in enumerate(queries_data))
+                success_count = self._collect_batch(completed, queries_data, results, stream)
+            metrics = self.metrics()
+        finally:
+            # 預算只適用於本批次，之後的單筆下載不受已用完的額度限制
+            self.retry_budget = None
         
+        self.logger.info(f"爬蟲指標: {metrics}")
         return ProcessingResult(
             success=success_count > 0,
             message=f"批次處理完成: {success_count}/{total} 成功",
-            data=results
+            data={'total': total, 'success': success_count, 'output': stream.name, 'metrics': metrics}
+            if stream else results
         )
     
+    @staticmethod
+    def _collect_batch(completed, queries_data: List[Dict[str, Any]], results: List[Any], stream=None) -> int:
+        """依完成順序收集批次結果 (寫出到 stream 或依輸入位置保留)，回傳成功數"""
+        success_count = 0
+        for i, result in completed:
+            success_count += result.success
+            if stream:
+                stream.write({'query': queries_data[i], **result.to_dict()})
+            else:
+                results[i] = result.to_dict()
+        return success_count
+    
+    def get_listing(self, stock_code: str, timeout: Optional[int] = None,
+                    refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """取得公司的文件清單 (檔名 → url / text / size / filename)，同一公司只查詢一次"""
+        with self._listings_lock:
+            lock = self._listing_locks.setdefault(stock_code, threading.Lock())
+        
+        with lock:
+            if refresh or stock_code not in self._listings:
+                self.logger.info(f"查詢 {stock_code} 文件清單")
+                html_content = self._query({'step': '9', 'kind': 'A', 'co_id': stock_code}, timeout)
+                self._listings[stock_code] = self._parse_listing(html_content)
+                self.logger.debug(f"{stock_code} 文件清單共 {len(self._listings[stock_code])} 份")
+            return self._listings[stock_code]
+    
+    def _query(self, query_data: Dict[str, Any], timeout: Optional[int] = None) -> str:
+        """送出文件查詢，回傳回應HTML"""
+        response = self._request('post', self.query_url, data=query_data,
+                                 timeout=timeout or self.config.processing.timeout)
+        if response.status_code != 200:
+            raise Exception(f"查詢失敗，HTTP狀態碼: {response.status_code}")
+        return response.text
+    
+    def _resolve_link(self, stock_code: str, filename: str, timeout: int, refresh: bool = False) -> Dict[str, Any]:
+        """由公司文件清單解析下載連結；清單中沒有時以單一檔名查詢，refresh 時重新查詢清單"""
+        link = self.get_listing(stock_code, timeout, refresh).get(filename.lower())
+        if link:
+            return link
+        
+        html_content = self._query({'step': '9', 'kind': 'A', 'co_id': stock_code, 'filename': filename}, timeout)
+        pdf_links = self._parse_pdf_links(html_content, filename)
+        if not pdf_links:
+            raise Exception("未找到PDF下載連結")
+        return pdf_links[0]
+    
     def _download_report(self, stock_code: str, filename: str, output_path: Path) -> ProcessingResult:
         """下載財報檔案"""
-        query_data = {
-            'step': '9',
-            'kind': 'A',
-            'co_id': stock_code,
-            'filename': filename
-        }
-        
         max_retry = self.config.processing.max_retry
         timeout = self.config.processing.timeout
+        pdf_link = None
         
         for attempt in range(max_retry):
             try:
-                # 步驟1：查詢
-                self.logger.info(f"執行查詢 (嘗試 {attempt + 1}/{max_retry})")
-                response = self.session.post(self.query_url, data=query_data, timeout=timeout)
-                
-                if response.status_code != 200:
-                    raise Exception(f"查詢失敗，HTTP狀態碼: {response.status_code}")
-                
-                # 解析回應找到下載連結
-                pdf_links = self._parse_pdf_links(response.text, filename)
-                
-                if not pdf_links:
-                    raise Exception("未找到PDF下載連結")
+                # 步驟1：由公司文件清單找到下載連結 (以快取連結下載失敗後重新查詢清單，連結或大小可能已更新)
+                self.logger.info(f"解析下載連結 (嘗試 {attempt + 1}/{max_retry})")
+                pdf_link = self._resolve_link(stock_code, filename, timeout, refresh=pdf_link is not None)
                 
                 # 步驟2：下載PDF
-                pdf_link = pdf_links[0]
                 download_url = urljoin(self.base_url, pdf_link['url'])
                 
                 self.logger.info(f"下載PDF: {download_url}")
                 
-                pdf_response = self.session.get(download_url, timeout=timeout)
-                
-                if pdf_response.status_code != 200:
-                    raise Exception(f"下載失敗，HTTP狀態碼: {pdf_response.status_code}")
-                
-                # 儲存檔案
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(output_path, 'wb') as f:
-                    f.write(pdf_response.content)
-                
-                # 驗證檔案
-                if output_path.exists() and output_path.stat().st_size > 1000:
-                    self.logger.info(f"下載成功: {output_path} ({output_path.stat().st_size:,} bytes)")
-                    return ProcessingResult(True, "下載成功")
-                else:
-                    raise Exception("下載的檔案無效或太小")
+                # 串流寫入 .part 檔 (中斷時保留以便續傳)，驗證後才以原子性更名放到目標路徑
+                size = self._download_file(download_url, output_path, timeout, pdf_link.get('size') or 0)
+                self.logger.info(f"下載成功: {output_path} ({size:,} bytes)")
+                return ProcessingResult(True, "下載成功")
             
             except Exception as e:
-                self.logger.warning(f"嘗試 {attempt + 1} 失敗: {e}")
-                if attempt == max_retry - 1:
-                    return ProcessingResult(False, f"下載失敗 (已重試 {max_retry} 次): {e}")
-                time.sleep(2 ** attempt)  # 指數退避
+                failure = self._give_up(attempt, max_retry, e)
+                if failure:
+                    return failure
+                time.sleep(backoff_delay(attempt))  # 隨機指數退避，同時失敗的下載不會同步重試
         
         return ProcessingResult(False, "下載失敗")
     
+    def _give_up(self, attempt: int, max_retry: int, error: Exception) -> Optional[ProcessingResult]:
+        """下載嘗試失敗後是否放棄
+        
+        斷路器開啟、已是最後一次嘗試或批次重試預算用完時回傳失敗結果，否則記錄一次重試並回傳 None。
+        """
+        if isinstance(error, CircuitOpenError):
+            self._count('fast_failures')
+            return ProcessingResult(False, f"下載失敗 (快速失敗): {error}")
+        
+        self.logger.warning(f"嘗試 {attempt + 1} 失敗: {error}")
+        if attempt == max_retry - 1:
+            return ProcessingResult(False, f"下載失敗 (已重試 {max_retry} 次): {error}")
+        if self.retry_budget and not self.retry_budget.try_spend():
+            self._count('budget_denied')
+            return ProcessingResult(False, f"下載失敗 (批次重試預算已用完): {error}")
+        
+        self._count('retries')
+        return None
+    
+    @staticmethod
+    def part_path(output_path: Path) -> Path:
+        """下載中的部分檔案路徑"""
+        return output_path.with_name(output_path.name + '.part')
+    
+    @staticmethod
+    def part_meta_path(part_path: Path) -> Path:
+        """部分檔案的續傳資訊 (遠端檔案的驗證器與總長度)"""
+        return part_path.with_name(part_path.name + '.meta')
+    
+    def lock_target(self, output_path: Path) -> Tuple[threading.Lock, Optional[IO]]:
+        """取得下載目標的鎖：行程內的執行緒鎖，加上跨行程 (多個節點) 的鎖檔
+        
+        鎖檔在釋放時刪除；等待中的持有者取得鎖後發現鎖檔已被刪除或取代時重新開啟。
+        """
+        with self._target_locks_lock:
+            lock = self._target_locks.setdefault(str(output_path.absolute()), threading.Lock())
+        lock.acquire()
+        if fcntl is None:
+            return lock, None
+        
+        lock_path = output_path.with_name(output_path.name + '.lock')
+        try:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            while True:
+                handle = open(lock_path, 'a')
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    if os.path.samestat(os.fstat(handle.fileno()), os.stat(lock_path)):
+                        return lock, handle
+                except OSError:
+                    pass
+                handle.close()
+        except BaseException:
+            lock.release()
+            raise
+    
+    def unlock_target(self, output_path: Path, token: Tuple[threading.Lock, Optional[IO]]) -> None:
+        """釋放 lock_target 取得的鎖"""
+        lock, handle = token
+        try:
+            if handle is not None:
+                output_path.with_name(output_path.name + '.lock').unlink(missing_ok=True)
+                handle.close()
+        finally:
+            lock.release()
+    
+    @contextmanager
+    def _target_lock(self, output_path: Path) -> Iterator[None]:
+        token = self.lock_target(output_path)
+        try:
+            yield
+        finally:
+            self.unlock_target(output_path, token)
+    
+    def _download_file(self, url: str, output_path: Path, timeout: int, expected_size: int = 0) -> int:
+        """下載檔案到 .part 檔，驗證後以原子性更名取代目標檔案，回傳檔案大小
+        
+        .part 檔已有內容時以 Range 請求續傳 (有驗證器時附上 If-Range，遠端檔案變更時伺服器回傳完整內容)；
+        伺服器不支援 (回應 200) 時改為完整下載，續傳範圍無效 (416) 或不符時刪除部分檔案。
+        寫入中斷時保留已 fsync 的部分內容供下次重試續傳，驗證失敗時刪除部分檔案。
+        同一目標的下載以鎖序列化，目標路徑不會出現寫到一半的PDF。expected_size 為文件清單中的大小 (0 為未知)。
+        """
+        with self._target_lock(output_path):
+            part_path = self.part_path(output_path)
+            offset, headers, length = self._resume_request(part_path, expected_size)
+            response = self._request('get', url, timeout=timeout, stream=True, headers=headers)
+            try:
+                offset, mode = self._resume_mode(part_path, offset, response.status_code, response.headers, length)
+                size = offset + self._write_stream(response, part_path, mode)
+            finally:
+                response.close()
+            
+            return self._commit_part(part_path, output_path, size)
+    
+    def _resume_request(self, part_path: Path, expected_size: int = 0) -> Tuple[int, Dict[str, str], Optional[int]]:
+        """續傳的起始位移、請求標頭與預期的總長度
+        
+        部分檔案的總長度與文件清單的大小不符 (遠端檔案已變更) 或部分檔案超過該大小時刪除部分檔案。
+        """
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        meta = self._load_part_meta(part_path) if offset else {}
+        length = meta.get('length') or expected_size or None
+        
+        if offset and expected_size and (length != expected_size or offset > expected_size):
+            self.logger.info(f"{part_path.name} 與文件清單大小不符，重新下載")
+            self._discard_part(part_path)
+            offset, meta, length = 0, {}, expected_size
+        
+        headers = {}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            if meta.get('validator'):
+                headers['If-Range'] = meta['validator']
+        return offset, headers, length
+    
+    def _resume_mode(self, part_path: Path, offset: int, status_code: int, headers: Any,
+                     length: Optional[int] = None) -> Tuple[int, str]:
+        """依下載回應決定續傳或從頭寫入，回傳 (起始位移, 開檔模式)
+        
+        206 的 Content-Range 起點或總長度與部分檔案不符時刪除部分檔案，下次重試從頭下載。
+        """
+        if offset and status_code == 416:
+            self._discard_part(part_path)
+            raise Exception("續傳範圍無效，已刪除部分檔案")
+        
+        if offset and status_code == 206:
+            start, total = self._content_range(headers)
+            if start != offset or (length and total and total != length):
+                self._discard_part(part_path)
+                raise Exception(f"續傳範圍不符 ({headers.get('Content-Range')})，已刪除部分檔案")
+            self.logger.info(f"續傳 {part_path.name}: 從 {offset:,} bytes 開始")
+            self._save_part_meta(part_path, headers, total)
+            return offset, 'ab'
+        if status_code == 200:
+            # 未續傳、伺服器忽略 Range 或遠端檔案已變更 (If-Range 不符)：從頭寫入
+            self._save_part_meta(part_path, headers)
+            return 0, 'wb'
+        raise Exception(f"下載失敗，HTTP狀態碼: {status_code}")
+    
+    def _load_part_meta(self, part_path: Path) -> Dict[str, Any]:
+        try:
+            with open(self.part_meta_path(part_path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_part_meta(self, part_path: Path, headers: Any, length: Optional[int] = None) -> None:
+        """記錄遠端檔案的驗證器 (強 ETag，否則 Last-Modified) 與總長度，供續傳時送出 If-Range"""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        validator = etag if isinstance(etag, str) and not etag.startswith('W/') else None
+        if validator is None and isinstance(last_modified, str):
+            validator = last_modified
+        if length is None:
+            content_length = headers.get('Content-Length')
+            length = int(content_length) if isinstance(content_length, str) and content_length.isdigit() else None
+        
+        meta_path = self.part_meta_path(part_path)
+        if validator or length:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'validator': validator, 'length': length}, f)
+        else:
+            meta_path.unlink(missing_ok=True)
+    
+    def _discard_part(self, part_path: Path) -> None:
+        """刪除部分檔案與其續傳資訊"""
+        part_path.unlink(missing_ok=True)
+        self.part_meta_path(part_path).unlink(missing_ok=True)
+    
+    def _commit_part(self, part_path: Path, output_path: Path, size: int) -> int:
+        """驗證下載完成的部分檔案並以原子性更名取代目標檔案 (驗證失敗時刪除部分檔案)"""
+        with open(part_path, 'rb') as f:
+            head = f.read(1024)
+        try:
+            if size <= self.MIN_PDF_SIZE:
+                raise Exception(f"下載的檔案太小 ({size} bytes)")
+            # PDF 標頭必須出現在前 1024 位元組內 (錯誤頁面常以 HTML 回傳)
+            if self.PDF_MAGIC not in head:
+                raise Exception("下載的檔案不是PDF")
+        except Exception:
+            self._discard_part(part_path)
+            raise
+        
+        clear_readonly(output_path)  # 舊版儲存的連結為唯讀，Windows 上無法被取代
+        os.replace(part_path, output_path)
+        self.part_meta_path(part_path).unlink(missing_ok=True)
+        return size
+    
+    def _write_stream(self, response: requests.Response, part_path: Path, mode: str) -> int:
+        """將回應串流寫入部分檔案，回傳寫入的位元組數 (中斷時已寫入的內容仍會 fsync)"""
+        written = 0
+        with open(part_path, mode) as f:
+            try:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+        return written
+    
+    @staticmethod
+    def _content_range(headers: Any) -> Tuple[Optional[int], Optional[int]]:
+        """解析回應標頭 Content-Range (bytes 起點-終點/總長)，回傳 (起點, 總長)；總長為 * 時為 None"""
+        match = re.match(r'bytes\s+(\d+)-\d+/(\d+|\*)', str(headers.get('Content-Range', '')))
+        if not match:
+            return None, None
+        return int(match.group(1)), int(match.group(2)) if match.group(2).isdigit() else None
+    
+    def _parse_listing(self, html_content: str) -> Dict[str, Dict[str, Any]]:
+        """解析文件清單HTML為 檔名 (小寫) → 連結資訊 的對照表"""
+        listing = {}
+        for url, text in re.findall(self.LINK_PATTERN, html_content, re.IGNORECASE):
+            match = self.FILENAME_PATTERN.search(url) or self.FILENAME_PATTERN.search(text)
+            if not match:
+                continue
+            
+            filename = match.group(0)
+            size_match = re.search(self.SIZE_PATTERN, text)
+            listing.setdefault(filename.lower(), {
+                'url': url,
+                'text': text.strip(),
+                'size': int(size_match.group(1).replace(',', '')) if size_match else 0,
+                'filename': filename
+            })
+        
+        return listing
+    
     def _parse_pdf_links(self, html_content: str, target_filename: str) -> List[Dict[str, Any]]:
         """解析PDF下載連結"""
         pdf_links = []
         
-        # 正則表達式匹配PDF連結
-        link_pattern = r'<a[^>]+href=["\']([^"\']*\.pdf[^"\']*)["\'][^>]*>([^<]*)</a>'
-        size_pattern = r'(\d+(?:,\d+)*)\s*bytes?'
-        
-        matches = re.findall(link_pattern, html_content, re.IGNORECASE)
+        matches = re.findall(self.LINK_PATTERN, html_content, re.IGNORECASE)
         
         for url, text in matches:
             if target_filename in url or target_filename.replace('.pdf', '') in text:
                 # 尋找檔案大小
-                size_match = re.search(size_pattern, text)
+                size_match = re.search(self.SIZE_PATTERN, text)
                 size = int(size_match.group(1).replace(',', '')) if size_match else 0
                 
                 pdf_links.append({
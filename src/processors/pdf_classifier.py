@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF頁面類型分類器 - 以低階訊號判斷文字型/掃描型/混合型頁面
+"""
+
+import re
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Tuple
+
+import pdfplumber
+from pdfminer.pdftypes import resolve1, stream_value
+
+from ..core.config import AppConfig, get_config
+from ..utils.helpers import file_sha256
+
+
+# 文字顯示運算子 (Tj / TJ)
+TEXT_OPERATOR_PATTERN = re.compile(rb'\bT[jJ]\b')
+# 文字繪製模式 3 = 不可見文字，常見於 OCR 後的掃描頁
+INVISIBLE_TEXT_PATTERN = re.compile(rb'\b3\s+Tr\b')
+# 影像繪製: "a b c d e f cm /Name Do"
+IMAGE_DRAW_PATTERN = re.compile(
+    rb'(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+-?[\d.]+\s+-?[\d.]+\s+cm\s*/([^\s/\[\]<>()]+)\s+Do'
+)
+
+
+class PDFPageClassifier:
+    """PDF頁面類型分類器
+    
+    不經過 pdfplumber 的版面分析，只讀取頁面資源 (字型、XObject) 與
+    內容串流中的文字運算子及影像覆蓋率，並以 PDF 雜湊值快取結果。
+    """
+    
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.logger = logging.getLogger(self.__class__.__name__)
+        
+        # 舊版呼叫端可能傳入字典配置，此時使用全域配置
+        processing = config.processing if isinstance(config, AppConfig) else get_config().processing
+        self.image_coverage_threshold = processing.image_coverage_threshold
+        self.cache_size = processing.classifier_cache_size
+        self._cache: "OrderedDict[str, Dict[int, Dict[str, Any]]]" = OrderedDict()
+    
+    def classify(self, pdf_path: Path) -> Dict[int, str]:
+        """回傳每頁的類型對照表 {頁碼: text_based/scanned/mixed}"""
+        return {page_num: info['type'] for page_num, info in self._get_page_info(pdf_path).items()}
+    
+    def analyze(self, pdf_path: Path) -> Dict[str, Any]:
+        """分析整份PDF，回傳文件類型與每頁類型"""
+        page_info = self._get_page_info(pdf_path)
+        page_map = {page_num: info['type'] for page_num, info in page_info.items()}
+        total_pages = len(page_map)
+        
+        counts = {'text_based': 0, 'scanned': 0, 'mixed': 0}
+        for page_type in page_map.values():
+            counts[page_type] += 1
+        
+        text_ratio = counts['text_based'] / total_pages if total_pages > 0 else 0
+        scanned_ratio = counts['scanned'] / total_pages if total_pages > 0 else 1
+        
+        # 少數掃描頁 (封面、簽章頁) 或少數文字頁不影響整體策略
+        if text_ratio >= 0.8:
+            pdf_type = 'text_based'
+        elif scanned_ratio >= 0.8:
+            pdf_type = 'scanned'
+        else:
+            pdf_type = 'mixed'
+        
+        return {
+            'type': pdf_type,
+            'text_ratio': text_ratio,
+            'total_pages': total_pages,
+            'page_types': counts,
+            'text_operators': sum(info['text_operators'] for info in page_info.values()),
+            'page_map': page_map
+        }
+    
+    def clear_cache(self) -> None:
+        """清除分類快取"""
+        self._cache.clear()
+    
+    def _get_page_info(self, pdf_path: Path) -> Dict[int, Dict[str, Any]]:
+        """取得 (或計算並快取) 每頁的分類資訊"""
+        pdf_hash = file_sha256(pdf_path)
+        
+        if pdf_hash in self._cache:
+            self._cache.move_to_end(pdf_hash)
+            return self._cache[pdf_hash]
+        
+        page_info = {}
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num, page in enumerate(pdf.pages, 1):
+                page_info[page_num] = self.classify_page(page, page_num)
+        
+        self._cache[pdf_hash] = page_info
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        
+        return page_info
+    
+    def classify_page(self, page, page_num: int) -> Dict[str, Any]:
+        """分析單一頁面 (已開啟的 pdfplumber 頁面)，回傳類型、文字運算子數與影像覆蓋率"""
+        try:
+            return self._classify_page(page)
+        except Exception as e:
+            # 無法判斷的頁面同時走文字與OCR路徑
+            self.logger.warning(f"無法分析第{page_num}頁: {e}")
+            return {'type': 'mixed', 'text_operators': 0, 'image_coverage': 0.0}
+    
+    def _classify_page(self, page) -> Dict[str, Any]:
+        """以字型資源、文字運算子與影像覆蓋率判斷單頁類型"""
+        page_obj = page.page_obj
+        resources = resolve1(page_obj.resources) or {}
+        
+        fonts = resolve1(resources.get('Font')) or {}
+        images, forms = self._collect_xobjects(resources)
+        
+        content = self._read_contents(page_obj.contents)
+        for form in forms:
+            content += b'\n' + form
+        
+        text_operators = len(TEXT_OPERATOR_PATTERN.findall(content)) if fonts or forms else 0
+        invisible_text = INVISIBLE_TEXT_PATTERN.search(content) is not None
+        
+        page_area = float(page.width) * float(page.height)
+        image_area = 0.0
+        for match in IMAGE_DRAW_PATTERN.finditer(content):
+            name = match.group(5).decode('latin-1')
+            if name in images:
+                a, b, c, d = (float(match.group(i)) for i in range(1, 5))
+                image_area += abs(a * d - b * c)
+        image_coverage = min(image_area / page_area, 1.0) if page_area > 0 else 0.0
+        
+        if text_operators == 0:
+            # 沒有文字層：大面積影像為掃描頁，空白頁不需OCR
+            page_type = 'scanned' if image_coverage >= self.image_coverage_threshold else 'text_based'
+        elif invisible_text or image_coverage >= self.image_coverage_threshold:
+            page_type = 'mixed'
+        else:
+            page_type = 'text_based'
+        
+        return {
+            'type': page_type,
+            'text_operators': text_operators,
+            'image_coverage': round(image_coverage, 4)
+        }
+    
+    def _collect_xobjects(self, resources: Dict) -> Tuple[set, list]:
+        """收集影像 XObject 名稱及表單 XObject 的內容串流"""
+        images = set()
+        forms = []
+        
+        xobjects = resolve1(resources.get('XObject')) or {}
+        for name, ref in xobjects.items():
+            xobject = resolve1(ref)
+            subtype = getattr(xobject, 'attrs', {}).get('Subtype')
+            subtype_name = getattr(subtype, 'name', subtype)
+            
+            if subtype_name == 'Image':
+                images.add(name)
+            elif subtype_name == 'Form':
+                forms.append(self._read_contents(xobject))
+        
+        return images, forms
+    
+    @staticmethod
+    def _read_contents(contents: Any) -> bytes:
+        """讀取並解碼頁面內容串流"""
+        if contents is None:
+            return b''
+        
+        streams = contents if isinstance(contents, list) else [contents]
+        data = []
+        for stream in streams:
+            try:
+                data.append(stream_value(stream).get_data())
+            except Exception:
+                continue
+        
+        return b'\n'.join(data)
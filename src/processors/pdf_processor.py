@@ -7,7 +7,7 @@
 import re
 import logging
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import json
 
 try:
@@ -29,6 +29,7 @@ from ..core import (
     Extractor,
     get_config,
     handle_errors,
+    FinancialReportsException,
     PDFProcessingError,
     OCRError,
     DataExtractionError,
@@ -37,6 +38,12 @@ from ..core import (
     ErrorCode
 )
 from ..core.config import AppConfig
+from .table_normalizer import TableNormalizer
+from .pdf_classifier import PDFPageClassifier
+from .section_segmenter import SectionSegmenter, FIELD_SECTIONS
+
+# 擷取邏輯版本：修改表格正規化、區段切分或匹配規則時遞增，讓處理清單中的既有結果失效
+EXTRACTION_VERSION = 3
 
 
 class PDFTextExtractor:
@@ -88,23 +95,7 @@ class PDFTableExtractor:
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 for page_num, page in enumerate(pdf.pages, 1):
-                    try:
-                        tables = page.extract_tables()
-                        
-                        for table_num, table in enumerate(tables):
-                            if table and len(table) > 1:  # 至少要有標題和一行數據
-                                table_dict = {
-                                    'page': page_num,
-                                    'table_index': table_num,
-                                    'headers': table[0] if table else [],
-                                    'rows': table[1:] if len(table) > 1 else [],
-                                    'raw_data': table
-                                }
-                                all_tables.append(table_dict)
-                                
-                    except Exception as e:
-                        self.logger.warning(f"無法提取第{page_num}頁表格: {e}")
-                        continue
+                    all_tables.extend(self.extract_page_tables(page, page_num))
         
         except Exception as e:
             raise PDFProcessingError(
@@ -115,6 +106,30 @@ class PDFTableExtractor:
             )
         
         return all_tables
+    
+    def extract_page_tables(self, page, page_num: int, include_raw: bool = True) -> List[Dict]:
+        """提取單頁表格，include_raw=False 時不保留 raw_data 副本"""
+        page_tables = []
+        
+        try:
+            tables = page.extract_tables()
+            
+            for table_num, table in enumerate(tables):
+                if table and len(table) > 1:  # 至少要有標題和一行數據
+                    table_dict = {
+                        'page': page_num,
+                        'table_index': table_num,
+                        'headers': table[0] if table else [],
+                        'rows': table[1:] if len(table) > 1 else []
+                    }
+                    if include_raw:
+                        table_dict['raw_data'] = table
+                    page_tables.append(table_dict)
+                    
+        except Exception as e:
+            self.logger.warning(f"無法提取第{page_num}頁表格: {e}")
+        
+        return page_tables
 
 
 class PDFFinancialExtractor:
@@ -124,6 +139,8 @@ class PDFFinancialExtractor:
         self.config = config
         self.logger = logging.getLogger(self.__class__.__name__)
         self.patterns = self._load_financial_patterns()
+        self.table_normalizer = TableNormalizer(self.patterns)
+        self.section_segmenter = SectionSegmenter()
     
     def _load_financial_patterns(self) -> Dict[str, List[str]]:
         """載入財務數據匹配模式"""
@@ -176,8 +193,11 @@ class PDFFinancialExtractor:
         text_data = self._extract_from_text(text)
         financial_data.update(text_data)
         
-        # 從表格中提取
-        table_data = self._extract_from_tables(tables)
+        # 從表格中提取 (表格依所在頁面的報表區段匹配)
+        page_sections = self.section_segmenter.page_sections(text)
+        table_data = self._extract_from_tables(
+            tables, [page_sections.get(table.get('page')) for table in tables], set(page_sections.values())
+        )
         financial_data.update(table_data)
         
         # 清理和驗證數據
@@ -185,62 +205,130 @@ class PDFFinancialExtractor:
         
         return cleaned_data
     
+    @handle_errors
+    def extract_period_data(self, tables: List[Dict]) -> Dict[str, Dict[str, Any]]:
+        """從表格的各期間欄位提取財務數據 (含比較期)，回傳 {期間: {欄位: 數值}}"""
+        period_data = {}
+        
+        for period, data in self.table_normalizer.extract_periods(tables).items():
+            cleaned = self._clean_financial_data(data)
+            if cleaned:
+                period_data[period] = cleaned
+        
+        return period_data
+    
+    @handle_errors
+    def extract_from_pages(self, pages: Iterable[Tuple[str, List[Dict]]],
+                           tables: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """逐頁提取財務數據，不保留整份文件的文字
+        
+        pages 依序產生 (頁面文字, 頁面表格)。文字匹配結果與整份文字
+        一次匹配相同：各欄位只比對所屬報表區段，模式順序優先，同一模式取最早出現的頁面。
+        傳入 tables 時收集各頁表格，供後續提取比較期數據。
+        """
+        if tables is None:
+            tables = []
+        # 各表格所在頁面 (對應 page_sections 的頁碼)
+        table_pages = []
+        page_sections = {}
+        
+        def page_texts() -> Iterator[Tuple[int, str]]:
+            for page_num, (text, page_tables) in enumerate(pages, 1):
+                tables.extend(page_tables)
+                table_pages.extend([page_num] * len(page_tables))
+                yield page_num, text
+        
+        financial_data = self._match_pages(page_texts(), page_sections)
+        financial_data.update(self._extract_from_tables(
+            tables, [page_sections.get(page_num) for page_num in table_pages], set(page_sections.values())
+        ))
+        
+        return self._clean_financial_data(financial_data)
+    
     def _extract_from_text(self, text: str) -> Dict[str, Any]:
         """從文字中提取財務數據"""
+        return self._match_pages(self.section_segmenter.iter_pages(text))
+    
+    def _match_pages(self, pages: Iterable[Tuple[int, str]],
+                     page_sections: Optional[Dict[int, Optional[str]]] = None) -> Dict[str, Any]:
+        """依報表區段逐頁匹配文字
+        
+        欄位所屬區段出現後只採用該區段內的匹配 (避免附註中的同名科目)；
+        文件中沒有該區段標題時，退回以全文匹配。傳入 page_sections 時記錄各頁的區段。
+        """
+        section_matches = {}
+        fallback_matches = {}
+        seen_sections = set()
+        
+        for page_num, section, text in self.section_segmenter.assign_sections(pages):
+            if page_sections is not None:
+                page_sections[page_num] = section
+            if not text:
+                continue
+            
+            if section:
+                seen_sections.add(section)
+                own_fields = [f for f in self.patterns if FIELD_SECTIONS.get(f) == section]
+                self._match_text(text, section_matches, own_fields)
+            
+            unseen_fields = [f for f in self.patterns if FIELD_SECTIONS.get(f) not in seen_sections]
+            self._match_text(text, fallback_matches, unseen_fields)
+        
         extracted = {}
+        for field_name in self.patterns:
+            matches = section_matches if FIELD_SECTIONS.get(field_name) in seen_sections else fallback_matches
+            if field_name in matches:
+                extracted[field_name] = matches[field_name][1]
         
-        for field_name, patterns in self.patterns.items():
-            for pattern in patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
+        return extracted
+    
+    def _match_text(self, text: str, matches: Dict[str, Tuple[int, Any]],
+                    fields: Iterable[str]) -> Dict[str, Tuple[int, Any]]:
+        """以文字更新 欄位 -> (模式順序, 數值)，只嘗試比已命中者更優先的模式"""
+        for field_name in fields:
+            patterns = self.patterns[field_name]
+            found_index = matches.get(field_name, (len(patterns), None))[0]
+            
+            for pattern_index, pattern in enumerate(patterns[:found_index]):
+                match = re.search(pattern, text, re.IGNORECASE)
+                if match:
                     # 取第一個匹配的值
-                    value = matches[0].replace(',', '')
+                    value = match.group(1).replace(',', '')
                     try:
                         if '.' in value:
-                            extracted[field_name] = float(value)
+                            matches[field_name] = (pattern_index, float(value))
                         else:
-                            extracted[field_name] = int(value)
+                            matches[field_name] = (pattern_index, int(value))
                         break  # 找到就停止
                     except ValueError:
                         continue
         
-        return extracted
+        return matches
     
-    def _extract_from_tables(self, tables: List[Dict]) -> Dict[str, Any]:
-        """從表格中提取財務數據"""
+    def _extract_from_tables(self, tables: List[Dict], table_sections: Optional[List[Optional[str]]] = None,
+                             seen_sections: Iterable[Optional[str]] = ()) -> Dict[str, Any]:
+        """從表格中提取財務數據（表格一次向量化正規化）
+        
+        table_sections 為各表格所在頁面的區段，seen_sections 為文件中出現過的區段。
+        與文字匹配相同：欄位所屬區段出現後只採用該區段頁面的表格，否則退回以全部表格匹配。
+        """
+        if table_sections is None:
+            return self.table_normalizer.extract(tables)
+        
+        seen_sections = {section for section in seen_sections if section}
         extracted = {}
+        if any(FIELD_SECTIONS.get(f) not in seen_sections for f in self.patterns):
+            extracted = {
+                field_name: value for field_name, value in self.table_normalizer.extract(tables).items()
+                if FIELD_SECTIONS.get(field_name) not in seen_sections
+            }
         
-        for table in tables:
-            headers = table.get('headers', [])
-            rows = table.get('rows', [])
-            
-            if not headers or not rows:
-                continue
-            
-            # 尋找財務科目相關的表格
-            for row in rows:
-                if not row or len(row) == 0:
-                    continue
-                
-                first_cell = str(row[0]).strip() if row[0] else ""
-                
-                # 檢查是否為財務科目
-                for field_name, patterns in self.patterns.items():
-                    for pattern in patterns:
-                        if re.search(pattern.split('[：:]')[0], first_cell, re.IGNORECASE):
-                            # 尋找數值欄位
-                            for i, cell in enumerate(row[1:], 1):
-                                if cell and str(cell).replace(',', '').replace('(', '').replace(')', '').strip().isdigit():
-                                    try:
-                                        value = str(cell).replace(',', '').replace('(', '').replace(')', '')
-                                        if '.' in value:
-                                            extracted[field_name] = float(value)
-                                        else:
-                                            extracted[field_name] = int(value)
-                                        break
-                                    except ValueError:
-                                        continue
-                            break
+        for section in seen_sections & set(FIELD_SECTIONS.values()):
+            section_tables = [table for table, table_section in zip(tables, table_sections) if table_section == section]
+            extracted.update({
+                field_name: value for field_name, value in self.table_normalizer.extract(section_tables).items()
+                if FIELD_SECTIONS.get(field_name) == section
+            })
         
         return extracted
     
@@ -265,6 +353,7 @@ class ModernPDFProcessor(BaseProcessor):
         self.text_extractor = PDFTextExtractor(self.config)
         self.table_extractor = PDFTableExtractor(self.config)
         self.financial_extractor = PDFFinancialExtractor(self.config)
+        self.page_classifier = PDFPageClassifier(self.config)
         
         # 初始化OCR（如果可用）
         self.ocr_engine = None
@@ -280,8 +369,13 @@ class ModernPDFProcessor(BaseProcessor):
                 self.logger.warning(f"PaddleOCR初始化失敗: {e}")
     
     @handle_errors
-    def process(self, input_path: Path, output_path: Optional[Path] = None) -> Dict[str, Any]:
-        """處理PDF檔案"""
+    def process(self, input_path: Path, output_path: Optional[Path] = None,
+                lean: Optional[bool] = None) -> Dict[str, Any]:
+        """處理PDF檔案
+        
+        lean 為 True 時 (未指定則依 processing.lean_results)，不保留原始文字與表格，
+        只回傳財務數據、頁面類型對照表與統計資訊。
+        """
         self.validate_input(input_path)
         
         if input_path.suffix.lower() != '.pdf':
@@ -292,7 +386,20 @@ class ModernPDFProcessor(BaseProcessor):
         
         result = ProcessingResult(success=True, message="PDF處理完成")
         
+        if lean is None:
+            lean = self.config.processing.lean_results
+        
         try:
+            if lean:
+                processed_data = self._process_lean(input_path)
+                result.data = processed_data
+                
+                if output_path:
+                    self._save_result(processed_data, output_path)
+                
+                self.logger.info(f"PDF處理完成 (精簡模式): {input_path}")
+                return result.to_dict()
+            
             # 提取文字
             self.logger.info(f"開始提取PDF文字: {input_path}")
             text = self.text_extractor.extract_text(input_path)
@@ -304,21 +411,10 @@ class ModernPDFProcessor(BaseProcessor):
             # 提取財務數據
             self.logger.info(f"開始提取財務數據: {input_path}")
             financial_data = self.financial_extractor.extract_financial_data(text, tables)
+            period_data = self.financial_extractor.extract_period_data(tables)
             
             # 構建結果
-            processed_data = {
-                "source_file": str(input_path),
-                "text_content": text,
-                "tables": tables,
-                "financial_data": financial_data,
-                "processing_info": {
-                    "text_length": len(text),
-                    "table_count": len(tables),
-                    "financial_fields_found": len(financial_data),
-                    "processor": "pdfplumber",
-                    "ocr_available": self.ocr_engine is not None
-                }
-            }
+            processed_data = self._full_data(input_path, text, tables, financial_data, period_data)
             
             result.data = processed_data
             
@@ -336,6 +432,166 @@ class ModernPDFProcessor(BaseProcessor):
         
         return result.to_dict()
     
+    def _process_lean(self, input_path: Path) -> Dict[str, Any]:
+        """精簡模式：單次開啟PDF逐頁提取，頁面文字用完即釋放，表格只保留至比較期提取完成"""
+        stats = {"pages": 0, "text_length": 0, "table_count": 0}
+        
+        tables = []
+        
+        self.logger.info(f"開始逐頁提取財務數據: {input_path}")
+        try:
+            with pdfplumber.open(input_path) as pdf:
+                financial_data = self.financial_extractor.extract_from_pages(
+                    self._iter_pages(pdf, stats), tables
+                )
+            period_data = self.financial_extractor.extract_period_data(tables)
+        except FinancialReportsException:
+            raise
+        except Exception as e:
+            raise PDFProcessingError(
+                ErrorCode.PDF_PARSE_ERROR,
+                f"PDF逐頁提取失敗: {e}",
+                str(input_path),
+                original_exception=e
+            )
+        
+        return self._lean_data(input_path, financial_data, period_data, self.page_classifier.classify(input_path), stats)
+    
+    @handle_errors
+    def extract_pages(self, input_path: Path, first_page: int, last_page: int,
+                      lean: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """提取頁碼範圍 [first_page, last_page] 各頁的文字、表格與頁面類型
+        
+        供跨文件分頁排程使用：同一份PDF的不同頁碼範圍可在不同工作行程中提取，
+        再以 assemble_pages 依頁碼組合。
+        """
+        if lean is None:
+            lean = self.config.processing.lean_results
+        
+        pages = []
+        try:
+            with pdfplumber.open(input_path, pages=list(range(first_page, last_page + 1))) as pdf:
+                for page in pdf.pages:
+                    page_num = page.page_number
+                    pages.append({
+                        'page': page_num,
+                        'text': self._page_text(page, page_num),
+                        'tables': self.table_extractor.extract_page_tables(page, page_num, include_raw=not lean),
+                        'type': self.page_classifier.classify_page(page, page_num)['type']
+                    })
+                    page.close()
+        except Exception as e:
+            raise PDFProcessingError(
+                ErrorCode.PDF_PARSE_ERROR,
+                f"PDF第{first_page}-{last_page}頁提取失敗: {e}",
+                str(input_path),
+                original_exception=e
+            )
+        
+        return pages
+    
+    @handle_errors
+    def assemble_pages(self, input_path: Path, pages: List[Dict[str, Any]], output_path: Optional[Path] = None,
+                       lean: Optional[bool] = None) -> Dict[str, Any]:
+        """由 extract_pages 的各頁結果組合處理結果，內容與 process() 相同"""
+        if lean is None:
+            lean = self.config.processing.lean_results
+        
+        pages = sorted(pages, key=lambda page: page['page'])
+        
+        if lean:
+            tables = []
+            financial_data = self.financial_extractor.extract_from_pages(
+                ((page['text'], page['tables']) for page in pages), tables
+            )
+            stats = {
+                "pages": len(pages),
+                "text_length": sum(len(page['text']) for page in pages),
+                "table_count": len(tables)
+            }
+            processed_data = self._lean_data(
+                input_path,
+                financial_data,
+                self.financial_extractor.extract_period_data(tables),
+                {page['page']: page['type'] for page in pages},
+                stats
+            )
+        else:
+            # 與 PDFTextExtractor.extract_text 相同的頁面分隔格式
+            text = "\n".join(f"=== 第{page['page']}頁 ===\n{page['text']}\n" for page in pages if page['text'].strip())
+            tables = [table for page in pages for table in page['tables']]
+            processed_data = self._full_data(
+                input_path,
+                text,
+                tables,
+                self.financial_extractor.extract_financial_data(text, tables),
+                self.financial_extractor.extract_period_data(tables)
+            )
+        
+        if output_path:
+            self._save_result(processed_data, output_path)
+        
+        return ProcessingResult(success=True, message="PDF處理完成", data=processed_data).to_dict()
+    
+    def _full_data(self, input_path: Path, text: str, tables: List[Dict], financial_data: Dict[str, Any],
+                   period_data: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """完整模式的處理結果"""
+        return {
+            "source_file": str(input_path),
+            "text_content": text,
+            "tables": tables,
+            "financial_data": financial_data,
+            "period_data": period_data,
+            "processing_info": {
+                "text_length": len(text),
+                "table_count": len(tables),
+                "financial_fields_found": len(financial_data),
+                "processor": "pdfplumber",
+                "ocr_available": self.ocr_engine is not None
+            }
+        }
+    
+    def _lean_data(self, input_path: Path, financial_data: Dict[str, Any], period_data: Dict[str, Dict[str, Any]],
+                   page_map: Dict[int, str], stats: Dict[str, int]) -> Dict[str, Any]:
+        """精簡模式的處理結果"""
+        return {
+            "source_file": str(input_path),
+            "financial_data": financial_data,
+            "period_data": period_data,
+            "page_map": page_map,
+            "processing_info": {
+                **stats,
+                "financial_fields_found": len(financial_data),
+                "processor": "pdfplumber",
+                "ocr_available": self.ocr_engine is not None,
+                "lean": True
+            }
+        }
+    
+    def _page_text(self, page, page_num: int) -> str:
+        """提取單頁文字，失敗時回傳空字串"""
+        try:
+            return page.extract_text() or ''
+        except Exception as e:
+            self.logger.warning(f"無法提取第{page_num}頁文字: {e}")
+            return ''
+    
+    def _iter_pages(self, pdf, stats: Dict[str, int]) -> Iterator[Tuple[str, List[Dict]]]:
+        """依序產生每頁的 (文字, 表格)，並累計統計資訊"""
+        for page_num, page in enumerate(pdf.pages, 1):
+            text = self._page_text(page, page_num)
+            
+            tables = self.table_extractor.extract_page_tables(page, page_num, include_raw=False)
+            
+            stats["pages"] += 1
+            stats["text_length"] += len(text)
+            stats["table_count"] += len(tables)
+            
+            yield text, tables
+            
+            # 釋放 pdfplumber 在頁面上快取的版面物件
+            page.close()
+    
     def _save_result(self, data: Dict[str, Any], output_path: Path) -> None:
         """儲存處理結果"""
         output_path.parent.mkdir(parents=True, exist_ok=True)
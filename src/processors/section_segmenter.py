@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+財務報表區段切分模組 - 依報表標題將文字切分為資產負債表、損益表等區段
+"""
+
+import re
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# 報表標題 -> 區段名稱
+SECTION_TITLES = {
+    '資產負債表': 'balance_sheet',
+    '綜合損益表': 'income_statement',
+    '損益表': 'income_statement',
+    '權益變動表': 'equity_statement',
+    '現金流量表': 'cash_flow',
+    '財務報表附註': 'notes',
+}
+
+# 欄位所屬區段，未列出的欄位比對全文
+FIELD_SECTIONS = {
+    'net_revenue': 'income_statement',
+    'gross_profit': 'income_statement',
+    'operating_income': 'income_statement',
+    'net_income': 'income_statement',
+    'eps': 'income_statement',
+    'cash_and_equivalents': 'balance_sheet',
+    'accounts_receivable': 'balance_sheet',
+    'inventory': 'balance_sheet',
+    'total_assets': 'balance_sheet',
+    'total_liabilities': 'balance_sheet',
+    'equity': 'balance_sheet',
+    'total_equity': 'balance_sheet',
+}
+
+# 標題列: 可選的公司名稱與合併/個體前綴，續頁可帶 "(續)"；目錄中帶頁碼的項目不符合
+TITLE_PATTERN = re.compile(
+    r'^(?:\S*公司(?:及子公司)?)?(?:合併|個體)?'
+    r'(?P<title>' + '|'.join(sorted(SECTION_TITLES, key=len, reverse=True)) + r')'
+    r'(?:[（(]續[)）])?$'
+)
+PAGE_MARKER_PATTERN = re.compile(r'^=== 第(\d+)頁 ===$', re.MULTILINE)
+
+
+class SectionSegmenter:
+    """財務報表區段切分器
+    
+    只檢查每頁開頭幾行的標題，沒有標題的頁面延續前一頁的區段；
+    第一個標題之前的頁面 (封面、目錄、會計師報告) 不屬於任何區段。
+    """
+    
+    def __init__(self, title_lines: int = 6):
+        self.title_lines = title_lines
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    def detect_section(self, page_text: str) -> Optional[str]:
+        """偵測頁面開頭的報表標題，回傳區段名稱"""
+        for line in page_text.strip().split('\n')[:self.title_lines]:
+            match = TITLE_PATTERN.match(re.sub(r'\s+', '', line))
+            if match:
+                return SECTION_TITLES[match.group('title')]
+        return None
+    
+    def iter_pages(self, text: str) -> Iterator[Tuple[int, str]]:
+        """依 "=== 第N頁 ===" 標記拆分文字，沒有標記時整段視為第1頁"""
+        markers = list(PAGE_MARKER_PATTERN.finditer(text))
+        if not markers:
+            yield 1, text
+            return
+        
+        for index, marker in enumerate(markers):
+            end = markers[index + 1].start() if index + 1 < len(markers) else len(text)
+            yield int(marker.group(1)), text[marker.end():end]
+    
+    def assign_sections(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, Optional[str], str]]:
+        """依序產生 (頁碼, 區段, 頁面文字)"""
+        section = None
+        for page_num, page_text in pages:
+            section = self.detect_section(page_text) or section
+            yield page_num, section, page_text
+    
+    def page_sections(self, text: str) -> Dict[int, Optional[str]]:
+        """回傳頁碼 -> 區段對照表"""
+        return {page_num: section for page_num, section, _ in self.assign_sections(self.iter_pages(text))}
+    
+    def split(self, text: str) -> Dict[str, str]:
+        """將文字切分為各區段文字"""
+        sections: Dict[str, List[str]] = {}
+        for _, section, page_text in self.assign_sections(self.iter_pages(text)):
+            if section:
+                sections.setdefault(section, []).append(page_text)
+        
+        return {section: '\n'.join(texts) for section, texts in sections.items()}
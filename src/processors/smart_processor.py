@@ -6,6 +6,7 @@
 
 import re
 import json
+import hashlib
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
@@ -19,7 +20,13 @@ from ..core import (
     handle_errors
 )
 from ..core.config import AppConfig
-from .pdf_processor import ModernPDFProcessor
+from ..utils.helpers import report_filename
+from .pdf_processor import EXTRACTION_VERSION, ModernPDFProcessor
+from .section_segmenter import FIELD_SECTIONS
+from ..batch import BatchExecutor
+
+
+PROCESSOR_VERSION = 'smart_v2.1'
 
 
 class SmartFinancialProcessor(BaseProcessor):
@@ -88,8 +95,23 @@ class SmartFinancialProcessor(BaseProcessor):
             ]
         }
     
-    def process(self, pdf_path: Path, json_path: Path, output_path: Optional[Path] = None) -> ProcessingResult:
-        """智慧處理PDF和JSON"""
+    def get_extractor_version(self) -> str:
+        """處理器版本、擷取邏輯版本與所有匹配模式的指紋，任一變更時批次處理會重新處理所有輸入"""
+        patterns = {
+            'extraction_version': EXTRACTION_VERSION,
+            'smart': self.financial_patterns,
+            'pdf': self.pdf_processor.financial_extractor.patterns
+        }
+        payload = json.dumps(patterns, ensure_ascii=False, sort_keys=True)
+        return f"{PROCESSOR_VERSION}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]}"
+    
+    def process(self, pdf_path: Path, json_path: Path, output_path: Optional[Path] = None,
+                backfill_prior: Optional[bool] = None) -> ProcessingResult:
+        """智慧處理PDF和JSON
+        
+        backfill_prior 為 True 時 (未指定則依 processing.backfill_prior_periods)，
+        將報表中比較期欄位的數值寫入缺少或空白的前期JSON。
+        """
         try:
             self.logger.info(f"智慧處理: {pdf_path.name}")
             
@@ -122,6 +144,16 @@ class SmartFinancialProcessor(BaseProcessor):
                     pdf_path, enhanced_data, pdf_analysis
                 )
             
+            # 比較期數值只用於回填前期JSON，不寫入 metadata
+            period_data = pdf_analysis.pop('period_data', {})
+            if backfill_prior is None:
+                processing = self.config.processing if isinstance(self.config, AppConfig) else get_config().processing
+                backfill_prior = processing.backfill_prior_periods
+            
+            prior_files = []
+            if backfill_prior and period_data:
+                prior_files = self.backfill_prior_periods(json_path.parent, original_data, period_data, pdf_path.name)
+            
             # 添加缺失的欄位以符合品質驗證期望
             self._add_missing_fields(enhanced_data)
             
@@ -129,7 +161,7 @@ class SmartFinancialProcessor(BaseProcessor):
             enhanced_data['metadata'] = enhanced_data.get('metadata', {})
             enhanced_data['metadata'].update({
                 'enhanced_at': datetime.now().isoformat(),
-                'processor_version': 'smart_v2.1',
+                'processor_version': PROCESSOR_VERSION,
                 'extraction_confidence': confidence_level,
                 'processing_note': processing_note,
                 'pdf_analysis': pdf_analysis
@@ -151,7 +183,8 @@ class SmartFinancialProcessor(BaseProcessor):
                 data={
                     "output_path": str(output_path),
                     "confidence_level": confidence_level,
-                    "pdf_type": pdf_analysis['type']
+                    "pdf_type": pdf_analysis['type'],
+                    "prior_period_files": prior_files
                 }
             )
         
@@ -162,14 +195,12 @@ class SmartFinancialProcessor(BaseProcessor):
     def _process_text_based_pdf(self, pdf_path: Path, enhanced_data: Dict, pdf_analysis: Dict) -> Tuple[str, str]:
         """處理文字型PDF"""
         try:
-            # 使用PDF處理器提取內容
-            processing_result_dict = self.pdf_processor.process(pdf_path)
+            # 使用PDF處理器提取內容（精簡模式，不保留原始文字與表格）
+            processing_result_dict = self.pdf_processor.process(pdf_path, lean=True)
             
             if processing_result_dict.get('success', False) and 'data' in processing_result_dict:
                 pdf_data = processing_result_dict['data']
-                
-                # 獲取文字內容
-                text_content = pdf_data.get('text_content', '')
+                pdf_analysis['period_data'] = pdf_data.get('period_data', {})
                 
                 # 獲取已提取的財務數據
                 financial_data = pdf_data.get('financial_data', {})
@@ -180,8 +211,9 @@ class SmartFinancialProcessor(BaseProcessor):
                     self._backfill_data(enhanced_data, financial_data)
                     return 'high', f'Text-based PDF processed with {len(financial_data)} financial fields'
                 
-                # 否則使用smart processor的財務數據提取
-                elif text_content:
+                # 否則取得文字內容，使用smart processor的財務數據提取
+                text_content = self._get_text_content(pdf_path, pdf_data)
+                if text_content:
                     self.logger.info(f"使用智慧處理器提取財務數據，文字長度: {len(text_content)}")
                     extracted_data = self._extract_financial_data(text_content)
                     self._backfill_data(enhanced_data, extracted_data)
@@ -216,12 +248,12 @@ class SmartFinancialProcessor(BaseProcessor):
     def _process_mixed_pdf(self, pdf_path: Path, enhanced_data: Dict, pdf_analysis: Dict) -> Tuple[str, str]:
         """處理混合型PDF，合併文字與OCR內容"""
         try:
-            processing_result_dict = self.pdf_processor.process(pdf_path)
+            processing_result_dict = self.pdf_processor.process(pdf_path, lean=True)
             if processing_result_dict.get('success', False) and 'data' in processing_result_dict:
                 pdf_data = processing_result_dict['data']
+                pdf_analysis['period_data'] = pdf_data.get('period_data', {})
                 
-                # 獲取文字內容和財務數據
-                text_content = pdf_data.get('text_content', '')
+                # 獲取財務數據
                 financial_data = pdf_data.get('financial_data', {})
                 
                 # 使用PDF處理器的結果
@@ -230,7 +262,8 @@ class SmartFinancialProcessor(BaseProcessor):
                     return 'medium', f'Mixed PDF processed with PDF extractor: {len(financial_data)} fields'
                 
                 # 使用smart processor的財務數據提取
-                elif text_content:
+                text_content = self._get_text_content(pdf_path, pdf_data)
+                if text_content:
                     extracted_data = self._extract_financial_data(text_content)
                     self._backfill_data(enhanced_data, extracted_data)
                     return 'medium', f'Mixed PDF processed with smart extraction: {len(extracted_data)} fields'
@@ -244,16 +277,36 @@ class SmartFinancialProcessor(BaseProcessor):
             self.logger.error(f"混合型PDF處理失敗: {e}")
             return 'low', f'Mixed processing failed: {e}'
     
+    def _get_text_content(self, pdf_path: Path, pdf_data: Dict[str, Any]) -> str:
+        """取得PDF文字內容；精簡模式的結果不含文字時才重新提取"""
+        if 'text_content' in pdf_data:
+            return pdf_data['text_content']
+        
+        return self.pdf_processor.text_extractor.extract_text(pdf_path)
+    
+    def _section_lines(self, text: str) -> Tuple[List[Tuple[Optional[str], str]], set]:
+        """將文字拆成 (報表區段, 行) 並回傳文件中出現的區段
+        
+        欄位所屬區段有出現時只比對該區段的行，否則比對全文。
+        """
+        segmenter = self.pdf_processor.financial_extractor.section_segmenter
+        
+        lines = []
+        for _, section, page_text in segmenter.assign_sections(segmenter.iter_pages(text)):
+            lines.extend((section, line) for line in page_text.split('\n'))
+        
+        return lines, {section for section, _ in lines if section}
+    
     def _extract_financial_data(self, text: str) -> Dict[str, Any]:
         """提取財務資料，回傳值含 confidence 與來源"""
         if not text or len(text) < 100:
             return {}
         
         extracted = {}
-        lines = text.split('\n')
+        lines, found_sections = self._section_lines(text)
         
         # 逐行處理文字以找到財務資料
-        for line in lines:
+        for section, line in lines:
             line = line.strip()
             if not line:
                 continue
@@ -261,6 +314,8 @@ class SmartFinancialProcessor(BaseProcessor):
             for field_name, patterns in self.financial_patterns.items():
                 if field_name in extracted:
                     continue  # 已找到此欄位
+                if FIELD_SECTIONS.get(field_name) in found_sections and FIELD_SECTIONS[field_name] != section:
+                    continue  # 只比對欄位所屬的報表區段
                 
                 for pattern in patterns:
                     match = re.search(pattern, line, re.IGNORECASE)
@@ -295,10 +350,10 @@ class SmartFinancialProcessor(BaseProcessor):
             return {}
         
         extracted = {}
-        lines = ocr_text.split('\n')
+        lines, found_sections = self._section_lines(ocr_text)
         
         # 逐行處理文字以找到財務資料
-        for line in lines:
+        for section, line in lines:
             line = line.strip()
             if not line:
                 continue
@@ -306,6 +361,8 @@ class SmartFinancialProcessor(BaseProcessor):
             for field_name, patterns in self.financial_patterns.items():
                 if field_name in extracted:
                     continue  # 已找到此欄位
+                if FIELD_SECTIONS.get(field_name) in found_sections and FIELD_SECTIONS[field_name] != section:
+                    continue  # 只比對欄位所屬的報表區段
                 
                 for pattern in patterns:
                     match = re.search(pattern, line, re.IGNORECASE)
@@ -609,6 +666,76 @@ class SmartFinancialProcessor(BaseProcessor):
                 original_data['income_statement'][field] = value
                 self.logger.info(f"回填 income_statement.{field}: {value}")
     
+    def backfill_prior_periods(self, json_dir: Path, report_data: Dict, period_data: Dict[str, Dict[str, Any]],
+                               source_file: str) -> List[str]:
+        """以比較期欄位數值回填前期JSON，只寫入不存在或沒有任何財務數值的檔案
+        
+        Returns:
+            已寫入的前期JSON路徑
+        """
+        stock_code = report_data.get('stock_code')
+        current_period = f"{report_data.get('report_year')}{report_data.get('report_season')}"
+        written = []
+        
+        if not stock_code:
+            return written
+        
+        for period, values in period_data.items():
+            if period == current_period or not values:
+                continue
+            
+            year, season = int(period[:4]), period[4:]
+            prior_path = json_dir / report_filename(year, season, stock_code)
+            
+            prior_data = self._load_report_if_empty(prior_path)
+            if prior_data is None:
+                self.logger.debug(f"前期JSON已有數據，略過: {prior_path.name}")
+                continue
+            
+            prior_data.update({
+                'stock_code': stock_code,
+                'company_name': report_data.get('company_name', prior_data.get('company_name')),
+                'report_year': year,
+                'report_season': season,
+                'currency': report_data.get('currency', 'TWD'),
+                'unit': report_data.get('unit', '千元')
+            })
+            self._backfill_financial_fields(prior_data, values)
+            
+            prior_data.setdefault('metadata', {}).update({
+                'last_backfill': datetime.now().isoformat(),
+                'backfill_source': 'comparative_column',
+                'comparative_source_file': source_file
+            })
+            
+            with open(prior_path, 'w', encoding='utf-8') as f:
+                json.dump(prior_data, f, ensure_ascii=False, indent=2)
+            
+            self.logger.info(f"以比較期數據回填: {prior_path.name} ({len(values)} 個欄位)")
+            written.append(str(prior_path))
+        
+        return written
+    
+    def _load_report_if_empty(self, json_path: Path) -> Optional[Dict]:
+        """JSON不存在或沒有任何財務數值時回傳其內容 (不存在為空字典)，否則回傳 None"""
+        if not json_path.exists():
+            return {}
+        
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        
+        if not isinstance(data, dict):
+            return {}
+        
+        values = list(data.get('financials', {}).values()) + list(data.get('income_statement', {}).values())
+        if any(value is not None for value in values):
+            return None
+        
+        return data
+    
     def _get_updated_fields_summary(self, original_data: Dict, updated_data: Dict) -> Dict:
         """獲取更新欄位的摘要"""
         summary = {
@@ -642,8 +769,8 @@ class SmartFinancialProcessor(BaseProcessor):
         
         return summary
     
-    def batch_backfill(self, data_dir: Path) -> ProcessingResult:
-        """批次回填處理"""
+    def batch_backfill(self, data_dir: Path, workers: int = 1) -> ProcessingResult:
+        """批次回填處理 (workers 大於 1 時以多執行緒平行回填)"""
         try:
             processed_dir = data_dir / "processed"
             if not processed_dir.exists():
@@ -654,33 +781,43 @@ class SmartFinancialProcessor(BaseProcessor):
             if not enhanced_files:
                 return ProcessingResult(False, "找不到增強檔案")
             
-            results = []
-            success_count = 0
-            
-            for enhanced_file in enhanced_files:
+            def backfill_item(enhanced_file: Path) -> Dict[str, Any]:
                 # 找到對應的原始檔案
                 original_name = enhanced_file.name.replace('_enhanced.json', '.json')
                 original_file = data_dir / original_name
                 
-                if original_file.exists():
-                    result = self.backfill_to_original_json(enhanced_file, original_file)
-                    results.append({
-                        'enhanced_file': enhanced_file.name,
-                        'original_file': original_file.name,
-                        'success': result.success,
-                        'message': result.message
-                    })
-                    
-                    if result.success:
-                        success_count += 1
-                else:
-                    results.append({
+                if not original_file.exists():
+                    return {
                         'enhanced_file': enhanced_file.name,
                         'original_file': original_name,
                         'success': False,
                         'message': f"找不到原始檔案: {original_name}"
+                    }
+                
+                result = self.backfill_to_original_json(enhanced_file, original_file)
+                return {
+                    'enhanced_file': enhanced_file.name,
+                    'original_file': original_file.name,
+                    'success': result.success,
+                    'message': result.message
+                }
+            
+            # 回填以檔案讀寫為主，使用執行緒後端
+            executor = BatchExecutor.for_workers(workers, backend='thread')
+            results = []
+            for item_result in executor.map(backfill_item, enhanced_files):
+                if item_result.success:
+                    results.append(item_result.value)
+                else:
+                    results.append({
+                        'enhanced_file': item_result.item.name,
+                        'original_file': item_result.item.name.replace('_enhanced.json', '.json'),
+                        'success': False,
+                        'message': item_result.error
                     })
             
+            success_count = sum(1 for result in results if result['success'])
+            
             return ProcessingResult(
                 success=True,
                 message=f"批次回填完成: {success_count}/{len(enhanced_files)} 成功",
@@ -694,58 +831,24 @@ class SmartFinancialProcessor(BaseProcessor):
         except Exception as e:
             self.logger.error(f"批次回填失敗: {e}")
             return ProcessingResult(False, f"批次回填失敗: {e}")
-
+    
     def _analyze_pdf_type(self, pdf_path: Path) -> Dict[str, Any]:
-        """分析PDF類型（文字型、掃描型或混合型）"""
+        """分析PDF類型（文字型、掃描型或混合型）
+        
+        以頁面分類器讀取字型資源、文字運算子與影像覆蓋率，不做完整文字提取；
+        結果依PDF雜湊值快取，後續處理同一份PDF時不需重新分析。
+        """
         try:
-            import pdfplumber
-            
-            with pdfplumber.open(pdf_path) as pdf:
-                total_chars = 0
-                total_pages = len(pdf.pages)
-                
-                # 分析前幾頁的文字內容
-                sample_pages = min(5, total_pages)
-                
-                for i in range(sample_pages):
-                    page = pdf.pages[i]
-                    text = page.extract_text()
-                    if text:
-                        # 計算有意義的文字（排除空白和特殊字符）
-                        meaningful_text = ''.join(c for c in text if c.isalnum() or c in '，。、；：！？""''（）【】')
-                        total_chars += len(meaningful_text)
-                
-                # 更保守的文字密度計算
-                # 假設每頁平均應該有至少500個有意義字符
-                expected_chars_per_page = 500
-                text_ratio = total_chars / (sample_pages * expected_chars_per_page) if sample_pages > 0 else 0
-                text_ratio = min(text_ratio, 1.0)
-                
-                # 重新調整判斷標準 - 更傾向於識別為文字型
-                if total_chars > 100:  # 如果有足夠的文字內容
-                    if text_ratio > 0.3 or total_chars > 1000:  # 降低文字型的門檻
-                        pdf_type = 'text_based'
-                    elif text_ratio < 0.05 and total_chars < 50:
-                        pdf_type = 'scanned'
-                    else:
-                        pdf_type = 'mixed'
-                else:
-                    pdf_type = 'scanned'
-                
-                return {
-                    'type': pdf_type,
-                    'text_ratio': text_ratio,
-                    'total_pages': total_pages,
-                    'meaningful_chars': total_chars
-                }
-                
+            return self.pdf_processor.page_classifier.analyze(pdf_path)
+        
         except Exception as e:
             self.logger.warning(f"PDF分析失敗，使用預設值: {e}")
             return {
                 'type': 'text_based',  # 預設為文字型
                 'text_ratio': 0.8,
                 'total_pages': 1,
-                'meaningful_chars': 1000
+                'page_types': {},
+                'page_map': {}
             }
 
 # 創建別名以保持向後兼容性
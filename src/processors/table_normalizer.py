@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+表格數值正規化模組 - 以 pandas 向量化處理整份文件的表格
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from ..utils.helpers import parse_roc_period
+
+
+# 全形字元轉半形 (數字、逗號、括號、負號、小數點)
+FULLWIDTH_TABLE = str.maketrans(
+    '０１２３４５６７８９，（）－．＄　',
+    '0123456789,()-.$ '
+)
+
+# 換算為千元的倍數 (FinancialReport 預設單位為千元)
+UNIT_SCALE = {
+    '元': 0.001,
+    '千元': 1.0,
+    '仟元': 1.0,
+    '百萬元': 1000.0,
+}
+
+# 不做單位換算的欄位 (每股金額以元表示)
+PER_SHARE_FIELDS = {'eps'}
+
+UNIT_PATTERN = r'(百萬元|千元|仟元|元)'
+# 數值儲存格: 可選的括號或負號、貨幣符號、含千分位的數字與單位
+CELL_PATTERN = (
+    r'^(?P<open>\()?\s*(?:NT)?\$?\s*(?P<sign>-)?\s*'
+    r'(?P<digits>\d[\d, ]*(?:\.\d+)?)'
+    r'\s*(?(open)\))\s*(?P<unit>百萬元|千元|仟元|元)?$'
+)
+DASH_PATTERN = r'[-–—－]+'
+# 含有數字、千分位、貨幣與括號以外字元的儲存格視為文字
+LABEL_CHAR_PATTERN = r'[^\d\s,.$()%\-–—－０-９，（）．＄％]'
+# 會計科目代碼 (例: 1100、11xx、194D)，不視為科目名稱
+ACCOUNT_CODE_PATTERN = r'\s*\d[\dxX]{2,4}[A-Z]?\s*'
+CJK_SPACE_PATTERN = r'(?<=[\u4e00-\u9fff])\s+(?=[\u4e00-\u9fff])'
+PERCENT_HEADER_PATTERN = r'\s*[%％]\s*'
+
+
+class TableNormalizer:
+    """表格數值正規化器"""
+    
+    def __init__(self, patterns: Dict[str, List[str]], default_unit: str = '千元'):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.default_scale = UNIT_SCALE.get(default_unit, 1.0)
+        self.field_labels = self._build_field_dictionary(patterns)
+    
+    def _build_field_dictionary(self, patterns: Dict[str, List[str]]) -> Dict[str, str]:
+        """由財務數據匹配模式建立 欄位 -> 科目名稱正則 的字典"""
+        field_labels = {}
+        
+        for field_name, field_patterns in patterns.items():
+            # 只取冒號前的科目名稱部分，與文字匹配共用同一份模式
+            labels = [p.split('[：:]')[0] for p in field_patterns]
+            field_labels[field_name] = '|'.join(f'(?:{label})' for label in labels)
+        
+        return field_labels
+    
+    def to_cells(self, tables: List[Dict]) -> pd.Series:
+        """將所有表格展開為單一長表 Series (索引為 table, row, col)"""
+        frames = []
+        keys = []
+        
+        for table_num, table in enumerate(tables):
+            headers = table.get('headers', [])
+            rows = table.get('rows', [])
+            
+            if not headers or not rows:
+                continue
+            
+            frames.append(pd.DataFrame(rows))
+            keys.append(table_num)
+        
+        if not frames:
+            return pd.Series(dtype=object)
+        
+        frame = pd.concat(frames, keys=keys, names=['table', 'row'])
+        cells = frame.stack().dropna().astype(str)
+        cells.index = cells.index.set_names(['table', 'row', 'col'])
+        return cells
+    
+    def normalize_numeric(self, cells: pd.Series) -> pd.DataFrame:
+        """一次向量化解析全部儲存格: 千分位、全形數字、括號負數、破折號為零與單位
+        
+        回傳欄位: text (清理後文字)、value (數值，無法解析為 NaN)、
+        scale (儲存格自帶單位的換算倍數，無單位為 NaN)
+        """
+        text = cells.str.translate(FULLWIDTH_TABLE).str.strip()
+        parts = text.str.extract(CELL_PATTERN)
+        
+        # pdfplumber 常在數字中插入空白 (例: "$ 1 43,345,272")
+        digits = parts['digits'].str.replace(r'[ ,]', '', regex=True)
+        value = pd.to_numeric(digits, errors='coerce')
+        negative = parts['open'].notna() | parts['sign'].notna()
+        value = value.mask(negative, -value)
+        
+        is_dash = text.str.fullmatch(DASH_PATTERN).fillna(False).astype(bool)
+        value = value.mask(is_dash, 0.0)
+        
+        return pd.DataFrame({
+            'text': text,
+            'value': value.astype('float64'),
+            'scale': parts['unit'].map(UNIT_SCALE).astype('float64')
+        })
+    
+    def _table_scales(self, tables: List[Dict]) -> Dict[int, float]:
+        """由表頭偵測表格層級的金額單位"""
+        scales = {}
+        
+        for table_num, table in enumerate(tables):
+            header_text = ' '.join(str(cell) for cell in table.get('headers', []) if cell)
+            match = re.search(r'單位[^\w]*(?:新台幣|新臺幣)?\s*' + UNIT_PATTERN, header_text)
+            scales[table_num] = UNIT_SCALE[match.group(1)] if match else self.default_scale
+        
+        return scales
+    
+    def extract_labels(self, cells: pd.Series) -> pd.DataFrame:
+        """找出每一列的科目名稱 (第一個含文字的儲存格，會略過代碼欄) 及其欄位位置"""
+        is_text = (
+            cells.str.contains(LABEL_CHAR_PATTERN, regex=True)
+            & ~cells.str.fullmatch(ACCOUNT_CODE_PATTERN)
+        )
+        text_cells = cells[is_text].reset_index(level='col')
+        
+        labels = text_cells.groupby(level=['table', 'row'], sort=False).head(1)
+        labels.columns = ['label_pos', 'label']
+        labels['label'] = labels['label'].str.strip().str.replace(CJK_SPACE_PATTERN, '', regex=True)
+        return labels
+    
+    def extract_values(self, normalized: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
+        """每列取科目名稱右側第一個數值儲存格"""
+        numbers = normalized.dropna(subset=['value']).reset_index(level='col')
+        numbers = numbers.join(labels['label_pos'], how='inner')
+        numbers = numbers[numbers['col'] > numbers['label_pos']]
+        return numbers.groupby(level=['table', 'row'], sort=False)[['value', 'scale']].head(1)
+    
+    def match_fields(self, labels: pd.Series) -> pd.DataFrame:
+        """將科目名稱與欄位字典做連接，回傳 (table, row, field) 長表"""
+        matches = pd.DataFrame(
+            {
+                field_name: labels.str.contains(label_regex, case=False, regex=True)
+                for field_name, label_regex in self.field_labels.items()
+            },
+            index=labels.index
+        ).fillna(False).astype(bool)
+        
+        stacked = matches.stack()
+        stacked = stacked[stacked]
+        stacked.index = stacked.index.set_names('field', level=-1)
+        return stacked.reset_index()[['table', 'row', 'field']]
+    
+    def column_periods(self, tables: List[Dict]) -> pd.DataFrame:
+        """由表頭解析每個數值欄所屬的期間 (索引為 table, col)，略過百分比欄
+        
+        合併儲存格的表頭只出現在第一欄，其後為 None 的欄位沿用同一期間。
+        """
+        records = []
+        
+        for table_num, table in enumerate(tables):
+            headers = table.get('headers', [])
+            rows = table.get('rows', [])
+            
+            if not headers or not rows:
+                continue
+            
+            sub_headers = rows[0]
+            period = None
+            for col, header in enumerate(headers):
+                if header:
+                    period = parse_roc_period(header)
+                if period is None:
+                    continue
+                
+                sub_header = sub_headers[col] if col < len(sub_headers) else None
+                if sub_header and re.fullmatch(PERCENT_HEADER_PATTERN, str(sub_header)):
+                    continue
+                
+                records.append((table_num, col, f"{period[0]}{period[1]}"))
+        
+        return pd.DataFrame(records, columns=['table', 'col', 'period']).set_index(['table', 'col'])
+    
+    def extract(self, tables: List[Dict]) -> Dict[str, Any]:
+        """從表格中提取財務數據"""
+        prepared = self._prepare(tables)
+        if prepared is None:
+            return {}
+        
+        labels, matched, normalized = prepared
+        values = self.extract_values(normalized, labels)
+        
+        joined = matched.join(values, on=['table', 'row'], how='inner')
+        if joined.empty:
+            return {}
+        
+        joined['value'] = self._scaled_values(joined, tables)
+        
+        # 與逐列比對相同，文件中較後出現的值覆蓋較前者
+        joined = joined.sort_values(['table', 'row'], kind='stable')
+        latest = joined.groupby('field', sort=False)['value'].last()
+        
+        return {field_name: self._to_python_number(value) for field_name, value in latest.items()}
+    
+    def extract_periods(self, tables: List[Dict]) -> Dict[str, Dict[str, Any]]:
+        """依期間表頭提取每個期間欄的財務數據，回傳 {期間 (例: 2023Q4): {欄位: 數值}}"""
+        periods = self.column_periods(tables)
+        if periods.empty:
+            return {}
+        
+        prepared = self._prepare(tables)
+        if prepared is None:
+            return {}
+        
+        _, matched, normalized = prepared
+        numbers = normalized.dropna(subset=['value']).reset_index(level='col')
+        numbers = numbers.join(periods, on=['table', 'col'], how='inner').reset_index()
+        
+        joined = matched.merge(numbers[['table', 'row', 'period', 'value', 'scale']], on=['table', 'row'])
+        if joined.empty:
+            return {}
+        
+        joined['value'] = self._scaled_values(joined, tables)
+        joined = joined.sort_values(['table', 'row'], kind='stable')
+        latest = joined.groupby(['period', 'field'], sort=False)['value'].last()
+        
+        period_data = {}
+        for (period, field_name), value in latest.items():
+            period_data.setdefault(period, {})[field_name] = self._to_python_number(value)
+        
+        return period_data
+    
+    def _prepare(self, tables: List[Dict]) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]]:
+        """展開表格並匹配科目名稱，回傳 (科目名稱, 命中欄位, 命中列的數值)"""
+        cells = self.to_cells(tables)
+        if cells.empty:
+            return None
+        
+        # 先以科目名稱連接欄位字典，只解析命中列的儲存格
+        labels = self.extract_labels(cells)
+        matched = self.match_fields(labels['label'])
+        if matched.empty:
+            return None
+        
+        matched_rows = pd.MultiIndex.from_frame(matched[['table', 'row']].drop_duplicates())
+        row_cells = cells[cells.index.droplevel('col').isin(matched_rows)]
+        
+        return labels, matched, self.normalize_numeric(row_cells)
+    
+    def _scaled_values(self, joined: pd.DataFrame, tables: List[Dict]) -> pd.Series:
+        """單位換算: 儲存格單位優先，其次為表格單位 (每股欄位除外)"""
+        table_scale = joined['table'].map(self._table_scales(tables))
+        scale = joined['scale'].fillna(table_scale)
+        per_share = joined['field'].isin(PER_SHARE_FIELDS)
+        return joined['value'].where(per_share, joined['value'] * scale)
+    
+    @staticmethod
+    def _to_python_number(value: float) -> Any:
+        """轉換為原生 Python 數值，整數值回傳 int"""
+        value = float(value)
+        if value.is_integer():
+            return int(value)
+        return value
@@ -13,6 +13,7 @@ from enum import Enum
 from dataclasses import dataclass, asdict
 
 from ..core import ProcessingResult
+from ..utils.helpers import get_company_name, parse_report_filename
 
 
 class ProcessingStatus(Enum):
@@ -24,6 +25,7 @@ class ProcessingStatus(Enum):
     PROCESSED = "processed"       # 已處理
     ENHANCED = "enhanced"         # 已增強
     FAILED = "failed"            # 失敗
+    TIMEOUT = "timeout"          # 超過處理時間或記憶體上限而被終止
     SKIPPED = "skipped"          # 跳過
 
 
@@ -92,9 +94,14 @@ class ProcessingTracker:
                 CREATE INDEX IF NOT EXISTS idx_stock_year ON processing_tasks(stock_code, year, season)
             """)
     
+    @staticmethod
+    def task_id(stock_code: str, year: int, season: str) -> str:
+        """任務ID (格式: stockcode_YYYYQX)"""
+        return f"{stock_code}_{year}Q{str(season).replace('Q', '')}"
+    
     def create_task(self, stock_code: str, company_name: str, year: int, season: str) -> ProcessingTask:
         """創建新任務"""
-        task_id = f"{stock_code}_{year}Q{season.replace('Q', '')}"
+        task_id = self.task_id(stock_code, year, season)
         now = datetime.now()
         
         task = ProcessingTask(
@@ -164,6 +171,71 @@ class ProcessingTracker:
             task.updated_at = datetime.now()
             self._save_task(task)
     
+    def get_or_create_task(self, stock_code: str, company_name: str, year: int, season: str) -> ProcessingTask:
+        """取得任務，不存在時建立"""
+        return self.get_task(self.task_id(stock_code, year, season)) or self.create_task(
+            stock_code, company_name, year, season
+        )
+    
+    def get_or_create_for_file(self, file_path: Path) -> Optional[ProcessingTask]:
+        """依財報檔名取得或建立任務，檔名無法解析時回傳 None"""
+        info = parse_report_filename(Path(file_path).name)
+        if info is None:
+            return None
+        
+        return self.get_or_create_task(
+            info['stock_code'], get_company_name(info['stock_code']), info['year'], info['season']
+        )
+    
+    def complete_stage(self, task_id: str, status: ProcessingStatus,
+                       processing_time: Optional[float] = None, **paths) -> Optional[ProcessingTask]:
+        """記錄任務完成一個批次階段 (已完成的階段保存在 metadata，之後失敗也不會遺失)"""
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+        
+        task.status = status
+        task.error_message = None
+        if processing_time:
+            task.processing_time = processing_time
+        for name in ('pdf_path', 'json_path', 'processed_path', 'enhanced_path'):
+            if paths.get(name) is not None:
+                setattr(task, name, str(paths[name]))
+        
+        completed = task.metadata.setdefault('completed_stages', [])
+        if status.value not in completed:
+            completed.append(status.value)
+        
+        self.update_task(task)
+        return task
+    
+    def is_stage_completed(self, task: Optional[ProcessingTask], status: ProcessingStatus) -> bool:
+        """任務是否已完成指定的批次階段"""
+        if task is None:
+            return False
+        return status.value in task.metadata.get('completed_stages', [])
+    
+    def record_watchdog_kill(self, pdf_path: Path, reason: str, elapsed: float,
+                             error_message: str) -> Optional[ProcessingTask]:
+        """記錄被監控程式終止的文件 (reason: timeout / memory)，檔名無法解析時回傳 None"""
+        task = self.get_or_create_for_file(pdf_path)
+        if task is None:
+            return None
+        
+        task.status = ProcessingStatus.TIMEOUT
+        task.pdf_path = str(pdf_path)
+        task.error_message = error_message
+        task.processing_time = elapsed
+        task.retry_count += 1
+        task.metadata['watchdog'] = {
+            'reason': reason,
+            'elapsed': round(elapsed, 1),
+            'killed_at': datetime.now().isoformat()
+        }
+        
+        self.update_task(task)
+        return task
+    
     def get_tasks_by_status(self, status: ProcessingStatus) -> List[ProcessingTask]:
         """按狀態取得任務列表"""
         with sqlite3.connect(self.db_path) as conn:
@@ -349,6 +421,10 @@ class ProgressReporter:
         if avg_time and avg_time > 300:  # 超過5分鐘
             recommendations.append("處理時間較長，建議啟用並行處理或GPU加速")
         
+        # 被監控程式終止的文件
+        if stats["status_distribution"].get(ProcessingStatus.TIMEOUT.value, 0) > 0:
+            recommendations.append("有文件超過處理時間或記憶體上限而被終止，建議檢查PDF或調整 document_timeout")
+        
         # 基於錯誤類型的建議
         common_errors = stats["common_errors"]
         for error, count in common_errors.items():
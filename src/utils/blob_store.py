@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+內容定址PDF儲存 - 每份PDF依 SHA-256 只存一份，使用者路徑以硬連結 (或符號連結) 指向它
+"""
+
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from .helpers import file_sha256
+
+
+def clear_readonly(path: Path) -> None:
+    """清除檔案的唯讀屬性 (舊版儲存檔為唯讀，Windows 無法取代或刪除唯讀檔案)，符號連結與不存在的路徑不處理"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if stat.S_ISREG(mode) and not mode & stat.S_IWUSR:
+        os.chmod(path, mode | stat.S_IWUSR)
+
+
+class BlobStore:
+    """內容定址儲存
+    
+    檔案存放於 root/ab/cd/<sha256>.pdf；各資料夾中的 YYYYQQ_代碼_AI1.pdf 為指向它的連結。
+    硬連結與儲存檔共用同一個 inode，比對兩個路徑是否為同一檔案即可確認內容，不需重新計算雜湊。
+    跨檔案系統無法建立硬連結時改用符號連結，兩者都失敗時才複製。
+    寫入新版本時須以新檔案取代路徑 (例如暫存檔 + os.replace)，不可就地覆寫連結。
+    儲存檔不設為唯讀：硬連結共用 inode 與權限，唯讀會讓使用者路徑在 Windows 上無法被取代或刪除。
+    
+    Args:
+        root: 儲存目錄
+        link_mode: hardlink / symlink
+    """
+    
+    SUFFIX = '.pdf'
+    
+    def __init__(self, root: Path, link_mode: str = 'hardlink'):
+        if link_mode not in ('hardlink', 'symlink'):
+            raise ValueError(f"不支援的連結方式: {link_mode}")
+        self.root = Path(root)
+        self.link_mode = link_mode
+        self._lock = threading.Lock()
+    
+    def blob_path(self, sha256: str) -> Path:
+        """雜湊值對應的儲存路徑"""
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{self.SUFFIX}"
+    
+    def contains(self, sha256: str) -> bool:
+        return self.blob_path(sha256).exists()
+    
+    def is_linked(self, path: Path, sha256: str) -> bool:
+        """路徑是否已連結到雜湊值對應的儲存檔 (不讀取檔案內容)"""
+        blob = self.blob_path(sha256)
+        try:
+            if path.is_symlink():
+                return path.resolve() == blob.resolve()
+            return os.path.samefile(path, blob)
+        except OSError:
+            return False
+    
+    def put(self, path: Path, sha256: Optional[str] = None) -> str:
+        """將檔案放入儲存並把原路徑換成連結，回傳雜湊值
+        
+        儲存中已有相同內容時原路徑改為連結到既有檔案 (重複的內容只佔一份空間)。
+        """
+        path = Path(path)
+        sha256 = sha256 or file_sha256(path)
+        if self.is_linked(path, sha256):
+            return sha256
+        
+        blob = self.blob_path(sha256)
+        with self._lock:
+            if not blob.exists():
+                self._adopt(path, blob)
+        if not self.is_linked(path, sha256) or (self.link_mode == 'symlink' and not path.is_symlink()):
+            self.link(sha256, path)
+        return sha256
+    
+    def _adopt(self, path: Path, blob: Path) -> None:
+        """以原檔案建立儲存檔 (同一檔案系統時直接共用 inode)"""
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        temp = blob.with_name(f".{blob.name}.{os.getpid()}.tmp")
+        temp.unlink(missing_ok=True)
+        try:
+            os.link(path, temp)
+        except OSError:
+            shutil.copyfile(path, temp)
+        os.replace(temp, blob)
+    
+    def link(self, sha256: str, target: Path) -> Path:
+        """以指向儲存檔的連結原子性地取代目標路徑"""
+        blob = self.blob_path(sha256)
+        if not blob.exists():
+            raise FileNotFoundError(f"儲存中沒有 {sha256}")
+        
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.link")
+        temp.unlink(missing_ok=True)
+        try:
+            if self.link_mode == 'hardlink':
+                try:
+                    os.link(blob, temp)
+                except OSError:
+                    # 跨檔案系統：改用符號連結
+                    os.symlink(blob.resolve(), temp)
+            else:
+                os.symlink(blob.resolve(), temp)
+        except OSError:
+            # 不支援連結 (例如沒有符號連結權限)：複製
+            shutil.copyfile(blob, temp)
+        clear_readonly(target)
+        os.replace(temp, target)
+        return target
+    
+    def iter_blobs(self) -> Iterator[Path]:
+        if self.root.exists():
+            yield from self.root.glob(f"*/*/*{self.SUFFIX}")
+    
+    def dedupe(self, directories: Iterable[Path]) -> Dict[str, int]:
+        """將目錄中的PDF放入儲存並改為連結，回傳統計 (檔案數、新連結數、節省的位元組數)"""
+        stats = {'files': 0, 'linked': 0, 'bytes_saved': 0}
+        root = self.root.resolve()
+        for directory in directories:
+            for path in sorted(Path(directory).rglob(f"*{self.SUFFIX}")):
+                if path.is_symlink() or root in path.resolve().parents:
+                    continue
+                stats['files'] += 1
+                sha256 = file_sha256(path)
+                if self.is_linked(path, sha256):
+                    continue
+                existed = self.contains(sha256)
+                size = path.stat().st_size
+                self.put(path, sha256)
+                stats['linked'] += 1
+                if existed:
+                    stats['bytes_saved'] += size
+        return stats
+    
+    def gc(self, referenced: Optional[Set[str]] = None) -> int:
+        """刪除沒有任何硬連結且不在 referenced (例如主索引中的雜湊值) 內的儲存檔，回傳刪除數
+        
+        符號連結無法由儲存檔反查，使用符號連結時務必傳入 referenced。
+        """
+        removed = 0
+        for blob in list(self.iter_blobs()):
+            sha256 = blob.name[:-len(self.SUFFIX)]
+            if blob.stat().st_nlink > 1 or (referenced and sha256 in referenced):
+                continue
+            clear_readonly(blob)
+            blob.unlink()
+            removed += 1
+        return removed
+    
+    def stats(self) -> Dict[str, int]:
+        """儲存檔數量與實際佔用的位元組數"""
+        blobs = list(self.iter_blobs())
+        return {'blobs': len(blobs), 'bytes': sum(blob.stat().st_size for blob in blobs)}
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+斷路器與重試預算 - 主機故障時快速失敗，重試以隨機退避錯開並受批次總預算限制
+"""
+
+import time
+import random
+import threading
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+
+class BreakerState(Enum):
+    """斷路器狀態"""
+    CLOSED = "closed"  # 正常放行
+    OPEN = "open"  # 快速失敗，等待恢復時間
+    HALF_OPEN = "half_open"  # 放行少量試探請求
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟，請求未送出"""
+
+
+class CircuitBreaker:
+    """單一主機的斷路器
+    
+    連續失敗 failure_threshold 次後開啟，期間所有請求立即失敗；經過 recovery_timeout 秒後
+    進入半開狀態，最多放行 half_open_max 個試探請求：成功即關閉，失敗則重新開啟。
+    
+    Args:
+        failure_threshold: 開啟前的連續失敗次數
+        recovery_timeout: 開啟後到半開的秒數
+        half_open_max: 半開時同時放行的試探請求數
+        clock: 時間來源 (測試時可替換)
+    """
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max = max(1, half_open_max)
+        self.clock = clock
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._open_count = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self) -> BreakerState:
+        if self._state == BreakerState.OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._state = BreakerState.HALF_OPEN
+            self._trials = 0
+        return self._state
+    
+    def allow(self) -> bool:
+        """是否放行請求 (半開時會佔用一個試探名額)"""
+        with self._lock:
+            state = self._current_state()
+            if state == BreakerState.CLOSED:
+                return True
+            if state == BreakerState.HALF_OPEN and self._trials < self.half_open_max:
+                self._trials += 1
+                return True
+            self._rejected += 1
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = BreakerState.CLOSED
+            self._failures = 0
+            self._trials = 0
+    
+    def release(self) -> None:
+        """歸還未完成的試探名額 (請求被取消，不計成功或失敗)"""
+        with self._lock:
+            if self._state == BreakerState.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == BreakerState.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != BreakerState.OPEN:
+                    self._open_count += 1
+                self._state = BreakerState.OPEN
+                self._opened_at = self.clock()
+                self._trials = 0
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """目前狀態與統計"""
+        with self._lock:
+            return {
+                'state': self._current_state().value,
+                'consecutive_failures': self._failures,
+                'times_opened': self._open_count,
+                'rejected': self._rejected
+            }
+
+
+class HostCircuitBreakers:
+    """依主機分開的斷路器"""
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max = half_open_max
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def breaker(self, url: str) -> CircuitBreaker:
+        """取得 URL 所屬主機的斷路器"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.recovery_timeout, self.half_open_max, self.clock
+                )
+            return self._breakers[host]
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各主機斷路器的狀態"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.snapshot() for host, breaker in breakers.items()}
+
+
+class RetryBudget:
+    """批次的重試總預算
+    
+    每次重試前取用一個額度，額度用完後其餘失敗不再重試，避免故障期間整個批次反覆重試數小時。
+    額度為 max(minimum, 批次項目數 × ratio)。
+    """
+    
+    def __init__(self, total: int):
+        self.total = max(0, total)
+        self.spent = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_batch(cls, items: int, ratio: float = 0.2, minimum: int = 10) -> 'RetryBudget':
+        return cls(max(minimum, int(items * ratio)))
+    
+    def try_spend(self) -> bool:
+        """取用一次重試額度，額度用完時回傳 False"""
+        with self._lock:
+            if self.spent < self.total:
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {'total': self.total, 'spent': self.spent, 'denied': self.denied}
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0,
+                  rand: Optional[random.Random] = None) -> float:
+    """完全隨機的指數退避 (0 到 min(cap, base × 2^attempt) 之間)，同時失敗的請求不會同步重試"""
+    return (rand or random).uniform(0, min(cap, base * 2 ** attempt))
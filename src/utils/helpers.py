@@ -4,10 +4,14 @@
 工具模組
 """
 
+import re
+import sys
 import json
+import hashlib
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 
 
@@ -58,6 +62,54 @@ def save_json(data: Dict[str, Any], file_path: Path) -> None:
         raise Exception(f"儲存JSON失敗 {file_path}: {e}")
 
 
+class NDJSONWriter:
+    """逐筆寫出 NDJSON (每行一個 JSON 物件)，每筆寫入後立即 flush
+    
+    target 為檔案路徑或 '-' (標準輸出)。批次結果逐筆寫出不需保留在記憶體中，
+    下游工具可在批次執行期間讀取已完成的結果。可在多個執行緒中共用。
+    """
+    
+    def __init__(self, target: Union[str, Path]):
+        self.name = str(target)
+        if self.name == '-':
+            self._file = sys.stdout
+            self._owns_file = False
+        else:
+            path = Path(target)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, 'w', encoding='utf-8')
+            self._owns_file = True
+        self._lock = threading.Lock()
+        self.count = 0
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        """寫出一筆記錄 (無法序列化的值以字串表示)"""
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.count += 1
+    
+    def close(self) -> None:
+        if self._owns_file:
+            self._file.close()
+    
+    def __enter__(self) -> 'NDJSONWriter':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def file_sha256(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """計算檔案的 SHA-256 雜湊值"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def validate_stock_code(stock_code: str) -> bool:
     """驗證股票代碼格式"""
     if not stock_code:
@@ -87,8 +139,6 @@ def normalize_season(season: str) -> str:
 
 def parse_filename(filename: str) -> Optional[Dict[str, Any]]:
     """解析檔案名稱"""
-    import re
-    
     # 支援格式: YYYYMM_STOCKCODE_AI1.pdf 或 YYMM_STOCKCODE_AI1.pdf
     patterns = [
         r'(\d{4})(\d{2})_(\d{4})_AI1\.pdf',  # YYYYMM_STOCKCODE_AI1.pdf
@@ -120,6 +170,91 @@ def parse_filename(filename: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+CHINESE_DIGITS = {'〇': 0, '○': 0, '零': 0, '一': 1, '二': 2, '三': 3, '四': 4,
+                  '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+
+def chinese_numeral_to_int(text: str) -> Optional[int]:
+    """將中文數字轉為整數，支援逐位寫法 (一一三) 與十位寫法 (三十一)"""
+    text = text.strip()
+    if not text:
+        return None
+    
+    if text.isdigit():
+        return int(text)
+    
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        tens_value = CHINESE_DIGITS.get(tens, None) if tens else 1
+        ones_value = CHINESE_DIGITS.get(ones, None) if ones else 0
+        if tens_value is None or ones_value is None:
+            return None
+        return tens_value * 10 + ones_value
+    
+    value = 0
+    for char in text:
+        if char not in CHINESE_DIGITS:
+            return None
+        value = value * 10 + CHINESE_DIGITS[char]
+    return value
+
+
+def parse_roc_period(text: str) -> Optional[Tuple[int, str]]:
+    """解析民國年期間表頭，回傳 (西元年, 季度)
+    
+    支援 "一一三年三月三十一日"、"一一三年第一季"、"民國113年3月31日"、
+    "一一三年四月一日至六月三十日" 等格式；跨越多季的累計期間回傳 None。
+    """
+    if not text:
+        return None
+    
+    text = re.sub(r'\s+', '', str(text))
+    numeral = r'[\d〇○零一二三四五六七八九十]+'
+    
+    year_match = re.search(rf'({numeral})年', text)
+    if not year_match:
+        return None
+    roc_year = chinese_numeral_to_int(year_match.group(1))
+    if not roc_year:
+        return None
+    year = roc_year + 1911
+    
+    season_match = re.search(rf'第({numeral})季', text)
+    if season_match:
+        season_num = chinese_numeral_to_int(season_match.group(1))
+        return (year, f"Q{season_num}") if season_num in (1, 2, 3, 4) else None
+    
+    months = [chinese_numeral_to_int(m) for m in re.findall(rf'({numeral})月', text)]
+    if not months or months[-1] not in (3, 6, 9, 12):
+        return None
+    
+    # 區間表頭 (例: 一月一日至六月三十日) 必須恰為一季
+    if len(months) > 1 and months[0] != months[-1] - 2:
+        return None
+    
+    return year, f"Q{months[-1] // 3}"
+
+
+def report_filename(year: int, season: str, stock_code: str, extension: str = 'json') -> str:
+    """產生財報檔名: YYYY + 季度編號(01-04) + _股票代碼_AI1"""
+    season_num = normalize_season(season).replace('Q', '').zfill(2)
+    return f"{year}{season_num}_{stock_code}_AI1.{extension}"
+
+
+def parse_report_filename(filename: str) -> Optional[Dict[str, Any]]:
+    """解析 report_filename 產生的檔名，回傳年度、季度與股票代碼"""
+    match = re.match(r'^(\d{4})(0[1-4])_(\d{4,6})_AI1(?:_enhanced)?\.\w+$', filename)
+    if not match:
+        return None
+    
+    year, season_num, stock_code = match.groups()
+    return {
+        'year': int(year),
+        'season': f"Q{int(season_num)}",
+        'stock_code': stock_code
+    }
+
+
 def get_company_name(stock_code: str) -> str:
     """根據股票代碼獲取公司名稱"""
     # 簡單的公司名稱對應
@@ -182,26 +317,29 @@ def create_progress_reporter(total_items: int, description: str = "Processing"):
 
 
 def batch_process(items: List[Any], processor_func, batch_size: int = 10, 
-                 progress_desc: str = "Processing") -> List[Any]:
-    """批次處理"""
-    results = []
-    total_batches = (len(items) + batch_size - 1) // batch_size
+                 progress_desc: str = "Processing", workers: int = 1,
+                 backend: str = "thread") -> List[Any]:
+    """批次處理
+    
+    workers 大於 1 時以指定後端 (thread/process) 平行執行，結果依輸入順序回傳；
+    batch_size 為同時送出的項目上限。失敗項目回傳 {"error": ..., "item": ...}。
+    """
+    from ..batch import BatchExecutor
     
     progress = create_progress_reporter(len(items), progress_desc)
+    executor = BatchExecutor.for_workers(
+        workers,
+        backend=backend,
+        progress=lambda done, total, result: progress.update(),
+        max_pending=batch_size
+    )
     
-    for i in range(0, len(items), batch_size):
-        batch = items[i:i + batch_size]
-        
-        for item in batch:
-            try:
-                result = processor_func(item)
-                results.append(result)
-            except Exception as e:
-                logger = setup_logging("batch_processor")
-                logger.error(f"批次處理項目失敗: {e}")
-                results.append({"error": str(e), "item": item})
-            
-            progress.update()
+    results = []
+    for item_result in executor.map(processor_func, items):
+        if item_result.success:
+            results.append(item_result.value)
+        else:
+            results.append({"error": item_result.error, "item": item_result.item})
     
     progress.finish()
     return results
@@ -4,10 +4,26 @@
 主索引管理模組
 """
 
+import os
 import json
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
+
+from .helpers import normalize_season
+
+try:
+    import fcntl
+except ImportError:  # Windows 只有行程內的鎖
+    fcntl = None
+
+
+# 主索引為單一檔案，讀取-修改-寫入需在同一行程內序列化 (例如管線中的下載與回填執行緒)
+_index_lock = threading.RLock()
+# 目前執行緒已持有檔案鎖的層數 (只在 _index_lock 內存取)
+_file_lock_depth = 0
 
 
 class MasterIndexManager:
@@ -19,6 +35,26 @@ class MasterIndexManager:
         else:
             self.index_file = index_file
     
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """序列化讀取-修改-寫入：行程內以 RLock，跨行程 (多個節點共用主索引) 以檔案鎖"""
+        global _file_lock_depth
+        with _index_lock:
+            handle = None
+            if fcntl is not None and _file_lock_depth == 0:
+                self.index_file.parent.mkdir(parents=True, exist_ok=True)
+                handle = open(self.index_file.with_suffix('.lock'), 'a')
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            
+            _file_lock_depth += 1
+            try:
+                yield
+            finally:
+                _file_lock_depth -= 1
+                if handle is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                    handle.close()
+    
     def load_index(self) -> Dict[str, Any]:
         """載入主索引檔案"""
         if not self.index_file.exists():
@@ -40,30 +76,53 @@ class MasterIndexManager:
         index_data["last_updated"] = datetime.now().isoformat()
         index_data["total_reports"] = len(index_data.get("reports", []))
         
+        # 先寫入暫存檔再取代，其他行程不會讀到寫到一半的索引
+        temp_file = self.index_file.with_name(f"{self.index_file.name}.{os.getpid()}.tmp")
         try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
+            with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(index_data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.index_file)
             return True
         except Exception as e:
             print(f"警告: 主索引儲存失敗: {e}")
             return False
     
+    @staticmethod
+    def report_id(stock_code: str, year: int, season: str) -> str:
+        """財報記錄的識別碼 (季度接受 1 / Q1 等格式)"""
+        return f"{stock_code}_{year}{normalize_season(str(season))}"
+    
+    @staticmethod
+    def _same_id(record_id: str, report_id: str) -> bool:
+        # 舊版記錄的季度重複了 Q (例如 2330_2024QQ1)，比對時視為相同識別碼
+        return record_id.replace('QQ', 'Q') == report_id.replace('QQ', 'Q')
+    
     def add_report(self, stock_code: str, company_name: str, year: int, season: str, 
-                   pdf_path: Path, json_path: Path, file_size: int, success: bool = True) -> bool:
-        """將新的財報記錄添加到主索引"""
+                   pdf_path: Path, json_path: Path, file_size: int, success: bool = True,
+                   sha256: Optional[str] = None) -> bool:
+        """將新的財報記錄添加到主索引 (sha256 為PDF的雜湊值，供重複下載檢查)"""
+        with self._locked():
+            return self._add_report(stock_code, company_name, year, season, pdf_path, json_path,
+                                    file_size, success, sha256)
+    
+    def _add_report(self, stock_code: str, company_name: str, year: int, season: str,
+                    pdf_path: Path, json_path: Path, file_size: int, success: bool,
+                    sha256: Optional[str] = None) -> bool:
         index_data = self.load_index()
+        season = normalize_season(str(season))
         
         # 建立新記錄
         report_record = {
-            "id": f"{stock_code}_{year}Q{season}",
+            "id": self.report_id(stock_code, year, season),
             "stock_code": stock_code,
             "company_name": company_name,
             "year": year,
-            "season": f"Q{season}",
-            "period": f"{year}Q{season}",
+            "season": season,
+            "period": f"{year}{season}",
             "pdf_file": str(pdf_path).replace('\\', '/'),
             "json_file": str(json_path).replace('\\', '/'),
             "file_size": file_size,
+            "sha256": sha256,
             "download_success": success,
             "crawled_at": datetime.now().isoformat(),
             "file_exists": pdf_path.exists() if pdf_path else False
@@ -72,7 +131,7 @@ class MasterIndexManager:
         # 檢查是否已存在相同記錄
         existing_index = -1
         for i, report in enumerate(index_data["reports"]):
-            if report["id"] == report_record["id"]:
+            if self._same_id(report["id"], report_record["id"]):
                 existing_index = i
                 break
         
@@ -90,6 +149,26 @@ class MasterIndexManager:
         
         return self.save_index(index_data)
     
+    def update_report(self, report_id: str, **fields) -> bool:
+        """更新既有財報記錄的欄位，記錄不存在時回傳 False"""
+        with self._locked():
+            index_data = self.load_index()
+            
+            for report in index_data["reports"]:
+                if self._same_id(report["id"], report_id):
+                    report.update(fields)
+                    return self.save_index(index_data)
+        
+        return False
+    
+    def find_report(self, stock_code: str, year: int, season: str) -> Optional[Dict[str, Any]]:
+        """取得財報記錄，不存在時回傳 None"""
+        report_id = self.report_id(stock_code, year, season)
+        for report in self.load_index()["reports"]:
+            if self._same_id(report["id"], report_id):
+                return report
+        return None
+    
     def search_reports(self, stock_code: Optional[str] = None, 
                       company_name: Optional[str] = None,
                       year: Optional[int] = None,
@@ -107,7 +186,7 @@ class MasterIndexManager:
                 match = False
             if year and report["year"] != year:
                 match = False
-            if season and report["season"] != f"Q{season}":
+            if season and normalize_season(report["season"]) != normalize_season(str(season)):
                 match = False
             
             if match:
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+請求速率限制 - 每個主機一個權杖桶 (每秒請求數 + 突發量)，可在多個執行緒間共用
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """權杖桶
+    
+    每秒補充 rate 個權杖，最多累積 burst 個。每個請求取用一個權杖，權杖不足時等待到補足為止，
+    因此長時間平均速率不超過 rate，短時間內最多連續送出 burst 個請求。
+    
+    Args:
+        rate: 每秒請求數
+        burst: 最多可累積的權杖數 (突發量)
+        clock / sleep: 時間來源與等待函數 (測試時可替換)
+    """
+    
+    def __init__(self, rate: float, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError(f"速率必須大於 0: {rate}")
+        
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self) -> float:
+        """嘗試取用一個權杖：成功回傳 0，否則回傳需等待的秒數"""
+        with self._lock:
+            self._refill(self.clock())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+    
+    def acquire(self) -> float:
+        """取用一個權杖 (必要時等待)，回傳等待的總秒數"""
+        waited = 0.0
+        while True:
+            # 在鎖外等待，其他執行緒等待期間不會被阻擋在鎖上
+            delay = self.try_acquire()
+            if delay == 0:
+                return waited
+            self.sleep(delay)
+            waited += delay
+
+
+class HostRateLimiter:
+    """依主機分開的權杖桶 (同一主機的所有請求共用一個速率上限)"""
+    
+    def __init__(self, rate: float, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, url: str) -> TokenBucket:
+        """取得 URL 所屬主機的權杖桶"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst, self.clock, self.sleep)
+            return self._buckets[host]
+    
+    def acquire(self, url: str) -> float:
+        """等待取得 URL 所屬主機的權杖，回傳等待秒數"""
+        return self.bucket(url).acquire()
+
+
+# 同一行程內相同設定的爬蟲共用限速器 (例如管線中各下載執行緒各自的爬蟲)
+_shared_limiters: Dict[Tuple[float, int], HostRateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(rate: float, burst: int = 1) -> Optional[HostRateLimiter]:
+    """取得行程內共用的主機限速器，rate 為 0 以下時不限速 (回傳 None)"""
+    if rate <= 0:
+        return None
+    with _shared_lock:
+        key = (float(rate), int(burst))
+        if key not in _shared_limiters:
+            _shared_limiters[key] = HostRateLimiter(rate, burst)
+        return _shared_limiters[key]
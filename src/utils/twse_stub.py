@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本機 TWSE 替身伺服器 - 模擬 doc.twse.com.tw 的 t57sb01 查詢與PDF下載流程，供離線壓力測試
+"""
+
+import re
+import time
+import random
+import hashlib
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs
+
+
+@dataclass
+class StubSettings:
+    """替身伺服器行為設定
+    
+    Args:
+        latency / jitter: 每個回應的延遲秒數與隨機增減範圍
+        error_rate: 回應 500 的機率
+        throttle_rate: 回應 429 (Retry-After) 的機率
+        payload_size: 每份PDF的位元組數
+        years: 文件清單包含的年度 (每年四季)
+        range_support: 是否支援 Range 續傳 (否則一律回應 200 與完整內容)
+        seed: 亂數種子 (錯誤與延遲可重現)
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    payload_size: int = 200_000
+    years: Tuple[int, ...] = tuple(range(2019, 2026))
+    range_support: bool = True
+    seed: Optional[int] = None
+
+
+class TWSEStubServer:
+    """本機 TWSE 替身伺服器
+    
+    - POST /server-java/t57sb01：無 filename 時回傳公司的文件清單，有 filename 時只回傳該檔連結
+    - GET /pdf/<檔名>：回傳以檔名決定內容的PDF，支援 Range (206 / Content-Range)
+    
+    在背景執行緒中服務，可作為 context manager 使用；stats 記錄各類請求與注入錯誤的次數。
+    """
+    
+    QUERY_PATH = '/server-java/t57sb01'
+    PDF_PREFIX = '/pdf/'
+    
+    def __init__(self, settings: Optional[StubSettings] = None, host: str = '127.0.0.1', port: int = 0):
+        self.settings = settings or StubSettings()
+        self._random = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub._handle(self, 'query')
+            
+            def do_GET(self):
+                stub._handle(self, 'download')
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> 'TWSEStubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='twse-stub', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+    
+    def __enter__(self) -> 'TWSEStubServer':
+        return self.start()
+    
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+    
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {'queries': 0, 'downloads': 0, 'range_requests': 0,
+                          'errors': 0, 'throttled': 0, 'bytes_sent': 0}
+    
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+    
+    def _draw(self) -> Tuple[float, float]:
+        """取得 (延遲秒數, 錯誤亂數)，在鎖內取亂數使固定種子時可重現"""
+        with self._lock:
+            delay = self.settings.latency + self._random.uniform(-self.settings.jitter, self.settings.jitter)
+            return max(0.0, delay), self._random.random()
+    
+    @staticmethod
+    def filenames(stock_code: str, years: Iterable[int]) -> Iterable[str]:
+        """公司各期財報的檔名"""
+        for year in years:
+            for season in range(1, 5):
+                yield f"{year}{season:02d}_{stock_code}_AI1.pdf"
+    
+    def payload(self, filename: str) -> bytes:
+        """檔名對應的PDF內容 (相同檔名內容固定)"""
+        header = b'%PDF-1.4\n% ' + filename.encode() + b'\n'
+        block = hashlib.sha256(filename.encode()).hexdigest().encode()
+        size = max(self.settings.payload_size, len(header))
+        body = block * ((size - len(header)) // len(block) + 1)
+        return header + body[:size - len(header)]
+    
+    def _handle(self, request: BaseHTTPRequestHandler, kind: str) -> None:
+        delay, draw = self._draw()
+        if delay:
+            time.sleep(delay)
+        
+        if draw < self.settings.throttle_rate:
+            self._count('throttled')
+            self._send(request, 429, b'Too Many Requests', headers={'Retry-After': '1'})
+            return
+        if draw < self.settings.throttle_rate + self.settings.error_rate:
+            self._count('errors')
+            self._send(request, 500, b'Internal Server Error')
+            return
+        
+        if kind == 'query' and request.path == self.QUERY_PATH:
+            self._count('queries')
+            self._send_listing(request)
+        elif kind == 'download' and request.path.startswith(self.PDF_PREFIX):
+            self._count('downloads')
+            self._send_pdf(request, request.path[len(self.PDF_PREFIX):])
+        else:
+            self._send(request, 404, b'Not Found')
+    
+    def _send_listing(self, request: BaseHTTPRequestHandler) -> None:
+        length = int(request.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(request.rfile.read(length).decode()).items()}
+        stock_code = form.get('co_id', '')
+        
+        filenames = list(self.filenames(stock_code, self.settings.years))
+        if form.get('filename'):
+            filenames = [name for name in filenames if name == form['filename']]
+        
+        links = ''.join(
+            f'<tr><td><a href="{self.PDF_PREFIX}{name}">{name} {self.settings.payload_size:,} bytes</a></td></tr>\n'
+            for name in filenames
+        )
+        body = f'<html><body><table>\n{links}</table></body></html>'.encode('utf-8')
+        self._send(request, 200, body, content_type='text/html; charset=utf-8')
+    
+    def _send_pdf(self, request: BaseHTTPRequestHandler, filename: str) -> None:
+        content = self.payload(filename)
+        match = re.match(r'bytes=(\d+)-$', request.headers.get('Range', ''))
+        if match and self.settings.range_support:
+            self._count('range_requests')
+            start = int(match.group(1))
+            if start >= len(content):
+                self._send(request, 416, b'', headers={'Content-Range': f'bytes */{len(content)}'})
+                return
+            self._send(request, 206, content[start:], content_type='application/pdf', headers={
+                'Content-Range': f'bytes {start}-{len(content) - 1}/{len(content)}'
+            })
+            return
+        self._send(request, 200, content, content_type='application/pdf')
+    
+    def _send(self, request: BaseHTTPRequestHandler, status: int, body: bytes,
+              content_type: str = 'text/plain', headers: Optional[Dict[str, str]] = None) -> None:
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        try:
+            request.wfile.write(body)
+            self._count('bytes_sent', len(body))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
@@ -0,0 +1,679 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次執行器測試
+"""
+
+import os
+import unittest
+import tempfile
+import json
+import threading
+import multiprocessing
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from src.batch import (
+    BackfillPlanner, BatchExecutor, Coverage, FilingPipeline, FilingPriority, LeaseCoordinator, LongestJobFirstPolicy, MemoryGovernor,
+    PageRangeScheduler, Pipeline, PriorityPolicy, ProcessingManifest, ShardedBatchRunner, ShardStatus, Stage,
+    parse_period
+)
+from src.batch.tasks import smart_process_task
+from src.tracking import ProcessingStatus, ProcessingTracker
+from src.utils.helpers import NDJSONWriter, batch_process, file_sha256
+from src.utils.index_manager import MasterIndexManager
+
+
+def square_or_fail(value: int) -> int:
+    """測試用工作函數 (模組層級，可供行程後端序列化)"""
+    if value < 0:
+        raise ValueError(f"負數: {value}")
+    return value * value
+
+
+def slow_or_square(value):
+    """測試用工作函數："hang" 模擬卡住的文件，"bloat" 模擬記憶體失控"""
+    if value == 'hang':
+        time.sleep(60)
+    if value == 'bloat':
+        data = bytearray(300 * 1024 * 1024)
+        time.sleep(60)
+        return len(data)
+    return value * value
+
+
+def run_node(db_path: str, node_id: str, log_path: str) -> None:
+    """測試用節點：處理到分片全部完成，每處理一個分片在共用記錄檔附加一行"""
+    def process_shard(payload):
+        time.sleep(0.05)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(f"{node_id} {payload['id']}\n")
+        return payload['id'] * 2
+    
+    coordinator = LeaseCoordinator(Path(db_path), node_id, lease_seconds=5)
+    ShardedBatchRunner(coordinator, process_shard, poll_interval=0.1).run()
+
+
+class TestBatchExecutor(unittest.TestCase):
+    """批次執行器測試"""
+    
+    def test_ordered_results_and_error_capture(self):
+        """測試各後端結果依輸入順序回傳，失敗項目不影響其他項目"""
+        items = [3, -1, 2, 5]
+        
+        for backend in ('serial', 'thread', 'process'):
+            with self.subTest(backend=backend):
+                results = BatchExecutor(backend, workers=2).map(square_or_fail, items)
+                
+                self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+                self.assertEqual([r.value for r in results if r.success], [9, 4, 25])
+                self.assertFalse(results[1].success)
+                self.assertEqual(results[1].error_type, 'ValueError')
+    
+    def test_longest_job_first(self):
+        """測試最長工作優先依檔案大小決定開始順序"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for name, size in [('small.pdf', 10), ('large.pdf', 1000), ('medium.pdf', 100)]:
+                path = Path(temp_dir) / name
+                path.write_bytes(b'0' * size)
+                paths.append(path)
+            
+            started = []
+            progress = []
+            executor = BatchExecutor(
+                'serial',
+                policy=LongestJobFirstPolicy(),
+                progress=lambda done, total, result: progress.append((done, total))
+            )
+            results = executor.map(lambda path: started.append(path.name), paths)
+            
+            self.assertEqual(started, ['large.pdf', 'medium.pdf', 'small.pdf'])
+            self.assertEqual([r.item for r in results], paths)
+            self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+    
+    def test_streaming_results(self):
+        """測試 imap_unordered 依完成順序產生結果，NDJSON 每筆完成即寫出"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "results.ndjson"
+            lines_seen = []
+            
+            with NDJSONWriter(path) as stream:
+                executor = BatchExecutor('thread', workers=2)
+                for result in executor.imap_unordered(square_or_fail, [3, -1, 2]):
+                    stream.write({'index': result.index, 'success': result.success, 'value': result.value})
+                    # 批次尚未結束時已寫出的記錄即可讀取
+                    lines_seen.append(len(path.read_text(encoding='utf-8').splitlines()))
+            
+            records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+            
+            self.assertEqual(lines_seen, [1, 2, 3])
+            self.assertEqual(sorted(r['index'] for r in records), [0, 1, 2])
+            self.assertEqual({r['index']: r['value'] for r in records if r['success']}, {0: 9, 2: 4})
+    
+    def test_batch_process_helper(self):
+        """測試 helpers.batch_process 平行執行並保留錯誤格式"""
+        results = batch_process([1, -2, 3], square_or_fail, workers=2)
+        
+        self.assertEqual(results[0], 1)
+        self.assertEqual(results[1]['item'], -2)
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2], 9)
+    
+    def test_smart_task_uses_item_config(self):
+        """測試行程後端的智慧處理工作使用項目附帶的配置，而非全域配置"""
+        config = {'output_dir': 'custom_output', 'min_fields_threshold': 5}
+        with patch('src.processors.smart_processor.SmartFinancialProcessor') as processor_class:
+            smart_process_task({'pdf_path': 'a.pdf', 'json_path': 'a.json', 'config': config})
+            smart_process_task({'pdf_path': 'b.pdf', 'json_path': 'b.json', 'config': dict(config)})
+        
+        processor_class.assert_called_once_with(config)
+        self.assertEqual(processor_class.return_value.process.call_count, 2)
+
+
+class TestIsolatedBackend(unittest.TestCase):
+    """隔離後端監控程式測試"""
+    
+    def test_watchdog_kills_and_recycles(self):
+        """測試逾時與超過記憶體上限的項目被終止，工作行程重建後其餘項目正常完成"""
+        executor = BatchExecutor('isolated', workers=2, timeout=2, memory_limit=150 * 1024 * 1024)
+        
+        start = time.perf_counter()
+        results = executor.map(slow_or_square, [2, 'hang', 'bloat', 3, 4])
+        elapsed = time.perf_counter() - start
+        
+        self.assertLess(elapsed, 15)
+        self.assertEqual([r.value for r in results if r.success], [4, 9, 16])
+        self.assertEqual(results[1].watchdog, 'timeout')
+        self.assertEqual(results[1].error_type, 'DocumentTimeout')
+        self.assertEqual(results[2].watchdog, 'memory')
+    
+    def test_tracker_records_watchdog_kill(self):
+        """測試終止的文件記錄到處理追蹤器"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracker = ProcessingTracker(Path(temp_dir) / "tracker.db")
+            
+            task = tracker.record_watchdog_kill(Path("data/202402_2330_AI1.pdf"), 'timeout', 301.5, "處理逾時")
+            self.assertIsNone(tracker.record_watchdog_kill(Path("unknown.pdf"), 'timeout', 1.0, "處理逾時"))
+            
+            stored = tracker.get_task(task.id)
+            self.assertEqual(stored.status, ProcessingStatus.TIMEOUT)
+            self.assertEqual((stored.year, stored.season), (2024, 'Q2'))
+            self.assertEqual(stored.metadata['watchdog']['reason'], 'timeout')
+            self.assertEqual(stored.retry_count, 1)
+    
+    def test_tracker_stage_checkpoints(self):
+        """測試已完成的批次階段在之後失敗時仍保留"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracker = ProcessingTracker(Path(temp_dir) / "tracker.db")
+            task = tracker.get_or_create_for_file(Path("202401_2330_AI1.pdf"))
+            
+            tracker.complete_stage(task.id, ProcessingStatus.DOWNLOADED, pdf_path="202401_2330_AI1.pdf")
+            tracker.update_task_status(task.id, ProcessingStatus.FAILED, error_message="處理失敗")
+            
+            stored = tracker.get_or_create_task("2330", "台積電", 2024, "Q1")
+            self.assertEqual(stored.status, ProcessingStatus.FAILED)
+            self.assertTrue(tracker.is_stage_completed(stored, ProcessingStatus.DOWNLOADED))
+            self.assertFalse(tracker.is_stage_completed(stored, ProcessingStatus.ENHANCED))
+            self.assertEqual(stored.pdf_path, "202401_2330_AI1.pdf")
+
+
+class TestMemoryGovernor(unittest.TestCase):
+    """記憶體調控器測試"""
+    
+    def make_files(self, temp_dir: str, sizes):
+        paths = []
+        for index, size in enumerate(sizes):
+            path = Path(temp_dir) / f"item{index}.bin"
+            path.write_bytes(b'0' * size)
+            paths.append(path)
+        return paths
+    
+    def test_admission_respects_budget(self):
+        """測試執行中項目的預估總量不超過預算，且結果完整"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = self.make_files(temp_dir, [100] * 6)
+            governor = MemoryGovernor(budget_bytes=250, reserve_bytes=0, base_bytes=0,
+                                      bytes_per_file_byte=1.0, meminfo=lambda: None)
+            
+            lock = threading.Lock()
+            running = [0]
+            peak = [0]
+            
+            def work(path):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+                return path.name
+            
+            results = BatchExecutor('thread', workers=4, governor=governor).map(work, paths)
+            
+            self.assertTrue(all(r.success for r in results))
+            self.assertEqual(peak[0], 2)
+            self.assertEqual(governor.in_flight, {})
+    
+    def test_oversized_item_runs_alone(self):
+        """測試超過預算的項目在沒有執行中項目時仍會送出"""
+        governor = MemoryGovernor(budget_bytes=100, reserve_bytes=0, base_bytes=500, meminfo=lambda: None)
+        governor.start(4)
+        
+        self.assertTrue(governor.can_admit(0, None))
+        governor.admit(0, None)
+        self.assertFalse(governor.can_admit(1, None))
+    
+    def test_correction_and_adaptive_limit(self):
+        """測試以實際峰值修正估計，並依系統可用記憶體調整並行數"""
+        available = [10_000]
+        governor = MemoryGovernor(budget_bytes=None, reserve_bytes=1_000, base_bytes=100,
+                                  meminfo=lambda: available[0])
+        governor.start(3)
+        
+        governor.admit(0, None)
+        available[0] = 500
+        governor.release(0, peak_rss=300)
+        
+        self.assertAlmostEqual(governor.correction, 0.7 + 0.3 * 3)
+        self.assertEqual(governor.estimate(1, None), int(100 * governor.correction))
+        self.assertEqual(governor.limit, 2)
+        
+        available[0] = 10_000
+        governor.admit(1, None)
+        governor.release(1)
+        self.assertEqual(governor.limit, 3)
+    
+    def test_prior_reads_page_count_without_parsing(self):
+        """測試先驗估計由原始位元組取得頁數，不以 pdfplumber 開啟，找不到頁面樹時只依檔案大小"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = Path(temp_dir) / "a.pdf"
+            pdf_path.write_bytes(b"%PDF-1.4\n2 0 obj\n<< /Count 12 /Kids [3 0 R] /Type /Pages >>\nendobj\n")
+            compressed_path = Path(temp_dir) / "b.pdf"
+            compressed_path.write_bytes(b"%PDF-1.7\n" + b"x" * 100)
+            governor = MemoryGovernor(budget_bytes=None, base_bytes=10, bytes_per_page=100,
+                                      bytes_per_file_byte=1.0, meminfo=lambda: None)
+            
+            with patch('src.batch.governor.pdf_page_count') as page_count:
+                self.assertEqual(governor.prior(pdf_path), 10 + 12 * 100 + pdf_path.stat().st_size)
+                self.assertEqual(governor.prior(compressed_path), 10 + compressed_path.stat().st_size)
+            page_count.assert_not_called()
+    
+    def test_worker_pids_reported_by_results(self):
+        """測試行程後端的工作行程ID 由項目結果回報，取樣不依賴執行器內部屬性"""
+        governor = MemoryGovernor(budget_bytes=None, meminfo=lambda: None)
+        
+        results = BatchExecutor('process', workers=2, governor=governor).map(square_or_fail, [1, 2, 3])
+        
+        pids = {result.worker_pid for result in results}
+        self.assertNotIn(None, pids)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual(governor.worker_pids, pids)
+
+
+class TestPipeline(unittest.TestCase):
+    """串流管線測試"""
+    
+    def test_stages_and_failures(self):
+        """測試項目依序經過各階段，失敗項目停在失敗的階段且結果依輸入順序"""
+        stages = [
+            Stage('square', square_or_fail, workers=2),
+            Stage('increment', lambda value: value + 1, workers=2),
+        ]
+        progress = []
+        results = Pipeline(stages, progress=lambda done, result: progress.append(done)).run(iter([3, -1, 2]))
+        
+        self.assertEqual([r.index for r in results], [0, 1, 2])
+        self.assertEqual([r.value for r in results if r.success], [10, 5])
+        self.assertEqual(results[1].failed_stage, 'square')
+        self.assertEqual(results[1].error_type, 'ValueError')
+        self.assertEqual(set(results[0].stage_durations), {'square', 'increment'})
+        self.assertEqual(progress, [1, 2, 3])
+    
+    def test_filing_pipeline_retry_budget_per_run(self):
+        """測試財報管線每次執行依查詢數建立重試預算，執行結束後移除"""
+        budgets = []
+        
+        class BudgetPipeline(FilingPipeline):
+            def build_stages(self):
+                return [Stage('crawl', lambda query: budgets.append(self._get_crawler().retry_budget), workers=2)]
+        
+        pipeline = BudgetPipeline({'output_dir': 'test_output', 'retry_budget_ratio': 0.5})
+        pipeline.run(iter(range(40)))
+        self.assertEqual(budgets[0].total, 20)
+        self.assertEqual({id(budget) for budget in budgets}, {id(budgets[0])})
+        self.assertIsNone(pipeline._get_crawler().retry_budget)
+        
+        pipeline.run(range(4))
+        self.assertIsNot(budgets[-1], budgets[0])
+        self.assertEqual(budgets[-1].total, 10)
+    
+    def test_backpressure(self):
+        """測試下游較慢時，上游已完成但尚未處理完的項目數受佇列上限限制"""
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+        
+        def produce(value):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            return value
+        
+        def consume(value):
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return value
+        
+        stages = [Stage('produce', produce), Stage('consume', consume, queue_size=1)]
+        results = Pipeline(stages).run(range(10))
+        
+        self.assertTrue(all(r.success for r in results))
+        # 下游執行中 1 個 + 佇列 1 個 + 上游等待放入 1 個
+        self.assertLessEqual(peak[0], 3)
+
+
+class TestPriorityScheduling(unittest.TestCase):
+    """財報優先排程測試"""
+    
+    def setUp(self):
+        # 2026-05-10 時最新可公告的季度為 2026Q1
+        self.priority = FilingPriority(['2330'], now=lambda: datetime(2026, 5, 10))
+    
+    def test_recency_watchlist_and_deadline(self):
+        """測試最新季度、觀察名單與接近截止時間的項目優先"""
+        latest = {'stock_code': '2317', 'year': 2026, 'season': 'Q1'}
+        older = {'stock_code': '2317', 'year': 2025, 'season': 'Q3'}
+        watched = {'stock_code': '2330', 'year': 2025, 'season': 'Q4'}
+        urgent = {**older, 'deadline': '2026-05-10T02:00:00'}
+        
+        self.assertLess(self.priority(latest), self.priority(older))
+        self.assertLess(self.priority(watched), self.priority(latest))
+        self.assertLess(self.priority(urgent), self.priority(watched))
+        self.assertEqual(self.priority(Path('202601_2317_AI1.pdf')), self.priority(latest))
+    
+    def test_deadline_time_zones(self):
+        """測試帶時區 (含 Z 結尾) 與不帶時區的截止時間都能比較，無法解析時視為沒有截止時間"""
+        priority = FilingPriority(now=lambda: datetime(2026, 5, 10, tzinfo=timezone.utc))
+        item = {'stock_code': '2317', 'year': 2026, 'season': 'Q1'}
+        base = priority(item)
+        
+        # 2026-05-10T09:00+08:00 即 UTC 01:00，距離截止 1 小時
+        self.assertEqual(priority({**item, 'deadline': '2026-05-10T09:00:00+08:00'}), base - 23 * 3600)
+        self.assertEqual(priority({**item, 'deadline': '2026-05-10T01:00:00Z'}), base - 23 * 3600)
+        self.assertEqual(priority({**item, 'deadline': datetime(2026, 5, 12, tzinfo=timezone.utc)}), base)
+        # 不帶時區的現在時間與帶時區的截止時間
+        self.assertLess(self.priority({**item, 'deadline': '2026-05-10T02:00:00+00:00'}), self.priority(item))
+        
+        with self.assertLogs('FilingPriority', level='WARNING'):
+            self.assertEqual(priority({**item, 'deadline': 'next tuesday'}), base)
+    
+    def test_policy_order(self):
+        """測試批次依優先分數排序"""
+        items = [Path('202502_2317_AI1.pdf'), Path('202601_2317_AI1.pdf'), Path('202503_2330_AI1.pdf')]
+        self.assertEqual(PriorityPolicy(self.priority).order(items), [2, 1, 0])
+    
+    def test_pipeline_aging(self):
+        """測試管線佇列依優先分數取出，等待夠久的積壓項目仍會先於後到的高優先項目"""
+        priorities = {'block': 0, 'backlog': 10, 'urgent': 0}
+        
+        def items():
+            yield 'block'
+            yield 'backlog'
+            time.sleep(0.05)
+            yield 'urgent'
+        
+        def record(value):
+            if value == 'block':
+                time.sleep(0.2)
+            return value
+        
+        def run(aging_rate):
+            order = []
+            Pipeline(
+                [Stage('record', record)],
+                progress=lambda done, result: order.append(result.item),
+                priority=priorities.get,
+                aging_rate=aging_rate
+            ).run(items())
+            return order
+        
+        self.assertEqual(run(0.0), ['block', 'urgent', 'backlog'])
+        self.assertEqual(run(1000.0), ['block', 'backlog', 'urgent'])
+
+
+class TestPageRangeScheduler(unittest.TestCase):
+    """跨文件分頁排程測試 (項目為 (名稱, 頁數))"""
+    
+    def setUp(self):
+        self.threads = {}
+        
+        def extract(task):
+            (name, _), first, last = task
+            if name == 'broken' and first > 1:
+                raise ValueError("無法解析頁面")
+            time.sleep(0.01)
+            self.threads.setdefault(name, set()).add(threading.current_thread().name)
+            return [{'page': page} for page in range(first, last + 1)]
+        
+        def assemble(task):
+            (name, _), pages = task
+            return [page['page'] for page in sorted(pages, key=lambda page: page['page'])]
+        
+        self.scheduler = PageRangeScheduler(
+            'thread', 4,
+            extract_func=extract,
+            assemble_func=assemble,
+            page_count=lambda item: item[1],
+            min_pages=2, max_pages=8
+        )
+    
+    def test_pages_reassembled_per_document(self):
+        """測試各文件的頁面依頁碼組合，大型文件由多個工作者分擔"""
+        items = [('small', 3), ('large', 60), ('empty', 0)]
+        results = self.scheduler.map(items)
+        
+        self.assertEqual(results[0].value, [1, 2, 3])
+        self.assertEqual(results[1].value, list(range(1, 61)))
+        self.assertFalse(results[2].success)
+        self.assertGreater(len(self.threads['large']), 1)
+    
+    def test_failed_range_fails_document(self):
+        """測試任一頁碼範圍失敗時該文件失敗，其他文件不受影響"""
+        results = self.scheduler.map([('broken', 20), ('other', 10)])
+        
+        self.assertFalse(results[0].success)
+        self.assertEqual(results[0].error_type, 'ValueError')
+        self.assertEqual(results[1].value, list(range(1, 11)))
+    
+    def test_chunk_size_shrinks_near_end(self):
+        """測試分頁範圍隨剩餘頁數縮小，並限制在上下限之間"""
+        self.assertEqual(self.scheduler.chunk_size(1000), 8)
+        self.assertEqual(self.scheduler.chunk_size(40), 5)
+        self.assertEqual(self.scheduler.chunk_size(3), 2)
+
+
+class TestLeaseCoordinator(unittest.TestCase):
+    """分片租約協調測試"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.temp_dir.name) / "shards.db"
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_nodes_process_each_shard_once(self):
+        """測試多個節點行程共用資料庫時，每個分片只被處理一次"""
+        coordinator = LeaseCoordinator(self.db_path)
+        coordinator.add_shards((f"shard-{i:02d}", {'id': i}) for i in range(20))
+        log_path = Path(self.temp_dir.name) / "processed.log"
+        
+        nodes = [
+            multiprocessing.Process(target=run_node, args=(str(self.db_path), f"node-{n}", str(log_path)))
+            for n in range(3)
+        ]
+        for node in nodes:
+            node.start()
+        for node in nodes:
+            node.join(timeout=60)
+        
+        processed = [line.split() for line in log_path.read_text(encoding='utf-8').splitlines()]
+        stats = coordinator.get_statistics()
+        
+        self.assertEqual(sorted(int(shard) for _, shard in processed), list(range(20)))
+        self.assertGreater(len({node for node, _ in processed}), 1)
+        self.assertEqual(stats['by_status'][ShardStatus.DONE.value], 20)
+    
+    def test_expired_lease_reclaimed(self):
+        """測試租約過期後由其他節點收回，原節點無法再回報結果"""
+        node_a = LeaseCoordinator(self.db_path, 'node-a', lease_seconds=0.2)
+        node_b = LeaseCoordinator(self.db_path, 'node-b', lease_seconds=0.2)
+        node_a.add_shards([('shard-1', [1, 2])])
+        
+        lease = node_a.claim()
+        self.assertEqual(lease.payload, [1, 2])
+        self.assertTrue(node_a.heartbeat('shard-1'))
+        self.assertIsNone(node_b.claim())
+        
+        time.sleep(0.3)
+        reclaimed = node_b.claim()
+        
+        self.assertEqual((reclaimed.shard_id, reclaimed.attempts), ('shard-1', 2))
+        self.assertFalse(node_a.heartbeat('shard-1'))
+        self.assertFalse(node_a.complete('shard-1', 'stale'))
+        self.assertTrue(node_b.complete('shard-1', 'ok'))
+    
+    def test_failed_shard_retried_until_limit(self):
+        """測試失敗的分片放回重試，超過嘗試次數後標記為失敗"""
+        coordinator = LeaseCoordinator(self.db_path, 'node-a', max_attempts=2)
+        coordinator.add_shards([('shard-1', {})])
+        
+        def fail(payload):
+            raise RuntimeError("下載失敗")
+        
+        stats = ShardedBatchRunner(coordinator, fail, poll_interval=0.1).run()
+        
+        self.assertEqual((stats['claimed'], stats['failed']), (2, 2))
+        self.assertEqual(coordinator.get_statistics()['failed_shards'][0]['error'], "下載失敗")
+    
+    def test_item_failures_retry_shard(self):
+        """測試處理函數回傳項目失敗 (未拋出例外) 時分片不標記完成，記錄部分結果並重試到上限"""
+        coordinator = LeaseCoordinator(self.db_path, 'node-a', max_attempts=2)
+        coordinator.add_shards([('shard-1', [1, 2]), ('shard-2', [3])])
+        attempts = {}
+        
+        def process(payload):
+            key = payload[0]
+            attempts[key] = attempts.get(key, 0) + 1
+            # shard-1 的項目 2 一直失敗；shard-2 第二次嘗試成功
+            failed = [2] if key == 1 or attempts[key] == 1 else []
+            return {'total': len(payload), 'success': len(payload) - len(failed), 'failed': failed}
+        
+        stats = ShardedBatchRunner(coordinator, process, poll_interval=0.1).run()
+        statistics = coordinator.get_statistics()
+        
+        self.assertEqual((stats['claimed'], stats['failed'], stats['completed']), (4, 3, 1))
+        self.assertEqual(attempts, {1: 2, 3: 2})
+        self.assertEqual(statistics['by_status'][ShardStatus.DONE.value], 1)
+        self.assertEqual(statistics['failed_shards'][0]['id'], 'shard-1')
+        self.assertEqual(statistics['failed_shards'][0]['error'], "1 個項目失敗")
+        self.assertEqual(statistics['failed_shards'][0]['result'], {'total': 2, 'success': 1, 'failed': [2]})
+
+
+class TestProcessingManifest(unittest.TestCase):
+    """處理清單測試"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+        self.pdf_path = self.data_dir / "202401_2330_AI1.pdf"
+        self.json_path = self.data_dir / "202401_2330_AI1.json"
+        self.output_path = self.data_dir / "processed" / "202401_2330_AI1_enhanced.json"
+        
+        self.pdf_path.write_bytes(b"%PDF-1.4 test")
+        self.write_json({"stock_code": "2330", "report_year": 2024, "report_season": "Q1", "financials": {}})
+        self.output_path.parent.mkdir()
+        self.output_path.write_text("{}", encoding='utf-8')
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def write_json(self, data):
+        self.json_path.write_text(json.dumps(data), encoding='utf-8')
+    
+    def record(self, version: str = "v1") -> ProcessingManifest:
+        manifest = ProcessingManifest.for_directory(self.data_dir)
+        fingerprint = manifest.fingerprint(self.pdf_path, self.json_path, version)
+        manifest.record(self.pdf_path.name, fingerprint, str(self.output_path))
+        manifest.save()
+        return ProcessingManifest.for_directory(self.data_dir)
+    
+    def is_current(self, manifest: ProcessingManifest, version: str = "v1") -> bool:
+        fingerprint = manifest.fingerprint(self.pdf_path, self.json_path, version)
+        return manifest.is_current(self.pdf_path.name, fingerprint)
+    
+    def test_unchanged_input_is_current(self):
+        """測試未變更的輸入可略過，且不重新計算PDF雜湊"""
+        manifest = self.record()
+        
+        with patch('src.batch.manifest.file_sha256') as mock_hash:
+            self.assertTrue(self.is_current(manifest))
+            mock_hash.assert_not_called()
+    
+    def test_backfilled_values_do_not_invalidate(self):
+        """測試回填寫入財務數值與 metadata 不會讓清單失效"""
+        manifest = self.record()
+        self.write_json({"stock_code": "2330", "report_year": 2024, "report_season": "Q1",
+                         "financials": {"total_assets": 1}, "metadata": {"last_backfill": "now"}})
+        
+        self.assertTrue(self.is_current(manifest))
+    
+    def test_changes_invalidate(self):
+        """測試PDF內容、識別欄位、擷取器版本或輸出檔變更時需重新處理"""
+        manifest = self.record()
+        self.assertFalse(self.is_current(manifest, version="v2"))
+        
+        self.write_json({"stock_code": "2330", "report_year": 2024, "report_season": "Q2"})
+        self.assertFalse(self.is_current(manifest))
+        
+        manifest = self.record()
+        self.pdf_path.write_bytes(b"%PDF-1.4 changed content")
+        self.assertFalse(self.is_current(manifest))
+        
+        manifest = self.record()
+        self.output_path.unlink()
+        self.assertFalse(self.is_current(manifest))
+
+
+class TestBackfillPlanner(unittest.TestCase):
+    """測試回補規劃"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.index_manager = MasterIndexManager(self.root / "index.json")
+        self.planner = BackfillPlanner(self.root, self.index_manager)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def add(self, stock_code, year, season, indexed=True, with_json=True):
+        pdf_path = self.root / f"{year}0{season[1]}_{stock_code}_AI1.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 " + stock_code.encode() * 1000)
+        if with_json:
+            pdf_path.with_suffix('.json').write_text("{}")
+        if indexed:
+            self.index_manager.add_report(stock_code, stock_code, year, season, pdf_path, pdf_path.with_suffix('.json'),
+                                          pdf_path.stat().st_size, sha256=file_sha256(pdf_path))
+    
+    def test_parse_period(self):
+        self.assertEqual(parse_period("2024Q3"), (2024, "Q3"))
+        self.assertEqual(parse_period("2023-2"), (2023, "Q2"))
+        self.assertEqual(parse_period("2022"), (2022, "Q1"))
+        self.assertEqual(parse_period("2022", end=True), (2022, "Q4"))
+        with self.assertRaises(ValueError):
+            parse_period("2024Q5")
+    
+    def test_plan_only_missing_and_stale(self):
+        """測試已涵蓋的期別不產生工作，缺少索引、JSON或下載失敗的期別視為過期，未結束的季度不列入"""
+        self.add("2330", 2024, "Q1")
+        self.add("2330", 2024, "Q2", indexed=False)
+        self.add("2454", 2024, "Q1", with_json=False)
+        self.add("2317", 2024, "Q1")
+        self.index_manager.update_report(MasterIndexManager.report_id("2317", 2024, "Q1"), download_success=False)
+        
+        plan = self.planner.plan(["2454", "2330", "2317"], (2024, "Q1"), (2024, "Q4"), today=date(2024, 8, 15))
+        
+        self.assertEqual(plan.coverage["2330"], {"2024Q1": Coverage.PRESENT, "2024Q2": Coverage.STALE})
+        self.assertEqual(plan.coverage["2454"], {"2024Q1": Coverage.STALE, "2024Q2": Coverage.MISSING})
+        self.assertEqual(plan.coverage["2317"]["2024Q1"], Coverage.STALE)
+        self.assertEqual([(job["stock_code"], job["year"], job["season"]) for job in plan.jobs],
+                         [("2317", 2024, "Q1"), ("2317", 2024, "Q2"), ("2330", 2024, "Q2"),
+                          ("2454", 2024, "Q1"), ("2454", 2024, "Q2")])
+        self.assertEqual(plan.summary(), {"present": 1, "stale": 3, "missing": 2, "jobs": 5, "companies_to_query": 3})
+    
+    def test_plan_queries_groups_by_company(self):
+        """測試手寫批次檔去除重複、依公司分組，且內容與索引不符時只在 verify 模式偵測"""
+        self.add("2330", 2023, "Q4")
+        queries = [{"stock_code": code, "company_name": "", "year": 2023, "season": season}
+                   for season in ("Q4", "4", "Q3") for code in ("2454", "2330")]
+        
+        plan = self.planner.plan_queries(queries)
+        self.assertEqual([(job["stock_code"], job["season"]) for job in plan.jobs],
+                         [("2330", "Q3"), ("2454", "Q3"), ("2454", "Q4")])
+        self.assertEqual(plan.companies["2330"], "2330")
+        self.assertEqual(plan.companies["2454"], "聯發科")
+        
+        pdf_path = self.root / "202304_2330_AI1.pdf"
+        pdf_path.write_bytes(pdf_path.read_bytes()[::-1])
+        self.assertEqual(self.planner.plan_queries(queries[1:2]).jobs, [])
+        self.planner.verify = True
+        self.assertEqual(self.planner.plan_queries(queries[1:2]).coverage["2330"]["2023Q4"], Coverage.STALE)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -4,14 +4,26 @@
 爬蟲功能測試
 """
 
+import os
+import stat
+import asyncio
 import unittest
 import tempfile
 import json
+import time
+import threading
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from src.core.crawler import FinancialCrawler
+from src.core.async_crawler import AsyncFinancialCrawler
 from src.core import ProcessingResult
+from src.tracking import ProcessingStatus, ProcessingTracker
+from src.utils.index_manager import MasterIndexManager
+from src.utils.blob_store import BlobStore
+from src.utils.circuit_breaker import BreakerState, CircuitBreaker, RetryBudget, backoff_delay
+from src.utils.rate_limiter import HostRateLimiter, TokenBucket
+from src.utils.twse_stub import StubSettings, TWSEStubServer
 
 
 class TestFinancialCrawlerIntegration(unittest.TestCase):
@@ -47,9 +59,9 @@ class TestFinancialCrawlerIntegration(unittest.TestCase):
             '''
             
             # 模擬PDF下載回應 - 使用更大的內容以通過檔案大小驗證
-            mock_pdf_content = b'Mock PDF content' * 100  # 1700+ bytes
+            mock_pdf_content = b'%PDF-1.4 Mock PDF content' * 100  # 2500 bytes
             mock_get.return_value.status_code = 200
-            mock_get.return_value.content = mock_pdf_content
+            mock_get.return_value.iter_content.return_value = [mock_pdf_content[:1000], mock_pdf_content[1000:]]
             
             with tempfile.TemporaryDirectory() as temp_dir:
                 # 設置具體的輸出路徑而非目錄
@@ -69,7 +81,8 @@ class TestFinancialCrawlerIntegration(unittest.TestCase):
         ]
         
         with patch('requests.Session.post') as mock_post, \
-             patch('requests.Session.get') as mock_get:
+             patch('requests.Session.get') as mock_get, \
+             tempfile.TemporaryDirectory() as temp_dir:
             
             # 模擬查詢回應
             mock_post.return_value.status_code = 200
@@ -81,17 +94,143 @@ class TestFinancialCrawlerIntegration(unittest.TestCase):
             '''
             
             # 模擬PDF下載回應 - 使用更大的內容
-            mock_pdf_content = b'Mock PDF content for testing' * 50  # 1400+ bytes
+            mock_pdf_content = b'%PDF-1.4 Mock PDF content for testing' * 50  # 1850 bytes
             mock_get.return_value.status_code = 200
-            mock_get.return_value.content = mock_pdf_content
+            mock_get.return_value.iter_content.return_value = [mock_pdf_content]
             
-            result = self.crawler._process_batch(queries_data)
+            # 寫入暫存目錄與暫存主索引，不影響 test_output 與專案的主索引
+            self.crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            result = self.crawler._process_batch(queries_data, Path(temp_dir))
             
             # 驗證批次處理結果
             self.assertTrue(result.success)
             self.assertEqual(mock_post.call_count, 2)  # 兩次查詢請求
             self.assertIn("批次處理完成", result.message)
     
+    def test_listing_fetched_once_per_company(self):
+        """測試同一公司多期財報只查詢一次文件清單，清單中沒有的檔名才以單一檔名查詢"""
+        queries_data = [
+            {"stock_code": "2330", "company_name": "台積電", "year": 2023, "season": season}
+            for season in ("Q1", "Q2", "Q3", "Q4")
+        ]
+        
+        with patch('requests.Session.post') as mock_post, \
+             patch('requests.Session.get') as mock_get, \
+             patch('src.core.crawler.time.sleep'), \
+             tempfile.TemporaryDirectory() as temp_dir:
+            
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.text = '''
+            <html><body>
+            <a href="/pdf/202301_2330_AI1.pdf">202301_2330_AI1.pdf 1,234,567 bytes</a>
+            <a href="/pdf/202302_2330_AI1.pdf">202302_2330_AI1.pdf</a>
+            <a href="/pdf/202303_2330_AI1.pdf">202303_2330_AI1.pdf</a>
+            </body></html>
+            '''
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter([b'%PDF' + b'0' * 2000])
+            self.crawler.rate_limiter = None
+            self.crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            
+            result = self.crawler._process_batch(queries_data, Path(temp_dir))
+            
+            self.assertEqual(result.data[0]['data']['file_size'], 2004)
+            listing = self.crawler.get_listing("2330")
+            self.assertEqual(listing['202301_2330_ai1.pdf']['size'], 1234567)
+            self.assertEqual(listing['202302_2330_ai1.pdf']['url'], '/pdf/202302_2330_AI1.pdf')
+            # 只有一次清單查詢，其餘都是 Q4 (不在清單中) 各次重試的單一檔名查詢
+            posted = [call.kwargs['data'] for call in mock_post.call_args_list]
+            self.assertNotIn('filename', posted[0])
+            self.assertEqual({data.get('filename') for data in posted[1:]}, {'202304_2330_AI1.pdf'})
+            self.assertEqual(mock_get.call_count, 3)
+            self.assertEqual(result.data[3]['success'], False)
+    
+    def test_listing_refreshed_after_failed_download(self):
+        """測試以快取清單的連結下載失敗後，重試時重新查詢文件清單取得新連結"""
+        query_data = {"stock_code": "2330", "company_name": "台積電", "year": 2024, "season": "Q1"}
+        listings = iter([
+            '<a href="/pdf/old/202401_2330_AI1.pdf">202401_2330_AI1.pdf</a>',
+            '<a href="/pdf/new/202401_2330_AI1.pdf">202401_2330_AI1.pdf</a>',
+        ])
+        
+        def get(url, **kwargs):
+            response = MagicMock()
+            response.status_code = 200 if '/new/' in url else 404
+            response.headers = {}
+            response.iter_content.side_effect = lambda chunk_size: iter([b'%PDF' + b'0' * 2000])
+            return response
+        
+        with patch('requests.Session.post') as mock_post, \
+             patch('requests.Session.get', side_effect=get) as mock_get, \
+             patch('src.core.crawler.time.sleep'), \
+             tempfile.TemporaryDirectory() as temp_dir:
+            
+            mock_post.return_value.status_code = 200
+            type(mock_post.return_value).text = property(lambda response: next(listings))
+            
+            crawler = FinancialCrawler({"output_dir": temp_dir, "max_retry": 2})
+            crawler.rate_limiter = None
+            crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            
+            result = crawler._process_single(query_data)
+            
+            self.assertTrue(result.success)
+            self.assertEqual(mock_post.call_count, 2)
+            self.assertEqual([call.args[0].split('/pdf/')[1] for call in mock_get.call_args_list],
+                             ['old/202401_2330_AI1.pdf', 'new/202401_2330_AI1.pdf'])
+            self.assertEqual(crawler.get_listing("2330")['202401_2330_ai1.pdf']['url'], '/pdf/new/202401_2330_AI1.pdf')
+    
+    def test_skip_download_when_present(self):
+        """測試本機PDF與主索引記錄相符時不再下載且保留已回填的JSON，refresh 時重新下載"""
+        query_data = {"stock_code": "2330", "company_name": "台積電", "year": 2024, "season": "Q1"}
+        
+        with patch('requests.Session.post') as mock_post, \
+             patch('requests.Session.get') as mock_get, \
+             tempfile.TemporaryDirectory() as temp_dir:
+            
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.text = '<a href="/pdf/202401_2330_AI1.pdf">202401_2330_AI1.pdf</a>'
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter([b'%PDF' + b'0' * 2000])
+            
+            crawler = FinancialCrawler({"output_dir": temp_dir})
+            crawler.rate_limiter = None
+            crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            
+            result = crawler._process_single(query_data)
+            self.assertTrue(result.success)
+            record = crawler.index_manager.find_report("2330", 2024, "Q1")
+            self.assertEqual(record["id"], "2330_2024Q1")
+            self.assertEqual(len(record["sha256"]), 64)
+            
+            json_path = Path(result.data["json_path"])
+            backfilled = json.loads(json_path.read_text(encoding='utf-8'))
+            backfilled["income_statement"] = {"revenue": 100}
+            json_path.write_text(json.dumps(backfilled), encoding='utf-8')
+            
+            mock_post.reset_mock()
+            mock_get.reset_mock()
+            result = crawler._process_single(query_data)
+            
+            self.assertTrue(result.data["skipped"])
+            mock_post.assert_not_called()
+            mock_get.assert_not_called()
+            self.assertEqual(json.loads(json_path.read_text(encoding='utf-8'))["income_statement"], {"revenue": 100})
+            
+            # 內容相同的重新下載也保留JSON
+            crawler.refresh = True
+            result = crawler._process_single(query_data)
+            self.assertNotIn("skipped", result.data)
+            mock_get.assert_called_once()
+            self.assertEqual(json.loads(json_path.read_text(encoding='utf-8'))["income_statement"], {"revenue": 100})
+            
+            # 檔案與索引雜湊不符時重新下載
+            crawler.refresh = False
+            Path(result.data["pdf_path"]).write_bytes(b'%PDF' + b'1' * 2000)
+            result = crawler._process_single(query_data)
+            self.assertNotIn("skipped", result.data)
+            self.assertEqual(mock_get.call_count, 2)
+    
     def test_filename_generation(self):
         """測試檔案名稱生成"""
         query_data = {
@@ -109,6 +248,158 @@ class TestFinancialCrawlerIntegration(unittest.TestCase):
         expected_filename = f"{year}{month:0>2}_{stock_code}_AI1.pdf"
         
         self.assertEqual(expected_filename, "202403_2330_AI1.pdf")
+    
+    def test_resume_skips_downloaded(self):
+        """測試 resume 時略過追蹤器中已下載且檔案仍存在的財報，其餘記錄下載狀態"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracker = ProcessingTracker(Path(temp_dir) / "tracker.db")
+            crawler = FinancialCrawler({"output_dir": temp_dir}, tracker=tracker, resume=True)
+            
+            pdf_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            pdf_path.write_bytes(b"%PDF" + b"0" * 2000)
+            task = tracker.get_or_create_task("2330", "台積電", 2024, "Q1")
+            tracker.complete_stage(task.id, ProcessingStatus.DOWNLOADED, pdf_path=pdf_path)
+            
+            with patch('requests.Session.post') as mock_post, patch('src.core.crawler.time.sleep'):
+                mock_post.return_value.status_code = 500
+                skipped = crawler._process_single(
+                    {"stock_code": "2330", "company_name": "台積電", "year": 2024, "season": "Q1"})
+                failed = crawler._process_single(
+                    {"stock_code": "2454", "company_name": "聯發科", "year": 2024, "season": "Q1"})
+            
+            self.assertTrue(skipped.data['skipped'])
+            self.assertTrue(all(call.kwargs['data']['co_id'] == "2454" for call in mock_post.call_args_list))
+            self.assertFalse(failed.success)
+            self.assertEqual(tracker.get_task("2454_2024Q1").status, ProcessingStatus.FAILED)
+
+
+class TestRateLimiting(unittest.TestCase):
+    """主機限速與平行下載測試"""
+    
+    def test_token_bucket(self):
+        """測試權杖桶允許突發量，之後依速率等待"""
+        now = [0.0]
+        waits = []
+        
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+        
+        bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+        
+        self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.5])
+        now[0] += 10
+        # 閒置期間最多累積 burst 個權杖
+        self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.5])
+    
+    def test_legacy_download_delay(self):
+        """測試舊版配置的 download_delay 換算為請求速率，request_rate 與預設值不受影響"""
+        self.assertEqual(FinancialCrawler({"download_delay": 4}).rate_limiter.rate, 0.5)
+        self.assertIsNone(FinancialCrawler({"download_delay": 0}).rate_limiter)
+        self.assertEqual(FinancialCrawler({"download_delay": 4, "request_rate": 3}).rate_limiter.rate, 3)
+        self.assertEqual(FinancialCrawler({}).rate_limiter.rate, 1.0)
+    
+    def test_hosts_limited_separately(self):
+        """測試不同主機各自的權杖桶"""
+        limiter = HostRateLimiter(rate=1, burst=1)
+        
+        self.assertIs(limiter.bucket("https://doc.twse.com.tw/a"), limiter.bucket("https://DOC.twse.com.tw/b"))
+        self.assertIsNot(limiter.bucket("https://doc.twse.com.tw/a"), limiter.bucket("https://mops.twse.com.tw/"))
+    
+    def test_concurrent_batch_respects_rate(self):
+        """測試平行下載時結果依輸入順序排列，且請求速率不超過限速"""
+        queries = [
+            {"stock_code": code, "company_name": "測試", "year": 2024, "season": "Q1"}
+            for code in ("2330", "2317", "2454", "2303", "2412", "2882")
+        ]
+        
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch('requests.Session.post') as mock_post, \
+                patch('requests.Session.get') as mock_get, \
+                patch('src.utils.index_manager.MasterIndexManager.add_report'):
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.text = "".join(
+                f'<a href="/download/202401_{q["stock_code"]}_AI1.pdf">PDF</a>' for q in queries
+            )
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter([b'%PDF' + b'0' * 2000])
+            
+            crawler = FinancialCrawler({"output_dir": temp_dir, "download_workers": 4},
+                                       rate_limiter=HostRateLimiter(rate=20, burst=1))
+            start = time.monotonic()
+            result = crawler._process_batch(queries)
+            elapsed = time.monotonic() - start
+        
+        self.assertTrue(all(r['success'] for r in result.data))
+        self.assertEqual([Path(r['data']['pdf_path']).name for r in result.data],
+                         [f"202401_{q['stock_code']}_AI1.pdf" for q in queries])
+        # 12 個請求、每秒 20 個、突發量 1：至少需要 11 / 20 秒
+        self.assertGreaterEqual(elapsed, 11 / 20)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """斷路器、重試預算與隨機退避測試"""
+    
+    def test_breaker_states(self):
+        """測試連續失敗開啟、逾時後半開只放行試探請求，試探成功關閉、失敗重新開啟"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10, clock=lambda: now[0])
+        
+        for _ in range(3):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+        self.assertFalse(breaker.allow())
+        
+        now[0] += 10
+        self.assertEqual(breaker.state, BreakerState.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+        
+        now[0] += 10
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
+        self.assertEqual(breaker.snapshot(), {'state': 'closed', 'consecutive_failures': 0,
+                                              'times_opened': 2, 'rejected': 2})
+    
+    def test_retry_budget_and_backoff(self):
+        """測試重試預算用完後拒絕，退避時間在上限內隨機分布"""
+        budget = RetryBudget.for_batch(100, ratio=0.05, minimum=3)
+        self.assertEqual([budget.try_spend() for _ in range(6)], [True] * 5 + [False])
+        self.assertEqual(budget.snapshot(), {'total': 5, 'spent': 5, 'denied': 1})
+        
+        delays = [backoff_delay(3, cap=5) for _ in range(200)]
+        self.assertTrue(all(0 <= delay <= 5 for delay in delays))
+        self.assertGreater(len(set(delays)), 100)
+    
+    def test_outage_fails_fast(self):
+        """測試主機故障時斷路器開啟，其餘下載快速失敗而不逐一重試"""
+        queries = [{"stock_code": "9001", "company_name": "9001", "year": 2023, "season": f"Q{q}"} for q in range(1, 5)]
+        queries += [{"stock_code": "9002", "company_name": "9002", "year": 2023, "season": f"Q{q}"} for q in range(1, 5)]
+        
+        with TWSEStubServer(StubSettings(error_rate=1.0)) as stub, tempfile.TemporaryDirectory() as temp_dir, \
+                patch('src.core.crawler.time.sleep') as mock_sleep:
+            crawler = FinancialCrawler({
+                'output_dir': temp_dir, 'crawler_base_url': stub.base_url, 'request_rate': 0,
+                'breaker_failure_threshold': 3, 'breaker_recovery_timeout': 600
+            })
+            result = crawler.process(queries)
+            metrics = crawler.metrics()
+            errors = stub.stats['errors']
+        
+        self.assertFalse(result.success)
+        # 批次的重試預算在批次結束後移除，不影響之後的單筆下載
+        self.assertIsNone(crawler.retry_budget)
+        self.assertEqual(errors, 3)
+        self.assertEqual(metrics['failed_requests'], 3)
+        # 第一筆用完三次嘗試時斷路器開啟，其餘查詢不再送出請求
+        self.assertEqual(metrics['fast_failures'], len(queries) - 1)
+        self.assertEqual(metrics['breakers'][stub.base_url.split('//')[1]]['state'], 'open')
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertIn("快速失敗", result.data[-1]['message'])
 
 
 class TestCrawlerErrorHandling(unittest.TestCase):
@@ -145,6 +436,137 @@ class TestCrawlerErrorHandling(unittest.TestCase):
             self.assertFalse(result.success)
             self.assertIn("查詢失敗", result.message)
     
+    @patch('src.core.crawler.time.sleep')
+    @patch('requests.Session.get')
+    @patch('requests.Session.post')
+    def test_partial_download_never_at_final_path(self, mock_post, mock_get, mock_sleep):
+        """測試下載中斷時只保留 .part 檔供續傳，內容不是PDF時刪除，目標路徑都不會出現檔案"""
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.text = '<a href="/download/202401_2330_AI1.pdf">PDF</a>'
+        mock_get.return_value.status_code = 200
+        
+        def interrupted(chunk_size):
+            yield b'%PDF' + b'0' * 5000
+            raise ConnectionError("連線中斷")
+        
+        html_page = [b'<html>' + b'0' * 5000 + b'</html>']
+        self.crawler.rate_limiter = None
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            part_path = FinancialCrawler.part_path(output_path)
+            
+            mock_get.return_value.iter_content.side_effect = interrupted
+            result = self.crawler._download_report("2330", "202401_2330_AI1.pdf", output_path)
+            self.assertFalse(result.success)
+            self.assertEqual(list(Path(temp_dir).iterdir()), [part_path])
+            self.assertEqual(part_path.stat().st_size, 5004)
+            
+            # 伺服器忽略 Range (回應 200) 時從頭下載，內容不是PDF則刪除部分檔案
+            mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter(html_page)
+            result = self.crawler._download_report("2330", "202401_2330_AI1.pdf", output_path)
+            self.assertFalse(result.success)
+            self.assertEqual(list(Path(temp_dir).iterdir()), [])
+    
+    @patch('requests.Session.get')
+    def test_resume_with_range_request(self, mock_get):
+        """測試 .part 檔已有內容時以 Range 請求續傳並接在部分內容之後"""
+        content = b'%PDF' + bytes(range(256)) * 20
+        half = len(content) // 2
+        mock_get.return_value.status_code = 206
+        mock_get.return_value.headers = {'Content-Range': f'bytes {half}-{len(content) - 1}/{len(content)}'}
+        mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter([content[half:]])
+        self.crawler.rate_limiter = None
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            FinancialCrawler.part_path(output_path).write_bytes(content[:half])
+            
+            size = self.crawler._download_file("https://example.com/a.pdf", output_path, 30)
+            
+            self.assertEqual(size, len(content))
+            self.assertEqual(output_path.read_bytes(), content)
+            self.assertEqual(mock_get.call_args.kwargs['headers'], {'Range': f'bytes={half}-'})
+            self.assertEqual(list(Path(temp_dir).iterdir()), [output_path])
+    
+    @patch('requests.Session.get')
+    def test_resume_validates_partial_file(self, mock_get):
+        """測試續傳時附上 If-Range，Content-Range 不符或清單大小改變時刪除部分檔案"""
+        content = b'%PDF' + bytes(range(256)) * 20
+        half = len(content) // 2
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {'ETag': '"v1"', 'Content-Length': str(len(content))}
+        
+        def interrupted(chunk_size):
+            yield content[:half]
+            raise ConnectionError("連線中斷")
+        
+        mock_get.return_value.iter_content.side_effect = interrupted
+        self.crawler.rate_limiter = None
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            part_path = FinancialCrawler.part_path(output_path)
+            with self.assertRaises(ConnectionError):
+                self.crawler._download_file("https://example.com/a.pdf", output_path, 30, len(content))
+            self.assertEqual(part_path.stat().st_size, half)
+            
+            # 伺服器回傳的範圍起點不符：刪除部分檔案與續傳資訊
+            mock_get.return_value.status_code = 206
+            mock_get.return_value.headers = {'Content-Range': f'bytes 0-{len(content) - 1}/{len(content)}'}
+            with self.assertRaises(Exception):
+                self.crawler._download_file("https://example.com/a.pdf", output_path, 30, len(content))
+            self.assertEqual(mock_get.call_args.kwargs['headers'], {'Range': f'bytes={half}-', 'If-Range': '"v1"'})
+            self.assertEqual(list(Path(temp_dir).iterdir()), [])
+            
+            # 文件清單的大小與部分檔案記錄的總長度不同 (遠端檔案已變更)：不續傳
+            part_path.write_bytes(content[:half])
+            FinancialCrawler.part_meta_path(part_path).write_text(json.dumps({'validator': '"v1"', 'length': 9999}))
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.headers = {}
+            mock_get.return_value.iter_content.side_effect = lambda chunk_size: iter([content])
+            size = self.crawler._download_file("https://example.com/a.pdf", output_path, 30, len(content))
+            self.assertEqual(mock_get.call_args.kwargs['headers'], {})
+            self.assertEqual(size, len(content))
+            self.assertEqual(list(Path(temp_dir).iterdir()), [output_path])
+    
+    def test_same_target_downloads_serialized(self):
+        """測試同一份財報的並行下載依序寫入 .part 檔，不會交錯寫入同一個檔案"""
+        content = b'%PDF' + b'1' * 5000
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+        
+        def slow_chunks(chunk_size):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            yield content[:100]
+            time.sleep(0.05)
+            yield content[100:]
+            with lock:
+                active[0] -= 1
+        
+        def fake_get(url, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            response.iter_content.side_effect = slow_chunks
+            return response
+        
+        self.crawler.rate_limiter = None
+        with tempfile.TemporaryDirectory() as temp_dir, patch('requests.Session.get', side_effect=fake_get):
+            output_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            threads = [threading.Thread(target=self.crawler._download_file,
+                                        args=("https://example.com/a.pdf", output_path, 30)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            self.assertEqual(peak[0], 1)
+            self.assertEqual(output_path.read_bytes(), content)
+            self.assertEqual(list(Path(temp_dir).iterdir()), [output_path])
+    
     def test_invalid_query_data(self):
         """測試無效查詢資料處理"""
         invalid_queries = [
@@ -159,5 +581,302 @@ class TestCrawlerErrorHandling(unittest.TestCase):
             pass
 
 
+
+class TestStubServerCrawl(unittest.TestCase):
+    """以本機 TWSE 替身伺服器測試實際 HTTP 下載流程"""
+    
+    def crawl(self, settings, workers, queries):
+        with TWSEStubServer(settings) as stub, tempfile.TemporaryDirectory() as temp_dir, \
+                patch('src.core.crawler.time.sleep'):
+            crawler = FinancialCrawler({
+                'output_dir': temp_dir, 'crawler_base_url': stub.base_url,
+                'request_rate': 0, 'download_workers': workers
+            })
+            crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            result = crawler.process(queries)
+            pdfs = {path.name: path.read_bytes() for path in Path(temp_dir).glob("*.pdf")}
+            return result, dict(stub.stats), pdfs, stub
+    
+    def test_sequential_and_concurrent_crawl(self):
+        """測試循序與並行模式都取得與伺服器相同的PDF，且每家公司只查詢一次清單"""
+        queries = [{"stock_code": code, "company_name": code, "year": 2024, "season": f"Q{q}"}
+                   for code in ("9001", "9002") for q in range(1, 5)]
+        
+        for workers in (1, 4):
+            result, stats, pdfs, stub = self.crawl(StubSettings(payload_size=20_000), workers, queries)
+            
+            self.assertEqual(result.message, "批次處理完成: 8/8 成功")
+            self.assertEqual(stats['queries'], 2)
+            self.assertEqual(stats['downloads'], 8)
+            self.assertEqual(pdfs["202403_9002_AI1.pdf"], stub.payload("202403_9002_AI1.pdf"))
+    
+    def test_injected_errors_are_retried(self):
+        """測試替身伺服器注入的 500 與 429 由重試吸收"""
+        queries = [{"stock_code": "9001", "company_name": "9001", "year": 2023, "season": f"Q{q}"} for q in range(1, 5)]
+        settings = StubSettings(payload_size=5_000, error_rate=0.2, throttle_rate=0.2, seed=3)
+        
+        result, stats, pdfs, _ = self.crawl(settings, 2, queries)
+        
+        self.assertGreater(stats['errors'] + stats['throttled'], 0)
+        self.assertEqual(len(pdfs), sum(1 for item in result.data if item['success']))
+        self.assertGreater(len(pdfs), 0)
+        self.assertEqual(stats['downloads'], len(pdfs))
+
+
+class TestBlobStore(unittest.TestCase):
+    """測試內容定址PDF儲存"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.store = BlobStore(self.root / "blobs")
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def write(self, relative, content):
+        path = self.root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return path
+    
+    def test_dedupe_links_identical_pdfs(self):
+        """測試不同資料夾中相同內容的PDF改為同一個 inode，不同內容各自保留"""
+        first = self.write("a/202401_2330_AI1.pdf", b'%PDF-1.4 same')
+        second = self.write("b/202401_2330_AI1.pdf", b'%PDF-1.4 same')
+        other = self.write("b/202402_2330_AI1.pdf", b'%PDF-1.4 other')
+        
+        stats = self.store.dedupe([self.root / "a", self.root / "b"])
+        
+        self.assertEqual(stats, {'files': 3, 'linked': 3, 'bytes_saved': len(b'%PDF-1.4 same')})
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertFalse(os.path.samefile(first, other))
+        self.assertEqual(self.store.stats()['blobs'], 2)
+        self.assertEqual(second.read_bytes(), b'%PDF-1.4 same')
+        # 再次執行時已全部連結
+        self.assertEqual(self.store.dedupe([self.root / "a", self.root / "b"])['linked'], 0)
+    
+    def test_gc_removes_unreferenced_blobs(self):
+        """測試沒有連結的儲存檔被刪除，仍有連結或在索引中的保留"""
+        kept = self.store.put(self.write("a/kept.pdf", b'kept'))
+        dropped = self.store.put(self.write("a/dropped.pdf", b'dropped'))
+        indexed = self.store.put(self.write("a/indexed.pdf", b'indexed'))
+        (self.root / "a/dropped.pdf").unlink()
+        (self.root / "a/indexed.pdf").unlink()
+        
+        self.assertEqual(self.store.gc({indexed}), 1)
+        self.assertTrue(self.store.contains(kept))
+        self.assertTrue(self.store.contains(indexed))
+        self.assertFalse(self.store.contains(dropped))
+    
+    def test_crawler_links_downloads_into_store(self):
+        """測試爬蟲下載的PDF連結到儲存檔，再次處理時不讀取內容即略過"""
+        queries = [{"stock_code": "9001", "company_name": "9001", "year": 2024, "season": "Q1"}]
+        with TWSEStubServer(StubSettings(payload_size=5_000)) as stub:
+            crawler = FinancialCrawler({
+                'output_dir': str(self.root / "reports"), 'crawler_base_url': stub.base_url,
+                'request_rate': 0, 'blob_store_dir': str(self.root / "blobs")
+            })
+            crawler.index_manager = MasterIndexManager(self.root / "index.json")
+            crawler.process(queries)
+            
+            pdf = self.root / "reports" / "202401_9001_AI1.pdf"
+            sha256 = crawler.index_manager.find_report("9001", 2024, "Q1")['sha256']
+            self.assertTrue(crawler.blob_store.is_linked(pdf, sha256))
+            
+            with patch('src.core.crawler.file_sha256') as file_sha256:
+                result = crawler.process(queries)
+            file_sha256.assert_not_called()
+            self.assertTrue(result.data[0]['data']['skipped'])
+            self.assertEqual(stub.stats['downloads'], 1)
+    
+    def test_redownload_over_linked_path(self):
+        """測試已連結到儲存的路徑可重新下載取代，使用者檔案與儲存檔不是唯讀"""
+        queries = [{"stock_code": "9001", "company_name": "9001", "year": 2024, "season": "Q1"}]
+        with TWSEStubServer(StubSettings(payload_size=5_000)) as stub:
+            crawler = FinancialCrawler({
+                'output_dir': str(self.root / "reports"), 'crawler_base_url': stub.base_url,
+                'request_rate': 0, 'blob_store_dir': str(self.root / "blobs")
+            })
+            crawler.index_manager = MasterIndexManager(self.root / "index.json")
+            crawler.process(queries)
+            pdf = self.root / "reports" / "202401_9001_AI1.pdf"
+            first = crawler.index_manager.find_report("9001", 2024, "Q1")['sha256']
+            self.assertTrue(pdf.stat().st_mode & stat.S_IWUSR)
+            
+            # 舊版儲存的唯讀連結也能被取代
+            os.chmod(pdf, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            stub.settings.payload_size = 6_000
+            crawler.refresh = True
+            result = crawler.process(queries)
+            
+            self.assertTrue(result.success)
+            self.assertEqual(stub.stats['downloads'], 2)
+            second = crawler.index_manager.find_report("9001", 2024, "Q1")['sha256']
+            self.assertNotEqual(first, second)
+            self.assertTrue(crawler.blob_store.is_linked(pdf, second))
+            self.assertTrue(pdf.stat().st_mode & stat.S_IWUSR)
+            self.assertEqual(self.store.gc(), 1)
+            self.assertFalse(self.store.contains(first))
+
+
+class _FakeResponse:
+    """模擬 aiohttp 回應 (async context manager)"""
+    
+    def __init__(self, status=200, text='', body=b'', delay=0.0):
+        self.status = status
+        self.headers = {}
+        self._text = text
+        self._body = body
+        self._delay = delay
+        self.content = self
+    
+    async def __aenter__(self):
+        await asyncio.sleep(self._delay)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return None
+    
+    async def text(self):
+        return self._text
+    
+    async def iter_chunked(self, size):
+        for start in range(0, len(self._body), size):
+            yield self._body[start:start + size]
+
+
+class TestAsyncCrawler(unittest.TestCase):
+    """非同步爬蟲測試 (以注入的模擬 Session 取代 aiohttp)"""
+    
+    def test_results_as_completed_with_bounded_concurrency(self):
+        """測試依完成順序產生結果、同時下載數不超過 concurrency，且同一公司只查詢一次清單"""
+        listing = ''.join(f'<a href="/pdf/2023{m}_2330_AI1.pdf">2023{m}_2330_AI1.pdf</a>' for m in ('01', '02', '03', '04'))
+        # Q1 下載最慢，應最後完成
+        delays = {'202301': 0.2, '202302': 0.05, '202303': 0.0, '202304': 0.1}
+        state = {'active': 0, 'peak': 0, 'posts': 0}
+        
+        class FakeSession:
+            def post(self, url, data):
+                state['posts'] += 1
+                return _FakeResponse(text=listing)
+            
+            def get(self, url, headers):
+                period = url.rsplit('/', 1)[-1][:6]
+                response = _FakeResponse(body=b'%PDF' + period.encode() * 500, delay=delays[period])
+                enter = response.__aenter__
+                
+                async def tracked_enter():
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                    try:
+                        return await enter()
+                    finally:
+                        state['active'] -= 1
+                
+                response.__aenter__ = tracked_enter
+                return response
+        
+        queries = [{"stock_code": "2330", "company_name": "台積電", "year": 2023, "season": f"Q{q}"} for q in range(1, 5)]
+        
+        async def run(temp_dir):
+            crawler = AsyncFinancialCrawler({"output_dir": temp_dir}, concurrency=2, session=FakeSession())
+            crawler.crawler.rate_limiter = None
+            crawler.crawler.index_manager = MasterIndexManager(Path(temp_dir) / "index.json")
+            async with crawler:
+                return [(i, result) async for i, result in crawler.imap_unordered(queries)], crawler
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            completed, crawler = asyncio.run(run(temp_dir))
+            
+            self.assertTrue(all(result.success for _, result in completed))
+            self.assertEqual(completed[-1][0], 0)
+            self.assertEqual(state['posts'], 1)
+            self.assertLessEqual(state['peak'], 2)
+            self.assertEqual(len(list(Path(temp_dir).glob("*.pdf"))), 4)
+            self.assertEqual(len(crawler.crawler.index_manager.load_index()["reports"]), 4)
+    
+    def test_disk_io_off_event_loop(self):
+        """測試續傳檢查、開檔與每個區塊的寫入都不在事件迴圈執行緒中進行"""
+        body = b'%PDF' + b'0' * 200_000
+        io_threads = []
+        
+        class FakeSession:
+            def get(self, url, headers):
+                return _FakeResponse(body=body)
+        
+        class TrackedFile:
+            def __init__(self, f):
+                self._f = f
+            
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+            
+            def write(self, data):
+                io_threads.append(threading.get_ident())
+                return self._f.write(data)
+        
+        def tracked_open(path, mode):
+            io_threads.append(threading.get_ident())
+            return TrackedFile(open(path, mode))
+        
+        async def run(output_path):
+            crawler = AsyncFinancialCrawler({}, session=FakeSession())
+            crawler.crawler.rate_limiter = None
+            for name in ('_resume_request', '_resume_mode'):
+                method = getattr(crawler.crawler, name)
+                
+                def tracked(*args, method=method):
+                    io_threads.append(threading.get_ident())
+                    return method(*args)
+                setattr(crawler.crawler, name, tracked)
+            with patch('src.core.async_crawler.open', tracked_open, create=True):
+                size = await crawler._download_file('https://mops.example/a.pdf', output_path)
+            return size, threading.get_ident()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "202401_2330_AI1.pdf"
+            size, loop_thread = asyncio.run(run(output_path))
+            
+            self.assertEqual(size, len(body))
+            self.assertEqual(output_path.read_bytes(), body)
+            # 2 次續傳檢查 + 開檔 + 每個區塊一次寫入
+            self.assertEqual(len(io_threads), 3 + -(-len(body) // FinancialCrawler.CHUNK_SIZE))
+            self.assertNotIn(loop_thread, io_threads)
+    
+    def test_cancelled_request_releases_trial(self):
+        """測試半開時被取消的請求歸還試探名額，斷路器之後仍放行試探請求"""
+        url = 'https://mops.example/query'
+        now = [0.0]
+        
+        class HangingSession:
+            def get(self, url):
+                return _FakeResponse(delay=10)
+        
+        async def run():
+            crawler = AsyncFinancialCrawler({'breaker_failure_threshold': 1}, session=HangingSession())
+            crawler.crawler.rate_limiter = None
+            breaker = crawler.crawler.breakers.breaker(url)
+            breaker.clock = lambda: now[0]
+            breaker.record_failure()
+            now[0] += crawler.crawler.breakers.recovery_timeout
+            
+            async def request():
+                async with crawler._request('get', url):
+                    pass
+            
+            task = asyncio.ensure_future(request())
+            await asyncio.sleep(0.01)
+            self.assertFalse(breaker.allow())
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return breaker
+        
+        breaker = asyncio.run(run())
+        self.assertEqual(breaker.state, BreakerState.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
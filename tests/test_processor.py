@@ -11,7 +11,10 @@ from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from src.processors.smart_processor import SmartFinancialProcessor
-from src.core import ProcessingResult
+from src.processors.pdf_processor import PDFFinancialExtractor, ModernPDFProcessor
+from src.processors.pdf_classifier import PDFPageClassifier
+from src.processors.section_segmenter import SectionSegmenter
+from src.core import ProcessingResult, get_config
 
 
 class TestSmartFinancialProcessor(unittest.TestCase):
@@ -122,6 +125,61 @@ class TestSmartFinancialProcessor(unittest.TestCase):
                 
                 self.assertIn("stock_code", processed_data)
                 self.assertEqual(processed_data["stock_code"], "2330")
+    
+    def test_extractor_version_tracks_extraction_logic(self):
+        """測試擷取邏輯版本變更時擷取器版本改變 (處理清單會重新處理)"""
+        version = self.processor.get_extractor_version()
+        
+        self.assertEqual(self.processor.get_extractor_version(), version)
+        with patch('src.processors.smart_processor.EXTRACTION_VERSION', -1):
+            self.assertNotEqual(self.processor.get_extractor_version(), version)
+
+
+class TestPriorPeriodBackfill(unittest.TestCase):
+    """比較期回填前期JSON測試"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_dir = Path(self.temp_dir.name)
+        self.processor = SmartFinancialProcessor(get_config())
+        self.report_data = {
+            "stock_code": "2454",
+            "company_name": "聯發科",
+            "report_year": 2024,
+            "report_season": "Q1"
+        }
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_backfill_missing_and_empty_only(self):
+        """測試只回填不存在或空白的前期JSON，不覆蓋已有數據"""
+        existing = {"stock_code": "2454", "income_statement": {"net_revenue": 1}, "financials": {}}
+        (self.json_dir / "202301_2454_AI1.json").write_text(json.dumps(existing), encoding='utf-8')
+        empty = {"stock_code": "2454", "income_statement": {"net_revenue": None}, "financials": {}}
+        (self.json_dir / "202304_2454_AI1.json").write_text(json.dumps(empty), encoding='utf-8')
+        
+        period_data = {
+            '2024Q1': {'net_revenue': 133458147},
+            '2023Q1': {'net_revenue': 95651513},
+            '2023Q4': {'total_assets': 630000},
+        }
+        written = self.processor.backfill_prior_periods(
+            self.json_dir, self.report_data, period_data, "202401_2454_AI1.pdf"
+        )
+        
+        self.assertEqual([Path(p).name for p in written], ["202304_2454_AI1.json"])
+        
+        with open(self.json_dir / "202304_2454_AI1.json", 'r', encoding='utf-8') as f:
+            prior = json.load(f)
+        self.assertEqual(prior['report_year'], 2023)
+        self.assertEqual(prior['report_season'], 'Q4')
+        self.assertEqual(prior['financials']['total_assets'], 630000)
+        self.assertEqual(prior['metadata']['comparative_source_file'], "202401_2454_AI1.pdf")
+        
+        with open(self.json_dir / "202301_2454_AI1.json", 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), existing)
+        self.assertFalse((self.json_dir / "202401_2454_AI1.json").exists())
 
 
 class TestPatternMatching(unittest.TestCase):
@@ -191,6 +249,237 @@ class TestPatternMatching(unittest.TestCase):
                 self.assertGreaterEqual(len(numbers), 2)
 
 
+class TestTableNormalizer(unittest.TestCase):
+    """測試表格數值正規化"""
+    
+    def setUp(self):
+        self.extractor = PDFFinancialExtractor(get_config())
+    
+    def test_numeric_formats(self):
+        """測試千分位、全形數字、括號負數與破折號"""
+        tables = [{
+            'headers': ['代碼', '項目', '本期', '前期'],
+            'rows': [
+                ['4000', '營業收入', '１，２３４，５６７', '900,000'],
+                ['6900', '營業利益(損失)', '( 12,345)', '1,000'],
+                ['8200', '本期淨利(損)', '-', '5,000'],
+                ['1xxx', '資 產 總 計', '$ 1 43,345,272', '3'],
+            ]
+        }]
+        
+        data = self.extractor._extract_from_tables(tables)
+        
+        self.assertEqual(data['net_revenue'], 1234567)
+        self.assertEqual(data['operating_income'], -12345)
+        self.assertEqual(data['net_income'], 0)
+        self.assertEqual(data['total_assets'], 143345272)
+    
+    def test_unit_scale(self):
+        """測試元/千元單位換算，每股盈餘不換算"""
+        tables = [{
+            'headers': ['項目', '金額 (單位：新台幣元)'],
+            'rows': [
+                ['營業收入', '5,000,000'],
+                ['權益總計', '2,000 千元'],
+                ['基本每股盈餘', '12.34'],
+            ]
+        }]
+        
+        data = self.extractor._extract_from_tables(tables)
+        
+        self.assertEqual(data['net_revenue'], 5000)
+        self.assertEqual(data['total_equity'], 2000)
+        self.assertEqual(data['eps'], 12.34)
+    
+    def test_skips_tables_without_headers(self):
+        """測試無表頭或無資料列的表格"""
+        self.assertEqual(self.extractor._extract_from_tables([]), {})
+        self.assertEqual(
+            self.extractor._extract_from_tables([{'headers': [], 'rows': [['營業收入', '1']]}]),
+            {}
+        )
+    
+    def test_period_columns(self):
+        """測試依民國年期間表頭提取本期與比較期數值，略過百分比欄"""
+        tables = [{
+            'headers': ['代碼', '項 目', '一一三年第一季', None, '一一二年第一季', None],
+            'rows': [
+                [None, None, '金 額', '%', '金 額', '%'],
+                ['4000', '營業收入', '$ 133,458,147', '100', '$ 95,651,513', '100'],
+                ['9750', '基本每股盈餘(元)', '19.85', None, '9.60', None],
+            ]
+        }, {
+            'headers': ['代碼', '資 產', '一一三年三月三十一日', None, '一一二年十二月三十一日', None],
+            'rows': [
+                [None, None, '金 額', '％', '金 額', '％'],
+                ['1xxx', '資產總計', '650,000', '100', '630,000', '100'],
+            ]
+        }]
+        
+        period_data = self.extractor.extract_period_data(tables)
+        
+        self.assertEqual(period_data, {
+            '2024Q1': {'net_revenue': 133458147, 'eps': 19.85, 'total_assets': 650000},
+            '2023Q1': {'net_revenue': 95651513, 'eps': 9.6},
+            '2023Q4': {'total_assets': 630000},
+        })
+
+
+class TestSectionSegmenter(unittest.TestCase):
+    """報表區段切分測試"""
+    
+    TEXT = (
+        "=== 第1頁 ===\n合併財務報告\n目 錄\n四、合併資產負債表 4\n五、合併綜合損益表 5\n"
+        "=== 第2頁 ===\n台灣積體電路製造股份有限公司及子公司\n合 併 資 產 負 債 表\n資產總計: 650,000\n"
+        "=== 第3頁 ===\n台灣積體電路製造股份有限公司及子公司\n合併綜合損益表\n營收: 1,000\n"
+        "=== 第4頁 ===\n營業費用: 300\n"
+        "=== 第5頁 ===\n台灣積體電路製造股份有限公司及子公司合併財務報表附註(續)\n"
+        "營業收入淨額: 77\n資產總額: 88\n"
+    )
+    
+    def test_page_sections(self):
+        """測試標題偵測、續頁延續與目錄頁排除"""
+        self.assertEqual(SectionSegmenter().page_sections(self.TEXT), {
+            1: None,
+            2: 'balance_sheet',
+            3: 'income_statement',
+            4: 'income_statement',
+            5: 'notes',
+        })
+    
+    def test_fields_match_own_section(self):
+        """測試欄位只比對所屬區段，不採用附註中的同名科目"""
+        extractor = PDFFinancialExtractor(get_config())
+        
+        data = extractor.extract_financial_data(self.TEXT, [])
+        
+        self.assertEqual(data, {'net_revenue': 1000, 'total_assets': 650000})
+    
+    def test_notes_tables_ignored(self):
+        """測試附註頁面的表格 (例如關係人交易) 不覆蓋報表區段的數值，逐頁與全文提取結果相同"""
+        extractor = PDFFinancialExtractor(get_config())
+        notes_table = {'page': 5, 'headers': ['編號', '科目', '金額', '交易條件', '比率'],
+                       'rows': [['3', '營業收入', '$ 59,776', '一般條件', '0.02%']]}
+        statement_table = {'page': 3, 'headers': ['代碼', '項目', '金額'],
+                           'rows': [['4000', '營業收入', '1,234']]}
+        
+        self.assertEqual(extractor.extract_financial_data(self.TEXT, [notes_table]),
+                         {'net_revenue': 1000, 'total_assets': 650000})
+        self.assertEqual(extractor.extract_financial_data(self.TEXT, [statement_table, notes_table]),
+                         {'net_revenue': 1234, 'total_assets': 650000})
+        
+        pages = [(text, [table for table in (statement_table, notes_table) if table['page'] == page_num])
+                 for page_num, text in SectionSegmenter().iter_pages(self.TEXT)]
+        self.assertEqual(extractor.extract_from_pages(iter(pages)), {'net_revenue': 1234, 'total_assets': 650000})
+
+
+def build_test_pdf(path: Path, page_contents: list) -> None:
+    """建立最小PDF：每頁內容串流可使用字型 /F1 與影像 /Im1"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray "
+        b"/BitsPerComponent 8 /Length 1 >>\nstream\n\x80\nendstream",
+    ]
+    kids = []
+    for content in page_contents:
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 600 800] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >> >> >>" % content_ref
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+    
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for num, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % num + obj + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(data)
+
+
+class TestPDFPageClassifier(unittest.TestCase):
+    """PDF頁面分類器測試"""
+    
+    TEXT_PAGE = b"BT /F1 12 Tf 72 700 Td (Revenue 1,000) Tj ET"
+    SCANNED_PAGE = b"q 600 0 0 800 0 0 cm /Im1 Do Q"
+    OCR_PAGE = SCANNED_PAGE + b" BT 3 Tr /F1 12 Tf 72 700 Td (Revenue) Tj ET"
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.classifier = PDFPageClassifier(get_config())
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_page_types(self):
+        """測試逐頁判斷文字型、掃描型與混合型"""
+        pdf_path = Path(self.temp_dir.name) / "pages.pdf"
+        build_test_pdf(pdf_path, [self.TEXT_PAGE, self.SCANNED_PAGE, self.OCR_PAGE, b""])
+        
+        page_map = self.classifier.classify(pdf_path)
+        
+        self.assertEqual(page_map, {1: 'text_based', 2: 'scanned', 3: 'mixed', 4: 'text_based'})
+    
+    def test_document_type_and_cache(self):
+        """測試文件類型判斷與雜湊快取"""
+        pdf_path = Path(self.temp_dir.name) / "scanned.pdf"
+        build_test_pdf(pdf_path, [self.SCANNED_PAGE] * 5)
+        
+        analysis = self.classifier.analyze(pdf_path)
+        self.assertEqual(analysis['type'], 'scanned')
+        self.assertEqual(analysis['total_pages'], 5)
+        
+        with patch('src.processors.pdf_classifier.pdfplumber.open') as mock_open:
+            self.assertEqual(self.classifier.analyze(pdf_path), analysis)
+            mock_open.assert_not_called()
+
+
+class TestLeanProcessing(unittest.TestCase):
+    """精簡結果模式測試"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = Path(self.temp_dir.name) / "report.pdf"
+        build_test_pdf(self.pdf_path, [
+            b"BT /F1 12 Tf 72 700 Td (Net Revenue: 1,000) Tj ET",
+            b"BT /F1 12 Tf 72 700 Td (Net Income: 200) Tj ET"
+        ])
+        self.processor = ModernPDFProcessor(get_config())
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_lean_result(self):
+        """測試精簡模式不保留原始文字與表格，財務數據與完整模式相同"""
+        full = self.processor.process(self.pdf_path)
+        lean = self.processor.process(self.pdf_path, lean=True)
+        
+        self.assertTrue(lean['success'])
+        self.assertNotIn('text_content', lean['data'])
+        self.assertNotIn('tables', lean['data'])
+        self.assertEqual(lean['data']['financial_data'], {'net_revenue': 1000, 'net_income': 200})
+        self.assertEqual(lean['data']['financial_data'], full['data']['financial_data'])
+        self.assertEqual(lean['data']['page_map'], {1: 'text_based', 2: 'text_based'})
+        self.assertEqual(lean['data']['processing_info']['pages'], 2)
+    
+    def test_pattern_priority_across_pages(self):
+        """測試逐頁匹配時仍以模式順序優先"""
+        extractor = self.processor.financial_extractor
+        pages = [("營收: 5", []), ("營業收入: 7", []), ("營業收入: 9", [])]
+        
+        self.assertEqual(extractor.extract_from_pages(iter(pages)), {'net_revenue': 7})
+        self.assertEqual(extractor.extract_from_pages(iter(pages)),
+                         extractor.extract_financial_data("\n".join(t for t, _ in pages), []))
+
+
 class TestDataIntegrity(unittest.TestCase):
     """測試資料完整性"""
     